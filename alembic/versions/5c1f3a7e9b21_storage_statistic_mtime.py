@@ -0,0 +1,48 @@
+"""storage statistic mtime
+
+Revision ID: 5c1f3a7e9b21
+Revises: 2dbbe08c0a1e
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f3a7e9b21'
+down_revision: Union[str, None] = '2dbbe08c0a1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('storage_statistic', 'path',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=1024),
+               existing_nullable=False)
+    op.alter_column('storage_statistic', 'size',
+               existing_type=sa.Integer(),
+               type_=sa.BigInteger(),
+               existing_nullable=False)
+    op.add_column('storage_statistic', sa.Column('direct_files_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('storage_statistic', sa.Column('direct_folders_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('storage_statistic', sa.Column('mtime', sa.Float(), nullable=True, comment='Directory mtime, NULL - stale'))
+    op.create_index('idx_storage_statistic_storage_id_path', 'storage_statistic', ['storage_id', 'path'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_storage_statistic_storage_id_path', table_name='storage_statistic')
+    op.drop_column('storage_statistic', 'mtime')
+    op.drop_column('storage_statistic', 'direct_folders_count')
+    op.drop_column('storage_statistic', 'direct_files_count')
+    op.alter_column('storage_statistic', 'size',
+               existing_type=sa.BigInteger(),
+               type_=sa.Integer(),
+               existing_nullable=False)
+    op.alter_column('storage_statistic', 'path',
+               existing_type=sa.String(length=1024),
+               type_=sa.String(length=255),
+               existing_nullable=False)
@@ -0,0 +1,43 @@
+"""storage entries
+
+Revision ID: 8d2e4b6a1c37
+Revises: 5c1f3a7e9b21
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a1c37'
+down_revision: Union[str, None] = '5c1f3a7e9b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('storage_entries',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('storage_id', sa.Uuid(), nullable=False),
+    sa.Column('path', sa.String(length=1024), nullable=False),
+    sa.Column('parent', sa.String(length=1024), nullable=True),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('is_dir', sa.Boolean(), nullable=False),
+    sa.Column('size', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('mtime', sa.Float(), nullable=False),
+    sa.Column('ctime', sa.Float(), nullable=False),
+    sa.Column('file_group', sa.String(length=30), nullable=True, comment='FileGroup'),
+    sa.ForeignKeyConstraint(['storage_id'], ['storages.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_storage_entries_storage_id_path', 'storage_entries', ['storage_id', 'path'], unique=True)
+    op.create_index('idx_storage_entries_storage_id_parent', 'storage_entries', ['storage_id', 'parent', 'is_dir', 'name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_storage_entries_storage_id_parent', table_name='storage_entries')
+    op.drop_index('idx_storage_entries_storage_id_path', table_name='storage_entries')
+    op.drop_table('storage_entries')
@@ -0,0 +1,29 @@
+"""storage entries name trigram index
+
+Revision ID: b7f3c9d1e5a2
+Revises: 8d2e4b6a1c37
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3c9d1e5a2'
+down_revision: Union[str, None] = '8d2e4b6a1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        'CREATE INDEX idx_storage_entries_name_trgm ON storage_entries '
+        'USING gin (lower(name) gin_trgm_ops)'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_storage_entries_name_trgm', table_name='storage_entries')
@@ -0,0 +1,39 @@
+"""file duplicates
+
+Revision ID: c4a8e2f6b913
+Revises: b7f3c9d1e5a2
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e2f6b913'
+down_revision: Union[str, None] = 'b7f3c9d1e5a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('file_duplicates',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('storage_id', sa.Uuid(), nullable=False),
+    sa.Column('path', sa.String(length=1024), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('NOW()'), nullable=True, comment='Record creation time'),
+    sa.ForeignKeyConstraint(['storage_id'], ['storages.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_file_duplicates_storage_id', 'file_duplicates', ['storage_id'], unique=False)
+    op.create_index('idx_file_duplicates_size_hash', 'file_duplicates', ['size', 'hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_file_duplicates_size_hash', table_name='file_duplicates')
+    op.drop_index('idx_file_duplicates_storage_id', table_name='file_duplicates')
+    op.drop_table('file_duplicates')
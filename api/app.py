@@ -1,23 +1,46 @@
 """Main app"""
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from starlette.middleware.cors import CORSMiddleware
 
-from api.views import catalog, storage_manager, storages
+from api.views import catalog, duplicates, storage_manager, storages
 from common.exceptions import (
     BaseApiException,
     handle_exception_response,
     handle_validation_error_handler,
 )
 from common.settings import settings
+from services.async_io import shutdown_executors
+from services.crawler import storage_crawler
+from services.watcher import StorageWatcher
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARNING)
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 
-app = FastAPI(docs_url=settings.SWAGGER_URL, redoc_url=settings.REDOC_URL)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    watcher = StorageWatcher() if settings.WATCHER_ENABLED else None
+    crawler = storage_crawler if settings.CRAWLER_ENABLED else None
+    if crawler is not None:
+        await crawler.start()
+        if watcher is not None:
+            watcher.subscribe(crawler.apply)
+    if watcher is not None:
+        await watcher.start()
+    yield
+    if watcher is not None:
+        await watcher.stop()
+    if crawler is not None:
+        await crawler.stop()
+    shutdown_executors()
+
+
+app = FastAPI(docs_url=settings.SWAGGER_URL, redoc_url=settings.REDOC_URL, lifespan=lifespan)
 
 
 origins = ['*']
@@ -36,6 +59,7 @@ app.add_exception_handler(RequestValidationError, handle_validation_error_handle
 app.include_router(storages.router)
 app.include_router(storage_manager.router)
 app.include_router(catalog.router)
+app.include_router(duplicates.router)
 
 if __name__ == '__main__':
     import uvicorn
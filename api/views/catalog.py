@@ -5,9 +5,9 @@ import uuid
 from datetime import datetime
 from typing import List, Annotated
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query
 from starlette import status
-from starlette.responses import FileResponse, JSONResponse
+from starlette.responses import JSONResponse, Response
 
 from common.settings import settings
 from common.utils import get_header_user_id
@@ -24,6 +24,7 @@ from services.catalog import (
     get_items_for_main_page_service,
     get_user_tags_service,
 )
+from services.http_cache import ConditionalRequest
 
 router = APIRouter(prefix='/catalog')
 
@@ -42,19 +43,29 @@ async def get_user_tags(user_id: uuid.UUID = Depends(get_header_user_id)):
 
 @router.get('/main')
 async def get_images_for_main_page(
-    page: int = 1, per_page: int = settings.PER_PAGE, created_before: datetime = None
+    page: int = 1,
+    per_page: int = settings.PER_PAGE,
+    created_before: datetime = None,
+    placeholders: bool = False,
 ) -> ListCatalogFilesResponse:
     return await get_items_for_main_page_service(
-        page=page, per_page=per_page, created_before=created_before
+        page=page, per_page=per_page, created_before=created_before, placeholders=placeholders
     )
 
 
 @router.get('/preview/{id}')
-async def get_file(id: uuid.UUID, width: int | None = None) -> FileResponse:
+async def get_file(
+    id: uuid.UUID,
+    width: int | None = None,
+    accept: str | None = Header(None),
+    conditional: ConditionalRequest = Depends(),
+) -> Response:
     # try:
     if width is None:
         width = settings.PREVIEW_WIDTH
-    return await get_catalog_file_service(file_id=id, width=width)
+    return await get_catalog_file_service(
+        file_id=id, width=width, accept=accept, conditional=conditional
+    )
     # except Exception as e:
     #     print(e)
 
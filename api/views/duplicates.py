@@ -0,0 +1,45 @@
+import uuid
+
+from fastapi import APIRouter
+
+from common.exceptions import BadRequest
+from common.settings import settings
+from schemas.duplicates import DuplicatesResponse, DuplicatesScanResponse
+from schemas.storage import Pagination
+from services.duplicates import get_duplicates_service, start_duplicates_scan_service
+
+router = APIRouter(prefix='/duplicates')
+
+
+def _check_scope(storage_id: uuid.UUID | None, user_id: uuid.UUID | None) -> None:
+    if storage_id is None and user_id is None:
+        raise BadRequest(
+            error_code='storage_or_user_required',
+            error_message='storage_id or user_id is required',
+        )
+
+
+@router.post('/scan')
+async def start_duplicates_scan(
+    storage_id: uuid.UUID | None = None, user_id: uuid.UUID | None = None
+) -> DuplicatesScanResponse:
+    _check_scope(storage_id, user_id)
+    started = await start_duplicates_scan_service(storage_id=storage_id, user_id=user_id)
+    return DuplicatesScanResponse(started=started)
+
+
+@router.get('/')
+async def get_duplicates(
+    storage_id: uuid.UUID | None = None,
+    user_id: uuid.UUID | None = None,
+    page: int = 1,
+    per_page: int = settings.PER_PAGE,
+) -> DuplicatesResponse:
+    _check_scope(storage_id, user_id)
+    groups = await get_duplicates_service(storage_id=storage_id, user_id=user_id)
+    start = (page - 1) * per_page
+    return DuplicatesResponse(
+        results=groups[start : start + per_page],
+        wasted=sum(group.wasted for group in groups),
+        pagination=Pagination(page=page, per_page=per_page, items=len(groups)),
+    )
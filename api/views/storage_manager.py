@@ -1,20 +1,49 @@
-import io
 import logging
+import os
 import uuid
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
-from common.exceptions import BadRequest
+from common.exceptions import BadRequest, ServiceUnavailable
 from common.settings import settings
 from common.utils import get_header_user_id
 from schemas.catalog import CatalogFileRequest, CatalogFileResponse
-from schemas.storage import FolderContentResponse, Pagination, StorageSummaryResponse
+from schemas.storage import (
+    FolderContentResponse,
+    ListingCacheStatsResponse,
+    Pagination,
+    PregenerateJobResponse,
+    RenderStatsResponse,
+    SpriteSheetResponse,
+    StorageSearchResponse,
+    StorageSummaryResponse,
+)
+from services.async_io import run_fs
 from services.catalog import file_add_data_service
 from services.collage_maker import CollageMaker
-from services.storage_content import get_storage_collage_service, get_storages_summary_service
+from services.http_cache import ConditionalRequest, not_modified_response
+from services.listing_cache import listing_cache
+from services.pregenerate import (
+    cancel_pregenerate_job_service,
+    get_pregenerate_job_service,
+    start_pregenerate_service,
+)
+from services.single_flight import render_flight
+from services.sprites import (
+    IMAGE_FORMATS_BY_EXTENSION,
+    get_sprite_file_service,
+    get_storage_sprite_service,
+)
+from services.storage_content import (
+    get_storage_collage_service,
+    get_storage_collage_validators_service,
+    get_storage_content_stream_service,
+    get_storages_summary_service,
+)
 from services.storage_file import get_storage_file_service
-from services.storage_manager import PAGE_SIZE, OrderFolder, StorageManager
+from services.storage_manager import PAGE_SIZE, OrderFolder, StatsMode, StorageManager
+from services.storage_search import search_storage_files_service
 from services.storages import get_storage_by_id_service
 
 router = APIRouter(prefix='/storage')
@@ -22,6 +51,50 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.WARNING)
 
 
+@router.get('/render/stats')
+async def get_render_stats() -> RenderStatsResponse:
+    """Счётчики объединения одновременных рендерингов уменьшенных копий и коллажей"""
+    return RenderStatsResponse(**render_flight.info())
+
+
+@router.get('/listing/stats')
+async def get_listing_stats() -> ListingCacheStatsResponse:
+    """Попадания и промахи кэша содержимого папок"""
+    return ListingCacheStatsResponse(**listing_cache.info())
+
+
+@router.get('/sprite/{name}')
+async def get_sprite_image(name: str) -> FileResponse:
+    """Изображение спрайта (имя из карты /storage/{storage_id}/sprite), не меняется"""
+    path = await run_fs(get_sprite_file_service, name)
+    extension = os.path.splitext(name)[1][1:]
+    return FileResponse(
+        path,
+        media_type=f'image/{IMAGE_FORMATS_BY_EXTENSION[extension]}',
+        headers={'Cache-Control': settings.SPRITE_CACHE_CONTROL},
+    )
+
+
+@router.get('/pregenerate/{job_id}')
+async def get_pregenerate_job(job_id: uuid.UUID) -> PregenerateJobResponse:
+    return PregenerateJobResponse.model_validate(get_pregenerate_job_service(job_id))
+
+
+@router.delete('/pregenerate/{job_id}')
+async def cancel_pregenerate_job(job_id: uuid.UUID) -> PregenerateJobResponse:
+    return PregenerateJobResponse.model_validate(cancel_pregenerate_job_service(job_id))
+
+
+@router.post('/{storage_id}/pregenerate')
+async def start_pregenerate(storage_id: uuid.UUID, folder: str = '') -> PregenerateJobResponse:
+    """
+    Фоновая генерация уменьшенных копий и коллажей папки (по умолчанию - всего хранилища).
+    Если для папки задание уже идёт, возвращается оно
+    """
+    job = await start_pregenerate_service(storage_id=storage_id, folder=folder)
+    return PregenerateJobResponse.model_validate(job)
+
+
 @router.get('/{storage_id}')
 async def get_storage_content(
     storage_id: uuid.UUID,
@@ -29,7 +102,11 @@ async def get_storage_content(
     page: int = 1,
     page_size: int = PAGE_SIZE,
     order_by: OrderFolder = OrderFolder.NAME,
+    cursor: str | None = None,
+    stats: StatsMode = StatsMode.CACHED,
+    placeholders: bool = False,
 ) -> FolderContentResponse:
+    """placeholders - размеры и заглушки изображений (если уже есть в кэше)"""
     storage = await get_storage_by_id_service(storage_id)
     storage_content = StorageManager(
         storage=storage,
@@ -37,9 +114,11 @@ async def get_storage_content(
         order_by=order_by,
         page_number=page,
         page_size=page_size,
+        cursor=cursor,
+        stats=stats,
     )
     # try:
-    results = await storage_content.get_storage_folder_content()
+    results = await storage_content.get_storage_folder_content(placeholders=placeholders)
     pagination = Pagination(
         page=page,
         per_page=page_size,
@@ -47,13 +126,89 @@ async def get_storage_content(
     )
     # except Exception as e:
     #     logger.error(f"Storage Manager get_storage_content Exception: {e}")
-    return FolderContentResponse(results=results, pagination=pagination)
+    return FolderContentResponse(
+        results=results,
+        pagination=pagination,
+        next_cursor=storage_content.folder.next_cursor,
+    )
+
+
+@router.get('/{storage_id}/sprite')
+async def get_storage_sprite(
+    storage_id: uuid.UUID,
+    folder: str = '',
+    page: int = 1,
+    page_size: int = PAGE_SIZE,
+    order_by: OrderFolder = OrderFolder.NAME,
+    cursor: str | None = None,
+    stats: StatsMode = StatsMode.CACHED,
+    accept: str | None = Header(None),
+) -> SpriteSheetResponse:
+    """
+    Спрайт уменьшенных копий изображений страницы листинга (параметры - как у
+    /storage/{storage_id}) и карта их положений; url - адрес изображения спрайта
+    """
+    name, sheet = await get_storage_sprite_service(
+        storage_id=storage_id,
+        folder=folder,
+        accept=accept,
+        page_number=page,
+        page_size=page_size,
+        order_by=order_by,
+        cursor=cursor,
+        stats=stats,
+    )
+    if name is not None:
+        sheet.url = router.url_path_for('get_sprite_image', name=name)
+    return sheet
+
+
+@router.get('/{storage_id}/stream')
+async def stream_storage_content(
+    storage_id: uuid.UUID,
+    folder: str = '',
+    stats: StatsMode = StatsMode.CACHED,
+    catalog: bool = False,
+    placeholders: bool = False,
+) -> StreamingResponse:
+    """
+    Содержимое папки построчно (NDJSON) по мере чтения папки, без сортировки и пагинации.
+    catalog - дополнять файлы данными каталога (заметки, теги, эмодзи),
+    placeholders - размерами и заглушками изображений (если уже есть в кэше)
+    """
+    content = await get_storage_content_stream_service(
+        storage_id=storage_id,
+        folder=folder,
+        stats=stats,
+        catalog=catalog,
+        placeholders=placeholders,
+    )
+    return StreamingResponse(content, media_type='application/x-ndjson')
+
+
+@router.get('/{storage_id}/search')
+async def search_storage_files(
+    storage_id: uuid.UUID,
+    q: str = Query(..., min_length=1),
+    prefix: bool = False,
+    page: int = 1,
+    page_size: int = PAGE_SIZE,
+) -> StorageSearchResponse:
+    files, total = await search_storage_files_service(
+        storage_id=storage_id, query=q, prefix=prefix, page=page, page_size=page_size
+    )
+    return StorageSearchResponse(
+        results=files,
+        pagination=Pagination(page=page, per_page=page_size, items=total),
+    )
 
 
 @router.get('/')
-async def get_storages_summary(user_id: uuid.UUID) -> StorageSummaryResponse:
+async def get_storages_summary(
+    user_id: uuid.UUID, stats: StatsMode = StatsMode.CACHED
+) -> StorageSummaryResponse:
     try:
-        storages_content = await get_storages_summary_service(user_id)
+        storages_content = await get_storages_summary_service(user_id, stats=stats)
     except FileNotFoundError as e:
         raise BadRequest from e
     except Exception:
@@ -62,24 +217,42 @@ async def get_storages_summary(user_id: uuid.UUID) -> StorageSummaryResponse:
 
 
 @router.get('/collage/{storage_id}')
-async def get_storage_collage(storage_id: uuid.UUID, folder: str) -> StreamingResponse:
+async def get_storage_collage(
+    storage_id: uuid.UUID, folder: str, conditional: ConditionalRequest = Depends()
+) -> Response:
+    validators = None
     try:
+        validators = await get_storage_collage_validators_service(storage_id, folder)
+        if validators is not None and conditional.not_modified(validators):
+            return not_modified_response(validators.headers(settings.COLLAGE_CACHE_CONTROL))
         collage_image = await get_storage_collage_service(
             storage_id=storage_id,
             folder=folder,
         )
+        if validators is None:
+            # Новый коллаж сохранён в кэш (коллажи-заглушки не сохраняются)
+            validators = await get_storage_collage_validators_service(storage_id, folder)
     except ValueError as e:
         raise BadRequest(error_code='400', error_message=e.args[0])
+    except ServiceUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Storage Manager get_storage_collage Exception: {e}")
         collage_image = CollageMaker.generate_image_with_text(text=str(e))
-    return StreamingResponse(io.BytesIO(collage_image), media_type='image/png')
+        validators = None
+    headers = validators.headers(settings.COLLAGE_CACHE_CONTROL) if validators else None
+    return Response(collage_image, media_type='image/png', headers=headers)
 
 
 @router.get('/preview/{storage_id}')
 async def get_preview(
-    storage_id: uuid.UUID, folder: str, filename: str, width: int | None = None
-) -> StreamingResponse:
+    storage_id: uuid.UUID,
+    folder: str,
+    filename: str,
+    width: int | None = None,
+    accept: str | None = Header(None),
+    conditional: ConditionalRequest = Depends(),
+) -> Response:
     # try:
     if not width:
         width = settings.THUMBNAIL_WIDTH
@@ -89,6 +262,8 @@ async def get_preview(
         filename=filename,
         width=width,
         preview=True,
+        accept=accept,
+        conditional=conditional,
     )
     # except Exception as e:
     #     print(e)
@@ -96,8 +271,13 @@ async def get_preview(
 
 @router.get('/file/{storage_id}')
 async def get_file(
-    storage_id: uuid.UUID, folder: str, filename: str, width: int | None = None
-) -> StreamingResponse:
+    storage_id: uuid.UUID,
+    folder: str,
+    filename: str,
+    width: int | None = None,
+    accept: str | None = Header(None),
+    conditional: ConditionalRequest = Depends(),
+) -> Response:
     if not width:
         width = settings.PREVIEW_WIDTH
     # try:
@@ -107,6 +287,8 @@ async def get_file(
         filename=filename,
         width=width,
         preview=False,
+        accept=accept,
+        conditional=conditional,
     )
     # except Exception as e:
     #     print(e)
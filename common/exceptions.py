@@ -65,6 +65,26 @@ class NotAllowed(BaseApiException):
     status_code = status.HTTP_401_UNAUTHORIZED
 
 
+class ServiceUnavailable(BaseApiException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def __init__(
+        self,
+        *,
+        error_code: str | None = None,
+        error_message: str | None = None,
+        retry_after: int | None = None,
+    ):
+        super().__init__(error_code=error_code, error_message=error_message)
+        self.retry_after = retry_after  # секунды, заголовок Retry-After
+
+    async def get_response_data(self):
+        response = await super().get_response_data()
+        if self.retry_after is not None:
+            response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+
 async def handle_exception_response(
     request: Request, exc: BaseApiException  # pylint: disable=unused-argument
 ) -> JSONResponse:  # pylint: disable=unused-argument
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -20,6 +21,77 @@ class Settings(BaseSettings):
     CACHE_DIR: str = '/tmp/s_media_service'
     THUMBNAIL_WIDTH: int = 200
     PREVIEW_WIDTH: int = 400
+    # Уменьшение изображений: THUMBNAIL_* - /storage/preview, PREVIEW_* - /storage/file
+    # и /catalog/preview. Фильтр, качество JPEG и reducing_gap Pillow: изображение сначала
+    # уменьшается в целое число раз до размера не меньше итогового * reducing_gap
+    # (для JPEG - прямо при декодировании), меньше - быстрее и грубее, 0 - без этого шага
+    THUMBNAIL_RESAMPLE: Literal[
+        'nearest', 'box', 'bilinear', 'hamming', 'bicubic', 'lanczos'
+    ] = 'hamming'
+    THUMBNAIL_QUALITY: int = 75
+    THUMBNAIL_REDUCING_GAP: float = 2.0
+    PREVIEW_RESAMPLE: Literal[
+        'nearest', 'box', 'bilinear', 'hamming', 'bicubic', 'lanczos'
+    ] = 'hamming'
+    PREVIEW_QUALITY: int = 75
+    PREVIEW_REDUCING_GAP: float = 3.0
+    # Лестница размеров копий изображений: запрошенная ширина округляется вверх до ступени,
+    # шире последней ступени отдаётся оригинал. Пустой список - копии ровно запрошенной ширины
+    RENDITION_WIDTHS: list[int] = [200, 400, 800, 1600]
+    # Форматы копий по заголовку Accept в порядке предпочтения (если Pillow умеет их
+    # сохранять), иначе JPEG
+    RENDITION_FORMATS: list[Literal['avif', 'webp']] = ['avif', 'webp']
+    # Заглушки изображений в листингах (параметр placeholders): размеры и микрокопия
+    # не больше PLACEHOLDER_SIZE пикселей по большей стороне
+    PLACEHOLDER_SIZE: int = 16
+    PLACEHOLDER_QUALITY: int = 40
+    # Спрайт уменьшенных копий страницы листинга: клетки SPRITE_TILE_SIZE пикселей
+    # по SPRITE_COLUMNS в ряд
+    SPRITE_TILE_SIZE: int = 200
+    SPRITE_COLUMNS: int = 5
+    # Cache-Control ответов по эндпоинтам (max-age, immutable и т.д.); ETag и Last-Modified -
+    # по исходному файлу и параметрам копии, на условный запрос - ответ 304
+    PREVIEW_CACHE_CONTROL: str = 'public, max-age=86400'  # /storage/preview
+    FILE_CACHE_CONTROL: str = 'public, max-age=86400'  # /storage/file
+    COLLAGE_CACHE_CONTROL: str = 'public, max-age=3600'  # /storage/collage
+    CATALOG_PREVIEW_CACHE_CONTROL: str = 'public, max-age=86400'  # /catalog/preview
+    # /storage/sprite: имя спрайта зависит от содержимого страницы, поэтому он не меняется
+    SPRITE_CACHE_CONTROL: str = 'public, max-age=31536000, immutable'
+    # Размер пула потоков для блокирующих операций с файловой системой
+    FS_THREADS: int = 8
+    # Пул процессов для уменьшенных копий, превью видео и коллажей (0 - по числу ядер)
+    RENDER_PROCESSES: int = 0
+    RENDER_QUEUE_SIZE: int = 64  # Задач в пуле (выполняются и ждут), сверх - ответ 503
+    RENDER_RETRY_AFTER: int = 1  # секунды, заголовок Retry-After ответа 503
+    # Предварительная генерация копий и коллажей: одновременных рендерингов задания
+    PREGENERATE_CONCURRENCY: int = 2
+    PREGENERATE_JOB_TTL: float = 86400.0  # секунды, сколько помнить завершённые задания
+    # Наблюдение за файловой системой хранилищ
+    WATCHER_ENABLED: bool = False
+    WATCHER_FORCE_POLLING: bool = False
+    WATCHER_POLL_INTERVAL: float = 30.0  # секунды, для опроса без inotify
+    WATCHER_DEBOUNCE: float = 1.0  # секунды, накопление событий перед обработкой
+    # Размер пачки элементов при потоковой выдаче содержимого папки (NDJSON)
+    STREAM_BATCH_SIZE: int = 500
+    # Параллельный подсчёт статистики папок: вложенные папки верхнего уровня
+    # обходятся в пуле из SCAN_WORKERS процессов (или потоков - для сетевых хранилищ).
+    # 0 - обход в одном потоке
+    SCAN_WORKERS: int = 0
+    SCAN_EXECUTOR: Literal['process', 'thread'] = 'process'
+    # Оценка статистики папок (stats=estimate): глубина обхода и выборка вложенных папок
+    STATS_ESTIMATE_DEPTH: int = 2
+    STATS_ESTIMATE_SAMPLE: int = 16
+    # Сводка по хранилищам пользователя
+    SUMMARY_CONCURRENCY: int = 4  # Сколько хранилищ обходится одновременно
+    SUMMARY_TIMEOUT: float = 10.0  # секунды на хранилище, затем - последняя сохранённая статистика
+    # Фоновый обход хранилищ и индекс папок и файлов (storage_entries)
+    CRAWLER_ENABLED: bool = False
+    CRAWLER_INTERVAL: float = 600.0  # секунды между полными обходами
+    # Поиск одинаковых файлов: количество процессов для хэширования
+    DUPLICATES_PROCESSES: int = 4
+    # Кэш содержимого папок
+    LISTING_CACHE_TTL: float = 300.0  # секунды, 0 - кэш выключен
+    LISTING_CACHE_MAX_ITEMS: int = 500_000  # Суммарное количество папок и файлов в кэше
 
     model_config = SettingsConfigDict(
         env_file=ROOT_DIR / '.env',
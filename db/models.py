@@ -6,6 +6,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
     Index,
     Integer,
@@ -28,6 +29,7 @@ class StringSize(Enum):
     LENGTH_TAG: int = 30
     LENGTH_255: int = 255
     LENGTH_IP: int = 15
+    LENGTH_PATH: int = 1024
 
 
 class Storage(Base):
@@ -45,17 +47,68 @@ class Storage(Base):
 
 
 class StorageStatistic(Base):
+    """
+    Статистика папки хранилища (по всему поддереву).
+    Действительна, пока mtime папки совпадает с сохранённым.
+    """
+
     __tablename__ = 'storage_statistic'
 
     id = Column(BigInteger, primary_key=True)
     storage_id = Column(GUID, ForeignKey('storages.id'), nullable=False)
-    path = Column(String(StringSize.LENGTH_255), nullable=False)
+    path = Column(String(StringSize.LENGTH_PATH), nullable=False)  # Путь внутри хранилища
     files_count = Column(Integer(), nullable=False)
     folders_count = Column(Integer(), nullable=False)
-    size = Column(Integer(), nullable=False)
+    direct_files_count = Column(Integer(), nullable=False, server_default='0')
+    direct_folders_count = Column(Integer(), nullable=False, server_default='0')
+    size = Column(BigInteger(), nullable=False)
+    mtime = Column(Float, nullable=True, comment='Directory mtime, NULL - stale')
     created_at = Column(DateTime, server_default=text('NOW()'), comment='Record creation time')
 
     Index('idx_storage_statistic_path_created_at', path, created_at.desc())
+    Index('idx_storage_statistic_storage_id_path', storage_id, path, unique=True)
+
+
+class StorageEntry(Base):
+    """
+    Индекс папок и файлов хранилища, заполняется фоновым обходом (services/crawler.py).
+    Для папок mtime - mtime папки на момент последнего обхода её содержимого.
+    """
+
+    __tablename__ = 'storage_entries'
+
+    id = Column(BigInteger, primary_key=True)
+    storage_id = Column(GUID, ForeignKey('storages.id'), nullable=False)
+    path = Column(String(StringSize.LENGTH_PATH), nullable=False)  # Путь внутри хранилища
+    parent = Column(String(StringSize.LENGTH_PATH), nullable=True)  # NULL - корень хранилища
+    name = Column(String(StringSize.LENGTH_FILE_NAME), nullable=False)
+    is_dir = Column(Boolean, nullable=False)
+    size = Column(BigInteger(), nullable=False, server_default='0')
+    mtime = Column(Float, nullable=False)
+    ctime = Column(Float, nullable=False)
+    file_group = Column(String(StringSize.LENGTH_TAG), nullable=True, comment='FileGroup')
+
+    Index('idx_storage_entries_storage_id_path', storage_id, path, unique=True)
+    Index('idx_storage_entries_storage_id_parent', storage_id, parent, is_dir, name)
+    # Поиск по имени: GIN индекс lower(name) gin_trgm_ops (pg_trgm) создаётся миграцией b7f3c9d1e5a2
+
+
+class FileDuplicate(Base):
+    """
+    Файл из найденного набора одинаковых файлов (одинаковые size и hash)
+    """
+
+    __tablename__ = 'file_duplicates'
+
+    id = Column(BigInteger, primary_key=True)
+    storage_id = Column(GUID, ForeignKey('storages.id'), nullable=False)
+    path = Column(String(StringSize.LENGTH_PATH), nullable=False)  # Путь внутри хранилища
+    size = Column(BigInteger(), nullable=False)
+    hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, server_default=text('NOW()'), comment='Record creation time')
+
+    Index('idx_file_duplicates_storage_id', storage_id)
+    Index('idx_file_duplicates_size_hash', size, hash)
 
 
 class File(Base):
@@ -0,0 +1,55 @@
+import uuid
+from typing import List
+
+from sqlalchemy import delete, func, select
+
+from db.connector import AsyncSession
+from db.models import FileDuplicate, StorageEntry
+
+
+async def get_same_size_files(session: AsyncSession, storage_ids: List[uuid.UUID]) -> list:
+    """
+    Файлы из индекса storage_entries, размер которых совпадает с размером другого файла.
+    Возвращает строки (storage_id, path, size)
+    """
+    files = (
+        StorageEntry.storage_id.in_(storage_ids),
+        StorageEntry.is_dir.is_(False),
+        StorageEntry.size > 0,
+    )
+    same_sizes = (
+        select(StorageEntry.size).where(*files).group_by(StorageEntry.size).having(func.count() > 1)
+    )
+    result = await session.execute(
+        select(StorageEntry.storage_id, StorageEntry.path, StorageEntry.size)
+        .where(*files, StorageEntry.size.in_(same_sizes))
+        .order_by(StorageEntry.size)
+    )
+    return list(result.all())
+
+
+async def save_file_duplicates(
+    session: AsyncSession, storage_ids: List[uuid.UUID], duplicates: List[dict]
+) -> None:
+    """
+    Заменяет найденные ранее дубликаты хранилищ storage_ids
+    duplicates: [{storage_id, path, size, hash}]
+    """
+    await delete_file_duplicates(session, storage_ids)
+    session.add_all([FileDuplicate(**duplicate) for duplicate in duplicates])
+    await session.flush()
+
+
+async def get_file_duplicates(
+    session: AsyncSession, storage_ids: List[uuid.UUID]
+) -> List[FileDuplicate]:
+    result = await session.execute(
+        select(FileDuplicate)
+        .where(FileDuplicate.storage_id.in_(storage_ids))
+        .order_by(FileDuplicate.size.desc(), FileDuplicate.hash, FileDuplicate.path)
+    )
+    return list(result.scalars().all())
+
+
+async def delete_file_duplicates(session: AsyncSession, storage_ids: List[uuid.UUID]) -> None:
+    await session.execute(delete(FileDuplicate).where(FileDuplicate.storage_id.in_(storage_ids)))
@@ -0,0 +1,192 @@
+import uuid
+from typing import List
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from db.connector import AsyncSession
+from db.models import StorageEntry
+from repositories.storage_statistic import CHUNK_SIZE, chunks
+
+ENTRY_STATE_COLUMNS = (
+    StorageEntry.path,
+    StorageEntry.parent,
+    StorageEntry.name,
+    StorageEntry.is_dir,
+    StorageEntry.size,
+    StorageEntry.mtime,
+    StorageEntry.ctime,
+    StorageEntry.file_group,
+)
+
+
+async def get_storage_entries_state(session: AsyncSession, storage_id: uuid.UUID) -> list:
+    """
+    Все записи индекса хранилища (без ORM объектов) - для инкрементального обхода
+    """
+    result = await session.execute(
+        select(*ENTRY_STATE_COLUMNS).where(StorageEntry.storage_id == storage_id)
+    )
+    return list(result.all())
+
+
+async def get_storage_entry(
+    session: AsyncSession, storage_id: uuid.UUID, path: str
+) -> StorageEntry | None:
+    return await session.scalar(
+        select(StorageEntry).where(StorageEntry.storage_id == storage_id, StorageEntry.path == path)
+    )
+
+
+async def save_storage_entries(
+    session: AsyncSession, storage_id: uuid.UUID, entries: dict[str, dict]
+) -> None:
+    """
+    Создаёт или обновляет записи индекса.
+    entries: {path: {parent, name, is_dir, size, mtime, ctime, file_group}}
+    """
+    paths = list(entries)
+    existing = {}
+    for chunk in chunks(paths):
+        result = await session.execute(
+            select(StorageEntry).where(
+                StorageEntry.storage_id == storage_id, StorageEntry.path.in_(chunk)
+            )
+        )
+        existing.update({row.path: row for row in result.scalars().all()})
+    for path, values in entries.items():
+        row = existing.get(path)
+        if row is None:
+            session.add(StorageEntry(storage_id=storage_id, path=path, **values))
+            continue
+        for key, value in values.items():
+            setattr(row, key, value)
+    await session.flush()
+
+
+async def delete_storage_entries(
+    session: AsyncSession, storage_id: uuid.UUID, paths: List[str]
+) -> None:
+    """
+    Удаляет записи paths и всех вложенных в них папок и файлов
+    """
+    for path in paths:
+        await session.execute(
+            delete(StorageEntry).where(
+                StorageEntry.storage_id == storage_id,
+                or_(
+                    StorageEntry.path == path,
+                    StorageEntry.path.startswith(f'{path}/', autoescape=True),
+                ),
+            )
+        )
+
+
+async def delete_all_storage_entries(session: AsyncSession, storage_id: uuid.UUID) -> None:
+    await session.execute(delete(StorageEntry).where(StorageEntry.storage_id == storage_id))
+
+
+async def count_folder_entries(
+    session: AsyncSession, storage_id: uuid.UUID, parent: str
+) -> tuple[int, int]:
+    """
+    Количество (папок, файлов) непосредственно в папке parent
+    """
+    result = await session.execute(
+        select(StorageEntry.is_dir, func.count())
+        .where(StorageEntry.storage_id == storage_id, StorageEntry.parent == parent)
+        .group_by(StorageEntry.is_dir)
+    )
+    counts = dict(result.all())
+    return counts.get(True, 0), counts.get(False, 0)
+
+
+def _name_filter(query: str, prefix: bool) -> ColumnElement:
+    """
+    Условие поиска по имени, совпадающее с выражением индекса lower(name) gin_trgm_ops
+    """
+    name = func.lower(StorageEntry.name)
+    if prefix:
+        return name.startswith(query.lower(), autoescape=True)
+    return name.contains(query.lower(), autoescape=True)
+
+
+async def search_storage_files(
+    session: AsyncSession,
+    storage_id: uuid.UUID,
+    query: str,
+    prefix: bool = False,
+    offset: int = 0,
+    limit: int = CHUNK_SIZE,
+) -> List[StorageEntry]:
+    """
+    Файлы хранилища, имя которых содержит query (или начинается с query, если prefix)
+    """
+    result = await session.execute(
+        select(StorageEntry)
+        .where(
+            StorageEntry.storage_id == storage_id,
+            StorageEntry.is_dir.is_(False),
+            _name_filter(query, prefix),
+        )
+        .order_by(StorageEntry.name, StorageEntry.path)
+        .offset(offset)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def count_storage_files(
+    session: AsyncSession, storage_id: uuid.UUID, query: str, prefix: bool = False
+) -> int:
+    return await session.scalar(
+        select(func.count()).where(
+            StorageEntry.storage_id == storage_id,
+            StorageEntry.is_dir.is_(False),
+            _name_filter(query, prefix),
+        )
+    )
+
+
+def keyset_after(sort_columns: list, key: tuple) -> ColumnElement:
+    """
+    Условие "строка после key" для сортировки по sort_columns (все по возрастанию)
+    """
+    conditions = []
+    for i, column in enumerate(sort_columns):
+        equal = [sort_columns[j] == key[j] for j in range(i)]
+        conditions.append(and_(*equal, column > key[i]))
+    return or_(*conditions)
+
+
+async def get_folder_entries(
+    session: AsyncSession,
+    storage_id: uuid.UUID,
+    parent: str,
+    is_dir: bool,
+    sort_columns: list,
+    offset: int = 0,
+    limit: int = CHUNK_SIZE,
+    after: tuple | None = None,
+    join=None,
+) -> list:
+    """
+    Страница папок или файлов папки parent в порядке sort_columns.
+    after - ключ сортировки последней строки предыдущей страницы (вместо offset).
+    join - (модель, условие) для внешнего соединения, если сортировка по её колонкам.
+    Возвращает строки (StorageEntry, [модель join])
+    """
+    query = select(StorageEntry)
+    if join is not None:
+        model, on_clause = join
+        query = select(StorageEntry, model).outerjoin(model, on_clause)
+    query = query.where(
+        StorageEntry.storage_id == storage_id,
+        StorageEntry.parent == parent,
+        StorageEntry.is_dir == is_dir,
+    )
+    if after is not None:
+        query = query.where(keyset_after(sort_columns, after))
+    query = query.order_by(*sort_columns).offset(offset).limit(limit)
+    result = await session.execute(query)
+    return list(result.all())
@@ -0,0 +1,117 @@
+import uuid
+from typing import List
+
+from sqlalchemy import delete, or_, select, update
+
+from db.connector import AsyncSession
+from db.models import StorageStatistic
+
+# Ограничение количества параметров в одном IN (...)
+CHUNK_SIZE = 500
+
+
+def chunks(items: list, size: int = CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _subtree(query, storage_id: uuid.UUID, path: str):
+    """Ограничивает запрос записями папки path хранилища и всех вложенных в неё папок"""
+    query = query.where(StorageStatistic.storage_id == storage_id)
+    if path:
+        query = query.where(
+            or_(
+                StorageStatistic.path == path,
+                StorageStatistic.path.startswith(f'{path}/', autoescape=True),
+            )
+        )
+    return query
+
+
+async def get_storage_statistic(
+    session: AsyncSession, storage_id: uuid.UUID, path: str = ''
+) -> List[StorageStatistic]:
+    """
+    Возвращает статистику папки path хранилища и всех вложенных в неё папок
+    """
+    result = await session.execute(_subtree(select(StorageStatistic), storage_id, path))
+    return list(result.scalars().all())
+
+
+async def get_storage_statistic_mtimes(
+    session: AsyncSession, storage_id: uuid.UUID, path: str = ''
+) -> dict[str, float | None]:
+    """
+    Возвращает только mtime статистики папки path и всех вложенных папок: {path: mtime}
+    """
+    query = select(StorageStatistic.path, StorageStatistic.mtime)
+    result = await session.execute(_subtree(query, storage_id, path))
+    return dict(result.tuples().all())
+
+
+async def get_storage_statistic_by_paths(
+    session: AsyncSession, storage_id: uuid.UUID, paths: List[str]
+) -> List[StorageStatistic]:
+    rows = []
+    for chunk in chunks(list(paths)):
+        result = await session.execute(
+            select(StorageStatistic).where(
+                StorageStatistic.storage_id == storage_id, StorageStatistic.path.in_(chunk)
+            )
+        )
+        rows += result.scalars().all()
+    return rows
+
+
+async def get_storage_statistic_by_path(
+    session: AsyncSession, storage_id: uuid.UUID, path: str
+) -> StorageStatistic | None:
+    return await session.scalar(
+        select(StorageStatistic).where(
+            StorageStatistic.storage_id == storage_id, StorageStatistic.path == path
+        )
+    )
+
+
+async def save_storage_statistic(
+    session: AsyncSession, storage_id: uuid.UUID, statistic: dict[str, dict]
+) -> None:
+    """
+    Создаёт или обновляет записи статистики.
+    statistic: {path: {files_count, folders_count, direct_files_count, ..., mtime}}
+    """
+    paths = list(statistic)
+    existing = {}
+    for chunk in chunks(paths):
+        result = await session.execute(
+            select(StorageStatistic).where(
+                StorageStatistic.storage_id == storage_id, StorageStatistic.path.in_(chunk)
+            )
+        )
+        existing.update({row.path: row for row in result.scalars().all()})
+    for path, values in statistic.items():
+        row = existing.get(path)
+        if row is None:
+            session.add(StorageStatistic(storage_id=storage_id, path=path, **values))
+            continue
+        for key, value in values.items():
+            setattr(row, key, value)
+    await session.flush()
+
+
+async def invalidate_storage_statistic(
+    session: AsyncSession, storage_id: uuid.UUID, paths: List[str]
+) -> None:
+    """
+    Помечает статистику папок как устаревшую (mtime = NULL)
+    """
+    for chunk in chunks(list(paths)):
+        await session.execute(
+            update(StorageStatistic)
+            .where(StorageStatistic.storage_id == storage_id, StorageStatistic.path.in_(chunk))
+            .values(mtime=None)
+        )
+
+
+async def delete_storage_statistic(session: AsyncSession, storage_id: uuid.UUID) -> None:
+    await session.execute(delete(StorageStatistic).where(StorageStatistic.storage_id == storage_id))
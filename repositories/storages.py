@@ -6,6 +6,9 @@ from sqlalchemy import delete, select
 from db import models
 from db.connector import AsyncSession
 from db.models import Storage
+from repositories.duplicates import delete_file_duplicates
+from repositories.storage_entry import delete_all_storage_entries
+from repositories.storage_statistic import delete_storage_statistic
 
 
 async def create_storage(session: AsyncSession, new_storage: Storage) -> Storage:
@@ -41,6 +44,9 @@ async def update_storage(
 async def delete_storage(session: AsyncSession, storage_id: uuid) -> int:
     storage = await get_storage_by_id(session, storage_id)
     if storage:
+        await delete_storage_statistic(session, storage_id)
+        await delete_all_storage_entries(session, storage_id)
+        await delete_file_duplicates(session, [storage_id])
         result = await session.execute(
             delete(models.Storage).where(models.Storage.id == storage_id)
         )
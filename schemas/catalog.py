@@ -65,6 +65,10 @@ class CatalogFileResponseResult(BaseModel):
     tags: list[str] = []
     emoji: list[EmojiCount] = []
     created_at: datetime = None
+    # Изображения: размеры и заглушка (data URI микрокопии), если они уже есть в кэше
+    width: int | None = None
+    height: int | None = None
+    placeholder: str | None = None
 
 
 class CatalogFileResponse(BaseModel):
@@ -105,6 +109,7 @@ class CatalogContentRequest(BaseModel):
     sort: str = 'created_at'
     sort_direction: str = 'desc'
     readonly: bool = True  # По ссылке может быть readonly
+    placeholders: bool = False  # Размеры и заглушки изображений
 
     @field_validator('public', mode='before')
     @classmethod
@@ -0,0 +1,31 @@
+import uuid
+
+from pydantic import BaseModel
+
+from schemas.storage import Pagination
+
+
+class DuplicateFile(BaseModel):
+    storage_id: uuid.UUID
+    path: str  # Путь внутри хранилища
+
+
+class DuplicateGroup(BaseModel):
+    """
+    Набор одинаковых файлов
+    """
+
+    hash: str
+    size: int
+    wasted: int  # Место, занятое копиями (size * (количество файлов - 1))
+    files: list[DuplicateFile]
+
+
+class DuplicatesResponse(BaseModel):
+    results: list[DuplicateGroup]
+    wasted: int  # Всего по всем наборам
+    pagination: Pagination
+
+
+class DuplicatesScanResponse(BaseModel):
+    started: bool  # False - поиск по этим хранилищам уже идёт
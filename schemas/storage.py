@@ -94,6 +94,10 @@ class StorageFile(BaseModel):
     created: datetime
     updated: datetime
     group: FileGroup | None = None
+    # Изображения: размеры и заглушка (data URI микрокопии), если они уже есть в кэше
+    width: int | None = None
+    height: int | None = None
+    placeholder: str | None = None
     # Data from DB
     note: str | None = None
     is_public: bool = False
@@ -129,6 +133,7 @@ class StorageFolder(Folder):
     storage_name: str
     created_by: uuid.UUID
     path: str  # Путь внутри хранилища
+    stale: bool = False  # Статистика не успела пересчитаться, показана последняя сохранённая
 
 
 Folder.model_rebuild()
@@ -139,6 +144,70 @@ class StorageSummaryResponse(BaseModel):
     results: list[StorageFolder]
 
 
+class StorageSearchResponse(BaseModel):
+    results: list[StorageFile]
+    pagination: Pagination
+
+
+class PregenerateStatus(Enum):
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+
+class PregenerateJobResponse(BaseModel):
+    """
+    Задание предварительной генерации уменьшенных копий и коллажей
+    """
+
+    model_config = ConfigDict(from_attributes=True)
+    id: uuid.UUID
+    storage_id: uuid.UUID
+    folder: str
+    status: PregenerateStatus
+    total: int | None  # None - ещё считается
+    processed: int
+    rendered: int
+    skipped: int  # Уже были в кэше
+    failed: int
+    started_at: datetime
+    finished_at: datetime | None
+    error: str | None
+
+
+class RenderStatsResponse(BaseModel):
+    executed: int  # Запущено рендерингов
+    coalesced: int  # Запросов, дождавшихся уже идущего рендеринга той же копии
+    in_flight: int  # Выполняется сейчас
+
+
+class ListingCacheStatsResponse(BaseModel):
+    hits: int  # Содержимое папки взято из кэша
+    misses: int  # Содержимое папки прочитано с диска
+    entries: int  # Папок в кэше
+    items: int  # Элементов во всех папках кэша
+    max_items: int  # Предел элементов (settings.LISTING_CACHE_MAX_ITEMS)
+
+
+class SpriteItem(BaseModel):
+    """Положение уменьшенной копии файла на спрайте"""
+
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class SpriteSheetResponse(BaseModel):
+    url: str | None  # Изображение спрайта, None - на странице нет изображений
+    width: int
+    height: int
+    items: list[SpriteItem]
+
+
 class FolderContentResponse(BaseModel):
     results: StorageFolder
     pagination: Pagination
+    next_cursor: str | None = None  # Курсор следующей страницы (параметр cursor)
@@ -1,19 +1,34 @@
 import os
+import re
+import tempfile
+from io import BytesIO
 from pathlib import Path
 from PIL import Image
 
 from common.settings import settings
 
 
+# Форматы копий в кэше по расширению файла
+CACHE_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP', 'avif': 'AVIF'}
+
+
 class CacheManager:
-    def __init__(self, original_path: str):
+    def __init__(self, original_path: str, create_dir: bool = True, extension: str = 'jpg'):
         self.original_path = original_path
+        self.extension = extension
         self.cache_dir = str(os.path.join(settings.CACHE_DIR, os.path.dirname(original_path)[1:]))
-        os.makedirs(self.cache_dir, mode=0o777, exist_ok=True)
+        if create_dir:
+            os.makedirs(self.cache_dir, mode=0o777, exist_ok=True)
+
+    def variant(self, extension: str) -> 'CacheManager':
+        """Кэш копий того же файла в другом формате"""
+        if extension == self.extension:
+            return self
+        return CacheManager(self.original_path, create_dir=False, extension=extension)
 
     def _get_cache_file_path(self, width: int) -> str:
         # Формируем путь до файла кэша
-        base_name = f'{Path(self.original_path).stem}_{width}.jpg'
+        base_name = f'{Path(self.original_path).stem}_{width}.{self.extension}'
         return os.path.join(self.cache_dir, base_name)
 
     def is_file_cached(self, width: int) -> bool:
@@ -23,19 +38,66 @@ class CacheManager:
     def get_cached_file(self, width: int) -> str:
         return self._get_cache_file_path(width)
 
-    def save_to_cache(self, img: Image.Image, width: int) -> None:
-        cache_path = self._get_cache_file_path(width)
-        file_extension = os.path.splitext(cache_path)[1].lower()  # Получаем расширение файла
-        if file_extension in ['.jpg', '.jpeg']:
+    def encode(self, img: Image.Image, *, quality: int = 75) -> bytes:
+        """Кодирование копии в формат кэша: эти же байты отдаются в ответе"""
+        image_format = CACHE_FORMATS.get(self.extension)
+        if image_format is None:
+            raise ValueError(f'Unsupported file extension: .{self.extension}')
+        if image_format == 'JPEG':
             # Конвертируем изображение в RGB, если оно содержит альфа-канал
             if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
                 img = img.convert('RGB')
-            img.save(cache_path, format='JPEG')
-        elif file_extension == '.png':
-            img.save(cache_path, format='PNG')
-        else:
-            raise ValueError(f'Unsupported file extension: {file_extension}')
+        byte_io = BytesIO()
+        img.save(byte_io, format=image_format, quality=quality)
+        return byte_io.getvalue()
+
+    def save_to_cache(self, img: Image.Image, width: int, *, quality: int = 75) -> bytes:
+        """Кодирует и сохраняет копию, возвращает её байты"""
+        data = self.encode(img, quality=quality)
+        self.save_bytes_to_cache(data, width)
+        return data
 
     def save_bytes_to_cache(self, byte_string: bytes, width: int):
-        with open(self._get_cache_file_path(width=width), 'wb') as f:
-            f.write(byte_string)
+        self._write_atomic(self._get_cache_file_path(width=width), byte_string)
+
+    def get_placeholder_file(self) -> str:
+        # Заглушка для листингов (services/placeholders.py) - общая для всех форматов копий
+        return os.path.join(self.cache_dir, f'{Path(self.original_path).stem}_placeholder.json')
+
+    def save_placeholder(self, data: bytes):
+        self._write_atomic(self.get_placeholder_file(), data)
+
+    def _write_atomic(self, cache_path: str, byte_string: bytes):
+        # Запись во временный файл и переименование: читатели не видят недописанный файл
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(byte_string)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def remove_cached_files(self) -> int:
+        """
+        Удаляет все закэшированные размеры файла и заглушку (например, после изменения
+        оригинала). Возвращает количество удалённых файлов.
+        """
+        extensions = '|'.join(CACHE_FORMATS)
+        pattern = re.compile(
+            rf'{re.escape(Path(self.original_path).stem)}_(\d+\.({extensions})|placeholder\.json)'
+        )
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            if pattern.fullmatch(name):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
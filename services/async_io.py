@@ -0,0 +1,114 @@
+"""
+Выполнение блокирующих операций (обход файловой системы, чтение/запись файлов)
+в ограниченном пуле потоков (FS_THREADS), чтобы event loop занимался только обработкой запросов.
+Рендеринг изображений и видео (декодирование, уменьшение, кодирование) занимает процессор,
+поэтому выполняется в пуле процессов с ограниченной очередью.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from common.exceptions import ServiceUnavailable
+from common.settings import settings
+
+_fs_executor: ThreadPoolExecutor | None = None
+_scan_executor: Executor | None = None
+_render_executor: ProcessPoolExecutor | None = None
+_render_slots: threading.BoundedSemaphore | None = None
+
+
+def get_fs_executor() -> ThreadPoolExecutor:
+    global _fs_executor  # pylint: disable=global-statement
+    if _fs_executor is None:
+        _fs_executor = ThreadPoolExecutor(
+            max_workers=settings.FS_THREADS, thread_name_prefix='s_media_filesystem'
+        )
+    return _fs_executor
+
+
+async def run_fs(func: Callable, *args, **kwargs) -> Any:
+    """Операции с файловой системой: обход папок, stat, чтение и запись файлов"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_fs_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+async def read_bytes(path: str) -> bytes:
+    return await run_fs(_read_bytes, path)
+
+
+def get_render_executor() -> ProcessPoolExecutor:
+    global _render_executor, _render_slots  # pylint: disable=global-statement
+    if _render_executor is None:
+        _render_executor = ProcessPoolExecutor(
+            max_workers=settings.RENDER_PROCESSES or os.cpu_count()
+        )
+        _render_slots = threading.BoundedSemaphore(settings.RENDER_QUEUE_SIZE)
+    return _render_executor
+
+
+async def run_render(func: Callable, *args, **kwargs) -> Any:
+    """
+    Рендеринг изображений и кадров видео в пуле процессов; func и аргументы передаются
+    через pickle. Если в пуле уже RENDER_QUEUE_SIZE задач, новая не ставится в очередь,
+    а сразу выбрасывается ServiceUnavailable (ответ 503 с Retry-After).
+    """
+    global _render_executor  # pylint: disable=global-statement
+    executor = get_render_executor()
+    slots = _render_slots
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable(
+            error_code='render_queue_full',
+            error_message='Слишком много запросов на обработку изображений',
+            retry_after=settings.RENDER_RETRY_AFTER,
+        )
+    try:
+        future: Future = executor.submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        slots.release()
+        raise
+    # Место в очереди освобождается, когда задача завершена в пуле (даже если запрос отменён)
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        # Процесс пула аварийно завершился (например, нехватка памяти) - пул создаётся заново
+        if _render_executor is executor:
+            _render_executor = None
+        raise
+
+
+def get_scan_executor() -> Executor | None:
+    """Пул для параллельного обхода поддеревьев (SCAN_WORKERS), None - обход без пула"""
+    global _scan_executor  # pylint: disable=global-statement
+    if settings.SCAN_WORKERS <= 0:
+        return None
+    if _scan_executor is None:
+        if settings.SCAN_EXECUTOR == 'thread':
+            _scan_executor = ThreadPoolExecutor(
+                max_workers=settings.SCAN_WORKERS, thread_name_prefix='s_media_scan'
+            )
+        else:
+            _scan_executor = ProcessPoolExecutor(max_workers=settings.SCAN_WORKERS)
+    return _scan_executor
+
+
+def shutdown_executors() -> None:
+    global _fs_executor, _scan_executor, _render_executor  # pylint: disable=global-statement
+    if _fs_executor is not None:
+        _fs_executor.shutdown(wait=False, cancel_futures=True)
+        _fs_executor = None
+    if _scan_executor is not None:
+        _scan_executor.shutdown(wait=False, cancel_futures=True)
+        _scan_executor = None
+    if _render_executor is not None:
+        _render_executor.shutdown(wait=False, cancel_futures=True)
+        _render_executor = None
@@ -46,8 +46,11 @@ from schemas.catalog import (
     ListCatalogFilesResponse, ListCatalogFilesResponseWithPagination,
 )
 from schemas.storage import EmojiCount, StorageFile, Pagination
+from services.async_io import run_fs
 from services.CacheManager import CacheManager
-from services.storage_file import ResponseFile
+from services.http_cache import ConditionalRequest
+from services.placeholders import add_placeholders
+from services.storage_file import ResponseFile, negotiate_image_format
 
 
 class CatalogFileBase:
@@ -291,6 +294,8 @@ class ListCatalogFileResponse:
         async with AsyncSession() as session:
             files_list = await get_files_by_filter(session, storage_id, params)
             result = await self._convert_files_to_catalog_file_response_result(session, files_list)
+        if params.placeholders:
+            await add_placeholders(result, [file.name for file in files_list])
         pagination = await self._create_pagination()
         return result, pagination
 
@@ -327,7 +332,7 @@ class ListCatalogFileResponse:
 
 
 async def get_items_for_main_page_service(
-    created_before: datetime.datetime = None, **kwargs
+    created_before: datetime.datetime = None, placeholders: bool = False, **kwargs
 ) -> ListCatalogFilesResponse:
     async with AsyncSession() as session:
         files = await get_items_for_main_page(session, created_before=created_before, **kwargs)
@@ -346,18 +351,28 @@ async def get_items_for_main_page_service(
                 created_at=file.created_at,
             )
             result.append(result_file)
-        return ListCatalogFilesResponse(files=result)
+    if placeholders:
+        await add_placeholders(result, [file.name for file in files])
+    return ListCatalogFilesResponse(files=result)
 
 
-async def get_catalog_file_service(file_id: uuid.UUID, width: int = settings.PREVIEW_WIDTH):
+async def get_catalog_file_service(
+    file_id: uuid.UUID,
+    width: int = settings.PREVIEW_WIDTH,
+    accept: str | None = None,
+    conditional: ConditionalRequest | None = None,
+):
     async with AsyncSession() as session:
         file = await get_file_by_id(session, file_id=file_id)
     result = ResponseFile(
         filename=file.name,
-        cache_manager=CacheManager(file.name),
-        width=width
+        cache_manager=await run_fs(CacheManager, file.name),
+        width=width,
+        image_format=negotiate_image_format(accept),
+    )
+    return await result.get_response(
+        preview=True, cache_control=settings.CATALOG_PREVIEW_CACHE_CONTROL, conditional=conditional
     )
-    return await result.get_preview()
 
 
 async def get_files_by_names_service(file_names: list):
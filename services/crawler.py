@@ -0,0 +1,240 @@
+"""
+Фоновый обход хранилищ, заполняющий индекс папок и файлов (storage_entries)
+и статистику папок (storage_statistic).
+
+Обход инкрементальный: содержимое папки, mtime которой совпадает с сохранённым в индексе,
+берётся из индекса - для неё делается только stat вложенных папок.
+С диска заново читаются только изменившиеся папки и папки, явно переданные в force
+(например, по событиям наблюдателя: изменение файла не меняет mtime папки).
+"""
+import asyncio
+import logging
+import os
+import stat
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from common.settings import settings
+from db.connector import AsyncSession
+from db.models import Storage
+from repositories.storage_entry import (
+    delete_storage_entries,
+    get_storage_entries_state,
+    get_storage_entry,
+    save_storage_entries,
+)
+from schemas.storage import FileGroup
+from services.async_io import run_fs
+from services.folder_stats import FolderStats, FolderStatsIndex
+from services.storages import get_list_storages_service
+from services.watcher import FileSystemChanges
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CrawlResult:
+    entries: dict[str, dict] = field(default_factory=dict)  # Новые и изменившиеся записи
+    deleted: list[str] = field(default_factory=list)  # Исчезнувшие папки и файлы
+    folders: list[tuple[str, FolderStats]] = field(default_factory=list)  # Снизу вверх
+    scanned: int = 0  # Сколько папок прочитано с диска
+
+
+def _join(parent: str, name: str) -> str:
+    return f'{parent}/{name}' if parent else name
+
+
+def _relative(root: str, path: str) -> str:
+    path = os.path.relpath(path, root)
+    return '' if path == '.' else path
+
+
+def _entry_values(parent: str | None, name: str, is_dir: bool, entry_stat) -> dict:
+    group = None if is_dir else FileGroup.get_group(os.path.splitext(name)[1][1:])
+    return {
+        'parent': parent,
+        'name': name,
+        'is_dir': is_dir,
+        'size': 0 if is_dir else entry_stat.st_size,
+        'mtime': entry_stat.st_mtime,
+        'ctime': entry_stat.st_ctime,
+        'file_group': None if group is None else group.value,
+    }
+
+
+class _Crawl:
+    """Один обход хранилища root по состоянию индекса state (выполняется в потоке)"""
+
+    def __init__(self, root: str, state: list, force: set[str]):
+        self.root = root
+        self.force = force
+        self.known = {row.path: row for row in state}
+        self.children = defaultdict(list)
+        for row in state:
+            if row.parent is not None:
+                self.children[row.parent].append(row)
+        self.result = CrawlResult()
+
+    def run(self) -> CrawlResult:
+        root_stat = os.stat(self.root)
+        self._put('', _entry_values(None, '', True, root_stat))
+        self._folder('', root_stat.st_mtime)
+        return self.result
+
+    def _put(self, path: str, values: dict) -> None:
+        row = self.known.get(path)
+        if row is None or any(getattr(row, key) != value for key, value in values.items()):
+            self.result.entries[path] = values
+
+    def _folder(self, path: str, mtime: float) -> FolderStats:
+        row = self.known.get(path)
+        if row is not None and row.mtime == mtime and path not in self.force:
+            stats = self._from_index(path, mtime)
+        else:
+            stats = self._from_disk(path, mtime)
+        self.result.folders.append((path, stats))
+        return stats
+
+    def _from_index(self, path: str, mtime: float) -> FolderStats:
+        stats = FolderStats(mtime=mtime)
+        for row in self.children.get(path, []):
+            if not row.is_dir:
+                stats.direct_files += 1
+                stats.total_files += 1
+                stats.size += row.size
+                continue
+            try:
+                folder_stat = os.lstat(os.path.join(self.root, row.path))
+            except OSError:
+                # Папка исчезла, а mtime родителя не изменился - читаем родителя с диска
+                return self._from_disk(path, mtime)
+            stats.direct_folders += 1
+            stats.total_folders += 1
+            if stat.S_ISLNK(folder_stat.st_mode):
+                continue
+            self._put(row.path, _entry_values(path, row.name, True, folder_stat))
+            stats.add_subtree(self._folder(row.path, folder_stat.st_mtime))
+        return stats
+
+    def _from_disk(self, path: str, mtime: float) -> FolderStats:
+        self.result.scanned += 1
+        stats = FolderStats(mtime=mtime)
+        seen = set()
+        try:
+            with os.scandir(os.path.join(self.root, path)) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                        if not is_dir and not entry.is_file():
+                            continue
+                        entry_stat = entry.stat()
+                    except OSError:
+                        continue
+                    entry_path = _join(path, entry.name)
+                    seen.add(entry_path)
+                    self._put(entry_path, _entry_values(path, entry.name, is_dir, entry_stat))
+                    known = self.known.get(entry_path)
+                    if known is not None and known.is_dir and not is_dir:
+                        # Папку заменил файл - удаляем записи её поддерева
+                        self.result.deleted.append(entry_path)
+                    if not is_dir:
+                        stats.direct_files += 1
+                        stats.total_files += 1
+                        stats.size += entry_stat.st_size
+                        continue
+                    stats.direct_folders += 1
+                    stats.total_folders += 1
+                    if not entry.is_symlink():
+                        stats.add_subtree(self._folder(entry_path, entry_stat.st_mtime))
+        except OSError:
+            # Папка недоступна - оставляем в индексе её прежнее содержимое
+            return stats
+        self.result.deleted += [
+            row.path for row in self.children.get(path, []) if row.path not in seen
+        ]
+        return stats
+
+
+def crawl(root: str, state: list, force: set[str] | None = None) -> CrawlResult:
+    return _Crawl(root, state, force or set()).run()
+
+
+class StorageCrawler:
+    """
+    Периодический обход всех хранилищ (CRAWLER_INTERVAL) и обход изменившихся папок
+    по событиям наблюдателя (apply подписывается на StorageWatcher).
+    """
+
+    def __init__(self):
+        self._storages: list[Storage] = []
+        self._locks: dict[uuid.UUID, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._task: asyncio.Task | None = None
+
+    async def crawl(self, storage: Storage, force: set[str] | None = None) -> CrawlResult:
+        async with self._locks[storage.id]:
+            async with AsyncSession() as session:
+                state = await get_storage_entries_state(session, storage.id)
+            result = await run_fs(crawl, storage.path, state, force)
+            async with AsyncSession() as session:
+                await delete_storage_entries(session, storage.id, result.deleted)
+                await save_storage_entries(session, storage.id, result.entries)
+                await session.commit()
+            stats_index = FolderStatsIndex(storage_id=storage.id, root=storage.path)
+            await stats_index.load_subtree(storage.path)
+            for path, stats in result.folders:
+                stats_index.record(path, stats)
+            await stats_index.save()
+        logger.info(
+            f'Crawler: storage {storage.id} - {result.scanned} folders scanned, '
+            f'{len(result.entries)} entries saved, {len(result.deleted)} deleted'
+        )
+        return result
+
+    async def ensure_indexed(self, storage: Storage) -> None:
+        """Строит индекс хранилища, если оно ещё не обходилось"""
+        async with AsyncSession() as session:
+            indexed = await get_storage_entry(session, storage.id, '')
+        if indexed is None:
+            await self.crawl(storage)
+
+    async def crawl_all(self) -> None:
+        self._storages = list(await get_list_storages_service())
+        for storage in self._storages:
+            try:
+                await self.crawl(storage)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f'Crawler: storage {storage.id} crawl error: {e}')
+
+    async def apply(self, changes: FileSystemChanges) -> None:
+        """Обработчик изменений наблюдателя: перечитывает изменившиеся папки"""
+        folders = changes.folders | {os.path.dirname(file) for file in changes.files}
+        for storage in self._storages:
+            root = os.path.normpath(storage.path)
+            force = {
+                _relative(root, folder)
+                for folder in folders
+                if folder == root or folder.startswith(root + os.sep)
+            }
+            if force:
+                await self.crawl(storage, force)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._crawl_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _crawl_loop(self) -> None:
+        while True:
+            try:
+                await self.crawl_all()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f'Crawler: can not load storages: {e}')
+            await asyncio.sleep(settings.CRAWLER_INTERVAL)
+
+
+storage_crawler = StorageCrawler()
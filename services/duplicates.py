@@ -0,0 +1,178 @@
+"""
+Поиск одинаковых файлов в хранилищах.
+
+Поэтапный отбор кандидатов, каждый этап работает только с совпадениями предыдущего:
+1. одинаковый размер - запросом к индексу storage_entries, без обращения к диску;
+2. одинаковый хэш первых и последних HEAD_TAIL_SIZE байт;
+3. одинаковый хэш всего файла (потоковое чтение по READ_CHUNK_SIZE).
+Хэширование выполняется в пуле процессов (DUPLICATES_PROCESSES).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from common.exceptions import NotFound
+from common.settings import settings
+from db.connector import AsyncSession
+from db.models import Storage
+from repositories.duplicates import get_file_duplicates, get_same_size_files, save_file_duplicates
+from schemas.duplicates import DuplicateFile, DuplicateGroup
+from services.crawler import storage_crawler
+from services.storages import get_list_storages_service, get_storage_by_id_service
+
+logger = logging.getLogger(__name__)
+
+HEAD_TAIL_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+HASH_BATCH_SIZE = 64  # Файлов в одной задаче пула процессов
+
+# Файл-кандидат: (storage_id, путь внутри хранилища, полный путь, размер)
+Candidate = tuple[uuid.UUID, str, str, int]
+
+
+def _partial_hash(path: str, size: int) -> str:
+    """Хэш первых и последних HEAD_TAIL_SIZE байт (для небольших файлов - всего файла)"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        digest.update(file.read(HEAD_TAIL_SIZE))
+        if size > HEAD_TAIL_SIZE:
+            file.seek(max(HEAD_TAIL_SIZE, size - HEAD_TAIL_SIZE))
+            digest.update(file.read(HEAD_TAIL_SIZE))
+    return digest.hexdigest()[:64]
+
+
+def _full_hash(path: str) -> str:
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()[:64]
+
+
+def hash_files(files: list[tuple[str, int]], full: bool) -> list[str | None]:
+    """Выполняется в процессе пула. None - файл недоступен"""
+    result = []
+    for path, size in files:
+        try:
+            result.append(_full_hash(path) if full else _partial_hash(path, size))
+        except OSError:
+            result.append(None)
+    return result
+
+
+async def _hash_stage(
+    pool: ProcessPoolExecutor, candidates: list[Candidate], full: bool
+) -> dict[tuple[int, str], list[Candidate]]:
+    """Группирует кандидатов по (размер, хэш), оставляя только группы из нескольких файлов"""
+    loop = asyncio.get_running_loop()
+    batches = [
+        candidates[i : i + HASH_BATCH_SIZE] for i in range(0, len(candidates), HASH_BATCH_SIZE)
+    ]
+    hashes = await asyncio.gather(
+        *[
+            loop.run_in_executor(pool, hash_files, [(file[2], file[3]) for file in batch], full)
+            for batch in batches
+        ]
+    )
+    groups = defaultdict(list)
+    for batch, batch_hashes in zip(batches, hashes):
+        for candidate, file_hash in zip(batch, batch_hashes):
+            if file_hash is not None:
+                groups[(candidate[3], file_hash)].append(candidate)
+    return {key: group for key, group in groups.items() if len(group) > 1}
+
+
+async def find_duplicates(storages: list[Storage]) -> list[dict]:
+    """Возвращает найденные одинаковые файлы: [{storage_id, path, size, hash}]"""
+    # Инкрементальный обход: размеры в индексе должны соответствовать файлам на диске
+    for storage in storages:
+        await storage_crawler.crawl(storage)
+    roots = {storage.id: storage.path for storage in storages}
+    async with AsyncSession() as session:
+        rows = await get_same_size_files(session, list(roots))
+    candidates = [
+        (storage_id, path, os.path.join(roots[storage_id], path), size)
+        for storage_id, path, size in rows
+    ]
+
+    with ProcessPoolExecutor(max_workers=settings.DUPLICATES_PROCESSES) as pool:
+        partial = await _hash_stage(pool, candidates, full=False)
+        # Небольшие файлы прочитаны целиком уже при частичном хэшировании
+        duplicates = {key: group for key, group in partial.items() if key[0] <= 2 * HEAD_TAIL_SIZE}
+        large = [
+            file for key, group in partial.items() if key[0] > 2 * HEAD_TAIL_SIZE for file in group
+        ]
+        duplicates.update(await _hash_stage(pool, large, full=True))
+
+    logger.info(
+        f'Duplicates: {len(candidates)} same size files, {len(duplicates)} duplicate sets found'
+    )
+    return [
+        {'storage_id': storage_id, 'path': path, 'size': size, 'hash': file_hash}
+        for (size, file_hash), group in duplicates.items()
+        for storage_id, path, _, size in group
+    ]
+
+
+# Незавершённые поиски (набор id хранилищ -> задача)
+_scan_tasks: dict[frozenset[uuid.UUID], asyncio.Task] = {}
+
+
+async def _get_storages(
+    storage_id: uuid.UUID | None = None, user_id: uuid.UUID | None = None
+) -> list[Storage]:
+    if storage_id is not None:
+        storage = await get_storage_by_id_service(storage_id)
+        if storage is None:
+            raise NotFound(error_code='not_found', error_message=f'Storage {storage_id} not found')
+        return [storage]
+    return list(await get_list_storages_service(user_id=user_id))
+
+
+async def scan_duplicates(storages: list[Storage]) -> None:
+    duplicates = await find_duplicates(storages)
+    async with AsyncSession() as session:
+        await save_file_duplicates(session, [storage.id for storage in storages], duplicates)
+        await session.commit()
+
+
+def _forget_scan_task(key: frozenset[uuid.UUID], task: asyncio.Task) -> None:
+    _scan_tasks.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f'Duplicates scan error: {task.exception()}')
+
+
+async def start_duplicates_scan_service(
+    storage_id: uuid.UUID | None = None, user_id: uuid.UUID | None = None
+) -> bool:
+    """Запускает поиск в фоне. False - поиск по этим хранилищам уже идёт"""
+    storages = await _get_storages(storage_id, user_id)
+    key = frozenset(storage.id for storage in storages)
+    if key in _scan_tasks:
+        return False
+    task = asyncio.create_task(scan_duplicates(storages))
+    _scan_tasks[key] = task
+    task.add_done_callback(lambda done: _forget_scan_task(key, done))
+    return True
+
+
+async def get_duplicates_service(
+    storage_id: uuid.UUID | None = None, user_id: uuid.UUID | None = None
+) -> list[DuplicateGroup]:
+    """Наборы одинаковых файлов, по убыванию занятого копиями места"""
+    storages = await _get_storages(storage_id, user_id)
+    async with AsyncSession() as session:
+        rows = await get_file_duplicates(session, [storage.id for storage in storages])
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row.size, row.hash)].append(DuplicateFile(storage_id=row.storage_id, path=row.path))
+    result = [
+        DuplicateGroup(hash=file_hash, size=size, wasted=size * (len(files) - 1), files=files)
+        for (size, file_hash), files in groups.items()
+        if len(files) > 1
+    ]
+    return sorted(result, key=lambda group: group.wasted, reverse=True)
@@ -0,0 +1,180 @@
+"""
+Компактное представление содержимого папки в памяти (для кэша содержимого папок).
+
+Вместо pydantic моделей Folder и StorageFile на каждый элемент хранятся параллельные
+массивы имён, размеров, времён и счётчиков; расширения файлов интернируются в таблицу,
+а у файла хранится только номер расширения. Модели создаются только для элементов
+страницы, которая отдаётся в ответе.
+"""
+import os
+from array import array
+from datetime import datetime
+
+from schemas.storage import FileGroup, StorageFile
+from services.folder_stats import FolderScan, FolderStats
+
+NO_TIME = float('-inf')  # mtime неизвестен (как None в ключе сортировки)
+
+
+def _take(values: list | array, indices: list[int]) -> list | array:
+    if isinstance(values, array):
+        return array(values.typecode, [values[i] for i in indices])
+    return [values[i] for i in indices]
+
+
+class SortKeys:
+    """
+    Ключи сортировки (значение, имя) элементов без создания списка ключей:
+    последовательность для bisect по отсортированному содержимому
+    """
+
+    __slots__ = ('names', 'values')
+
+    def __init__(self, names: list[str], values: array | None):
+        self.names = names
+        self.values = values  # None - все значения равны, порядок только по имени
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> tuple:
+        value = NO_TIME if self.values is None else self.values[index]
+        return value, self.names[index]
+
+
+class _Entries:
+    __slots__ = ('names',)
+    # Колонка сортировки для порядка OrderFolder.value (нет в словаре - только по имени)
+    sort_columns: dict[str, str] = {}
+
+    def __init__(self):
+        self.names: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def sort_keys(self, order: str) -> SortKeys:
+        column = self.sort_columns.get(order)
+        return SortKeys(self.names, None if column is None else getattr(self, column))
+
+    def sorted(self, order: str) -> '_Entries':
+        keys = self.sort_keys(order)
+        indices = sorted(range(len(self)), key=keys.__getitem__)
+        result = self._empty()
+        for column in self._columns():
+            setattr(result, column, _take(getattr(self, column), indices))
+        return result
+
+    def _empty(self) -> '_Entries':
+        return type(self)()
+
+    def _columns(self) -> tuple[str, ...]:
+        return self.__slots__ + _Entries.__slots__
+
+
+class FolderEntries(_Entries):
+    """Вложенные папки: имя, mtime, размер и количество папок и файлов"""
+
+    __slots__ = (
+        'mtimes',
+        'sizes',
+        'direct_folders',
+        'total_folders',
+        'direct_files',
+        'total_files',
+    )
+    sort_columns = {
+        'time': 'mtimes',
+        'size': 'sizes',
+        'files_count': 'total_files',
+        'folders_count': 'total_folders',
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.mtimes = array('d')
+        self.sizes = array('q')
+        self.direct_folders = array('q')
+        self.total_folders = array('q')
+        self.direct_files = array('q')
+        self.total_files = array('q')
+
+    def append(self, name: str, stats: FolderStats) -> None:
+        self.names.append(name)
+        self.mtimes.append(NO_TIME if stats.mtime is None else stats.mtime)
+        self.sizes.append(stats.size)
+        self.direct_folders.append(stats.direct_folders)
+        self.total_folders.append(stats.total_folders)
+        self.direct_files.append(stats.direct_files)
+        self.total_files.append(stats.total_files)
+
+    def stats(self, index: int) -> FolderStats:
+        mtime = self.mtimes[index]
+        return FolderStats(
+            size=self.sizes[index],
+            direct_folders=self.direct_folders[index],
+            total_folders=self.total_folders[index],
+            direct_files=self.direct_files[index],
+            total_files=self.total_files[index],
+            mtime=None if mtime == NO_TIME else mtime,
+        )
+
+
+class FileEntries(_Entries):
+    """Файлы: имя, размер, mtime, ctime и номер расширения в таблице extensions"""
+
+    __slots__ = ('sizes', 'mtimes', 'ctimes', 'extension_ids', 'extensions', '_extension_ids')
+    sort_columns = {'time': 'mtimes', 'size': 'sizes'}
+
+    def __init__(self):
+        super().__init__()
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.ctimes = array('d')
+        self.extension_ids = array('H')
+        self.extensions: list[str] = []
+        self._extension_ids: dict[str, int] = {}
+
+    def append(self, name: str, file_stat: os.stat_result) -> None:
+        extension = os.path.splitext(name)[1][1:]
+        extension_id = self._extension_ids.get(extension)
+        if extension_id is None:
+            extension_id = self._extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        self.names.append(name)
+        self.sizes.append(file_stat.st_size)
+        self.mtimes.append(file_stat.st_mtime)
+        self.ctimes.append(file_stat.st_ctime)
+        self.extension_ids.append(extension_id)
+
+    def _empty(self) -> 'FileEntries':
+        # Таблица расширений общая с исходным содержимым
+        result = FileEntries()
+        result.extensions = self.extensions
+        result._extension_ids = self._extension_ids
+        return result
+
+    def _columns(self) -> tuple[str, ...]:
+        return 'names', 'sizes', 'mtimes', 'ctimes', 'extension_ids'
+
+    def storage_file(self, index: int, folder_path: str) -> StorageFile:
+        name = self.names[index]
+        extension = self.extensions[self.extension_ids[index]]
+        return StorageFile(
+            name=name,
+            type=extension,
+            full_path=os.path.join(folder_path, name),
+            size=self.sizes[index],
+            created=datetime.fromtimestamp(self.ctimes[index]),
+            updated=datetime.fromtimestamp(self.mtimes[index]),
+            group=FileGroup.get_group(extension),
+        )
+
+
+def entries_from_scan(scan: FolderScan) -> tuple[FolderEntries, FileEntries]:
+    folders, files = FolderEntries(), FileEntries()
+    for name, stats in scan.folders.items():
+        folders.append(name, stats)
+    for name, file_stat in scan.files.items():
+        files.append(name, file_stat)
+    return folders, files
@@ -0,0 +1,640 @@
+"""
+Подсчёт статистики папок (размер, количество папок и файлов) за один обход дерева.
+Обход построен на os.scandir: тип записи берётся из DirEntry без лишних stat,
+а DirEntry.stat() кэшируется самим объектом записи.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from common.settings import settings
+from db.connector import AsyncSession
+from db.models import StorageStatistic
+from repositories.storage_statistic import (
+    get_storage_statistic,
+    get_storage_statistic_by_path,
+    get_storage_statistic_by_paths,
+    get_storage_statistic_mtimes,
+    invalidate_storage_statistic,
+    save_storage_statistic,
+)
+from services.async_io import get_scan_executor, run_fs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class FolderStats:
+    """
+    Статистика одной папки.
+    direct_* - непосредственное содержимое, total_* - всё поддерево.
+    """
+
+    size: int = 0
+    direct_folders: int = 0
+    total_folders: int = 0
+    direct_files: int = 0
+    total_files: int = 0
+    mtime: float | None = None
+
+    def add_subtree(self, child: 'FolderStats') -> None:
+        """Добавляет статистику вложенной папки в итоги текущей"""
+        self.size += child.size
+        self.total_folders += child.total_folders
+        self.total_files += child.total_files
+
+    def folders_count(self) -> dict:
+        return {'direct': self.direct_folders, 'total': self.total_folders}
+
+    def files_count(self) -> dict:
+        return {'direct': self.direct_files, 'total': self.total_files}
+
+    def same_totals(self, other: 'FolderStats') -> bool:
+        return (self.size, self.total_folders, self.total_files) == (
+            other.size,
+            other.total_folders,
+            other.total_files,
+        )
+
+
+@dataclass(slots=True)
+class FolderScan:
+    """
+    Результат обхода папки: статистика самой папки и её непосредственных потомков.
+    Для вложенных папок - FolderStats, для файлов - os.stat_result.
+    """
+
+    path: str
+    stats: FolderStats
+    folders: dict[str, FolderStats] = field(default_factory=dict)
+    files: dict[str, os.stat_result] = field(default_factory=dict)
+
+
+def stats_from_row(row: StorageStatistic) -> FolderStats:
+    return FolderStats(
+        size=row.size,
+        direct_folders=row.direct_folders_count,
+        total_folders=row.folders_count,
+        direct_files=row.direct_files_count,
+        total_files=row.files_count,
+        mtime=row.mtime,
+    )
+
+
+def _entry_mtime(entry: os.DirEntry) -> float | None:
+    try:
+        return entry.stat().st_mtime
+    except OSError:
+        return None
+
+
+WalkChild = Callable[[str, float | None], FolderStats]
+
+
+def _walk(
+    path: str,
+    mtime: float | None = None,
+    scan: FolderScan | None = None,
+    walk_child: WalkChild | None = None,
+) -> FolderStats:
+    """
+    Рекурсивно считает статистику поддерева.
+    Если передан scan - дополнительно сохраняет в него непосредственных потомков.
+    walk_child - функция получения статистики вложенной папки (по умолчанию - _walk).
+    Как и os.walk, не заходит в symlink на папки (но считает их папками)
+    и молча пропускает папки без доступа.
+    """
+    walk_child = walk_child or _walk
+    stats = FolderStats(mtime=mtime)
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                _add_entry(stats, entry, scan, walk_child)
+    except OSError:
+        pass
+    return stats
+
+
+def _add_entry(
+    stats: FolderStats, entry: os.DirEntry, scan: FolderScan | None, walk_child: WalkChild
+) -> None:
+    """Добавляет запись папки (вложенную папку или файл) в статистику stats и в scan"""
+    if entry.is_dir():
+        stats.direct_folders += 1
+        stats.total_folders += 1
+        if entry.is_symlink():
+            child = FolderStats(mtime=_entry_mtime(entry))
+        else:
+            child = walk_child(entry.path, _entry_mtime(entry))
+        stats.add_subtree(child)
+        if scan is not None:
+            scan.folders[entry.name] = child
+        return
+    stats.direct_files += 1
+    stats.total_files += 1
+    try:
+        if not entry.is_file():
+            return
+        file_stat = entry.stat()
+    except OSError:
+        return
+    stats.size += file_stat.st_size
+    if scan is not None:
+        scan.files[entry.name] = file_stat
+
+
+def get_folder_stats(path: str) -> FolderStats:
+    """Статистика поддерева path за один обход"""
+    return _walk(path, os.stat(path).st_mtime)
+
+
+def scan_folder(path: str) -> FolderScan:
+    """
+    Один обход поддерева path, возвращающий статистику папки
+    и всех её непосредственных потомков.
+    """
+    scan = FolderScan(path=path, stats=FolderStats())
+    scan.stats = _walk(path, os.stat(path).st_mtime, scan)
+    return scan
+
+
+def walk_subtree(
+    path: str, mtime: float | None, cached: dict[str, FolderStats] | None = None
+) -> tuple[FolderStats, dict[str, FolderStats]]:
+    """
+    Обход поддерева path с повторным использованием статистики cached ({путь: статистика})
+    неизменившихся папок. Возвращает статистику path и всех заново посчитанных папок
+    (вложенные раньше родителей). Выполняется и в отдельном процессе пула.
+    """
+    cached = cached or {}
+    computed = {}
+
+    def walk_child(child_path: str, child_mtime: float | None) -> FolderStats:
+        stats = cached.get(child_path)
+        if stats is not None and child_mtime is not None and stats.mtime == child_mtime:
+            return stats
+        stats = _walk(child_path, child_mtime, walk_child=walk_child)
+        computed[child_path] = stats
+        return stats
+
+    return walk_child(path, mtime), computed
+
+
+async def walk_parallel(
+    path: str,
+    mtime: float | None,
+    scan: FolderScan | None = None,
+    cached: dict[str, FolderStats] | None = None,
+) -> tuple[FolderStats, dict[str, FolderStats]]:
+    """
+    Как walk_subtree, но вложенные папки верхнего уровня обходятся параллельно
+    в пуле get_scan_executor(), а их итоги складываются в статистику path
+    """
+    cached = cached or {}
+    pending = []
+
+    def defer(child_path: str, child_mtime: float | None) -> FolderStats:
+        stats = cached.get(child_path)
+        if stats is not None and child_mtime is not None and stats.mtime == child_mtime:
+            return stats
+        pending.append((child_path, child_mtime))
+        # Заглушка: итоги поддерева добавляются после его обхода в пуле
+        return FolderStats(mtime=child_mtime)
+
+    stats = await run_fs(_walk, path, mtime, scan, walk_child=defer)
+    # Сохранённая статистика отдаётся каждому обходу только в пределах его поддерева
+    subtrees = {child_path: {} for child_path, _ in pending}
+    prefix = os.path.join(path, '')
+    for cached_path, cached_stats in cached.items():
+        if cached_path.startswith(prefix):
+            name = cached_path[len(prefix) :].split(os.sep, 1)[0]
+            subtree = subtrees.get(os.path.join(path, name))
+            if subtree is not None:
+                subtree[cached_path] = cached_stats
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                get_scan_executor(), walk_subtree, child_path, child_mtime, subtrees[child_path]
+            )
+            for child_path, child_mtime in pending
+        ]
+    )
+    computed = {}
+    for (child_path, _), (child, child_computed) in zip(pending, results):
+        stats.add_subtree(child)
+        if scan is not None:
+            scan.folders[os.path.basename(child_path)] = child
+        computed.update(child_computed)
+    computed[path] = stats
+    return stats, computed
+
+
+def get_folders_stats(paths: list[str], walk: WalkChild = _walk) -> dict[str, FolderStats]:
+    """Статистика нескольких папок; недоступные папки пропускаются"""
+    result = {}
+    for path in paths:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue
+        result[path] = walk(path, mtime)
+    return result
+
+
+def _shallow(path: str, mtime: float | None = None) -> FolderStats:
+    """
+    Статистика без обхода поддерева: только количество непосредственно вложенных
+    папок и файлов по типам DirEntry, без stat. Итоги равны непосредственным, размер - 0.
+    """
+    stats = FolderStats(mtime=mtime)
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stats.direct_folders += 1
+                else:
+                    stats.direct_files += 1
+    except OSError:
+        pass
+    stats.total_folders = stats.direct_folders
+    stats.total_files = stats.direct_files
+    return stats
+
+
+def _estimate(path: str, mtime: float | None = None, depth: int | None = None) -> FolderStats:
+    """
+    Оценка статистики поддерева по выборке: на каждом уровне (не глубже depth)
+    обходится не больше STATS_ESTIMATE_SAMPLE файлов и вложенных папок,
+    и их итоги экстраполируются на все файлы и папки уровня.
+    Глубже depth вложенные папки считаются пустыми.
+    Выборка зависит только от пути, поэтому оценка одной папки не меняется между запросами.
+    """
+    depth = settings.STATS_ESTIMATE_DEPTH if depth is None else depth
+    stats = FolderStats(mtime=mtime)
+    folders, files = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                (folders if entry.is_dir() else files).append(entry)
+    except OSError:
+        pass
+    stats.direct_folders = stats.total_folders = len(folders)
+    stats.direct_files = stats.total_files = len(files)
+    sizes, subtree, sampled = _sample(random.Random(path), folders, files, depth)
+    _extrapolate(stats, sizes, subtree, sampled)
+    return stats
+
+
+def _sample(
+    sample: random.Random, folders: list[os.DirEntry], files: list[os.DirEntry], depth: int
+) -> tuple[list[int], FolderStats, int]:
+    """
+    Выборка одного уровня для _estimate: размеры выбранных файлов, сумма оценок
+    выбранных вложенных папок (до глубины depth) и количество этих папок
+    """
+    sample_size = settings.STATS_ESTIMATE_SAMPLE
+    sizes = []
+    for entry in sample.sample(files, min(len(files), sample_size)):
+        try:
+            if entry.is_file():
+                sizes.append(entry.stat().st_size)
+        except OSError:
+            continue
+    subtree = FolderStats()
+    sampled = 0
+    if depth > 0 and folders:
+        for entry in sample.sample(folders, min(len(folders), sample_size)):
+            if entry.is_symlink():
+                continue
+            subtree.add_subtree(_estimate(entry.path, depth=depth - 1))
+            sampled += 1
+    return sizes, subtree, sampled
+
+
+def _extrapolate(stats: FolderStats, sizes: list[int], subtree: FolderStats, sampled: int) -> None:
+    """Распространяет итоги выборки (см. _sample) на все файлы и вложенные папки stats"""
+    if sizes:
+        stats.size = sum(sizes) * stats.direct_files // len(sizes)
+    if sampled:
+        ratio = stats.direct_folders / sampled
+        stats.size += int(subtree.size * ratio)
+        stats.total_folders += int(subtree.total_folders * ratio)
+        stats.total_files += int(subtree.total_files * ratio)
+
+
+class FolderStatsScanner:
+    """
+    Статистика папок напрямую с файловой системы, без сохранения
+    """
+
+    mode = 'exact'
+
+    async def get_folder_stats(self, path: str) -> FolderStats:
+        if get_scan_executor() is not None:
+            mtime = (await run_fs(os.stat, path)).st_mtime
+            return (await walk_parallel(path, mtime))[0]
+        return await run_fs(get_folder_stats, path)
+
+    async def get_folders_stats(self, paths: list[str]) -> dict[str, FolderStats]:
+        return await run_fs(get_folders_stats, paths)
+
+    async def get_saved_stats(self, path: str) -> FolderStats | None:
+        """Последняя сохранённая статистика папки, без обращения к файловой системе"""
+        return None
+
+    async def scan_folder(self, path: str) -> FolderScan:
+        if get_scan_executor() is not None:
+            mtime = (await run_fs(os.stat, path)).st_mtime
+            scan = FolderScan(path=path, stats=FolderStats())
+            scan.stats = (await walk_parallel(path, mtime, scan))[0]
+            return scan
+        return await run_fs(scan_folder, path)
+
+
+class FolderStatsIndex(FolderStatsScanner):
+    """
+    Статистика папок хранилища, сохраняемая в таблице storage_statistic.
+
+    mtime папки меняется только при изменении её непосредственного содержимого, поэтому
+    запись папки действительна, пока совпадает сохранённый mtime её и всех вложенных папок
+    (проверяется stat каждой сохранённой папки поддерева, без чтения содержимого).
+    Такая папка не обходится повторно. Папки, в поддереве которых что-то изменилось,
+    обходятся заново с повторным использованием записей неизменившихся поддеревьев.
+    Если итоги папки изменились, записи всех её родителей помечаются устаревшими.
+    """
+
+    mode = 'cached'
+
+    def __init__(self, storage_id: uuid.UUID, root: str):
+        self.storage_id = storage_id
+        self.root = os.path.normpath(root)
+        self._entries: dict[str, FolderStats] = {}
+        self._changed: set[str] = set()
+        self._stale: set[str] = set()
+        self._checked: set[str] = set()  # Папки, сохранённая статистика поддеревьев проверена
+        self._outdated: dict[str, bool] = {}  # Проверенные записи: {папка: устарела ли запись}
+
+    def _key(self, path: str) -> str:
+        key = os.path.relpath(os.path.normpath(path), self.root)
+        return '' if key == '.' else key
+
+    @staticmethod
+    def _ancestors(key: str) -> list[str]:
+        if not key:
+            return []
+        parts = key.split('/')
+        return ['/'.join(parts[:i]) for i in range(len(parts) - 1, -1, -1)]
+
+    def _stats(self, path: str, mtime: float | None) -> FolderStats:
+        key = self._key(path)
+        cached = self._entries.get(key)
+        if cached is not None and mtime is not None and cached.mtime == mtime:
+            return cached
+        stats = _walk(path, mtime, walk_child=self._stats)
+        self._record(key, stats, cached)
+        return stats
+
+    def _subtree_entries(self, key: str) -> dict[str, FolderStats]:
+        """Сохранённая статистика поддерева key с ключами - полными путями"""
+        prefix = f'{key}/' if key else ''
+        return {
+            os.path.join(self.root, entry_key) if entry_key else self.root: stats
+            for entry_key, stats in self._entries.items()
+            if entry_key == key or entry_key.startswith(prefix)
+        }
+
+    async def _walk_parallel(
+        self, path: str, mtime: float | None, scan: FolderScan | None = None
+    ) -> FolderStats:
+        stats, computed = await walk_parallel(
+            path, mtime, scan, self._subtree_entries(self._key(path))
+        )
+        # Вложенные папки записываются раньше родителей, сама папка path - последней
+        for computed_path, computed_stats in computed.items():
+            self.record(self._key(computed_path), computed_stats)
+        return stats
+
+    def _record(self, key: str, stats: FolderStats, previous: FolderStats | None) -> None:
+        if stats == previous:
+            return
+        self._entries[key] = stats
+        self._changed.add(key)
+        self._stale.discard(key)
+        if previous is not None and not stats.same_totals(previous):
+            for ancestor in self._ancestors(key):
+                self._entries.pop(ancestor, None)
+                self._changed.discard(ancestor)
+                self._stale.add(ancestor)
+
+    def record(self, key: str, stats: FolderStats) -> None:
+        """Запоминает статистику папки key (путь внутри хранилища), посчитанную извне"""
+        self._record(key, stats, self._entries.get(key))
+
+    @staticmethod
+    def _in_subtrees(key: str, keys: set[str]) -> bool:
+        return key in keys or any(ancestor in keys for ancestor in FolderStatsIndex._ancestors(key))
+
+    def _check(self, keys: set[str], mtimes: dict[str, float | None]) -> dict[str, bool]:
+        """
+        Блокирующая часть проверки сохранённой статистики поддеревьев keys:
+        {папка: устарела ли запись}. Запись устарела, если на диске не совпадает
+        mtime самой папки или любой вложенной в неё сохранённой папки
+        """
+        mtimes = {key: mtime for key, mtime in mtimes.items() if self._in_subtrees(key, keys)}
+        outdated = set()
+        for key, mtime in mtimes.items():
+            if key in outdated:
+                continue
+            try:
+                current = os.stat(os.path.join(self.root, key)).st_mtime
+            except OSError:
+                current = None
+            if mtime is None or current != mtime:
+                outdated.update([key, *self._ancestors(key)])
+        return {key: key in outdated for key in mtimes}
+
+    def _needed(self, keys: set[str]) -> list[str]:
+        """
+        Записи, нужные для статистики папок keys: неустаревшие записи самих keys
+        и ближайших к ним неизменившихся поддеревьев (берутся целиком, без обхода)
+        и устаревшие записи (для сравнения итогов после обхода)
+        """
+        needed = []
+        for key, outdated in self._outdated.items():
+            if key in self._entries or not self._in_subtrees(key, keys):
+                continue
+            parent = self._ancestors(key)[0] if key else None
+            if outdated or key in keys or self._outdated.get(parent, False):
+                needed.append(key)
+        return needed
+
+    async def load(self, paths: list[str]) -> None:
+        """
+        Загружает сохранённую статистику, нужную для папок paths, проверив по stat
+        mtime всех вложенных сохранённых папок. Записи папок, в поддереве которых что-то
+        изменилось, загружаются без mtime: такие папки обходятся заново
+        """
+        keys = {self._key(path) for path in paths}
+        unchecked = {
+            key
+            for key in keys
+            if not any(checked in self._checked for checked in [key, *self._ancestors(key)])
+        }
+        rows = []
+        try:
+            if unchecked:
+                top = os.path.commonpath([os.path.join(self.root, key) for key in unchecked])
+                async with AsyncSession() as session:
+                    mtimes = await get_storage_statistic_mtimes(
+                        session, self.storage_id, self._key(top)
+                    )
+                self._outdated.update(await run_fs(self._check, unchecked, mtimes))
+                self._checked.update(unchecked)
+            needed = await run_fs(self._needed, keys)
+            if needed:
+                async with AsyncSession() as session:
+                    rows = await get_storage_statistic_by_paths(session, self.storage_id, needed)
+        except SQLAlchemyError as e:
+            # Без сохранённой статистики просто считаем всё заново
+            logger.warning(f'Storage statistic load error: {e}')
+            return
+        for row in rows:
+            stats = stats_from_row(row)
+            if self._outdated[row.path]:
+                stats.mtime = None
+            self._entries[row.path] = stats
+
+    async def load_subtree(self, path: str) -> None:
+        """
+        Загружает все сохранённые записи поддерева path без проверки - для обхода,
+        который сам пересчитывает все папки (записи нужны для сравнения с новыми)
+        """
+        try:
+            async with AsyncSession() as session:
+                rows = await get_storage_statistic(session, self.storage_id, self._key(path))
+        except SQLAlchemyError as e:
+            logger.warning(f'Storage statistic load error: {e}')
+            return
+        for row in rows:
+            self._entries[row.path] = stats_from_row(row)
+
+    @staticmethod
+    def _to_row(stats: FolderStats) -> dict:
+        return {
+            'size': stats.size,
+            'folders_count': stats.total_folders,
+            'files_count': stats.total_files,
+            'direct_folders_count': stats.direct_folders,
+            'direct_files_count': stats.direct_files,
+            'mtime': stats.mtime,
+        }
+
+    async def save(self) -> None:
+        """Сохраняет пересчитанную статистику и помечает устаревшие записи"""
+        if not self._changed and not self._stale:
+            return
+        statistic = {key: self._to_row(self._entries[key]) for key in self._changed}
+        try:
+            async with AsyncSession() as session:
+                await save_storage_statistic(session, self.storage_id, statistic)
+                await invalidate_storage_statistic(session, self.storage_id, list(self._stale))
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.warning(f'Storage statistic save error: {e}')
+            return
+        self._changed.clear()
+        self._stale.clear()
+
+    async def invalidate(self, paths: set[str]) -> None:
+        """Помечает устаревшей статистику папок paths и всех их родителей"""
+        for path in paths:
+            key = self._key(path)
+            self._stale.update([key, *self._ancestors(key)])
+        await self.save()
+
+    async def get_folder_stats(self, path: str) -> FolderStats:
+        mtime = (await run_fs(os.stat, path)).st_mtime
+        await self.load([path])
+        if get_scan_executor() is None:
+            stats = await run_fs(self._stats, path, mtime)
+        else:
+            stats = self._entries.get(self._key(path))
+            if stats is None or stats.mtime != mtime:
+                stats = await self._walk_parallel(path, mtime)
+        await self.save()
+        return stats
+
+    async def get_saved_stats(self, path: str) -> FolderStats | None:
+        key = self._key(path)
+        if key in self._entries:
+            return self._entries[key]
+        try:
+            async with AsyncSession() as session:
+                row = await get_storage_statistic_by_path(session, self.storage_id, key)
+        except SQLAlchemyError as e:
+            logger.warning(f'Storage statistic load error: {e}')
+            return None
+        return None if row is None else stats_from_row(row)
+
+    async def get_folders_stats(self, paths: list[str]) -> dict[str, FolderStats]:
+        if not paths:
+            return {}
+        await self.load(paths)
+        result = await run_fs(get_folders_stats, paths, self._stats)
+        await self.save()
+        return result
+
+    async def scan_folder(self, path: str) -> FolderScan:
+        mtime = (await run_fs(os.stat, path)).st_mtime
+        await self.load([path])
+        key = self._key(path)
+        scan = FolderScan(path=path, stats=FolderStats())
+        if get_scan_executor() is not None:
+            scan.stats = await self._walk_parallel(path, mtime, scan)
+        else:
+            scan.stats = await run_fs(_walk, path, mtime, scan, walk_child=self._stats)
+            self._record(key, scan.stats, self._entries.get(key))
+        await self.save()
+        return scan
+
+
+class FolderStatsEstimator(FolderStatsScanner):
+    """
+    Приблизительная статистика папок по выборке (см. _estimate)
+    """
+
+    mode = 'estimate'
+    walk: WalkChild = staticmethod(_estimate)
+
+    async def get_folder_stats(self, path: str) -> FolderStats:
+        return await run_fs(self._walk_path, path)
+
+    async def get_folders_stats(self, paths: list[str]) -> dict[str, FolderStats]:
+        return await run_fs(get_folders_stats, paths, self.walk)
+
+    async def scan_folder(self, path: str) -> FolderScan:
+        return await run_fs(self._scan_path, path)
+
+    def _walk_path(self, path: str) -> FolderStats:
+        return self.walk(path, os.stat(path).st_mtime)
+
+    def _scan_path(self, path: str) -> FolderScan:
+        scan = FolderScan(path=path, stats=FolderStats())
+        scan.stats = _walk(path, os.stat(path).st_mtime, scan, walk_child=self.walk)
+        return scan
+
+
+class ShallowFolderStats(FolderStatsEstimator):
+    """
+    Статистика папок без обхода поддеревьев (см. _shallow)
+    """
+
+    mode = 'none'
+    walk: WalkChild = staticmethod(_shallow)
@@ -0,0 +1,73 @@
+"""
+Кэширование ответов в браузере и обратном прокси: валидаторы (ETag, Last-Modified)
+по mtime и размеру исходного файла и параметрам копии, ответ 304 на условный запрос
+(If-None-Match, If-Modified-Since) и заголовок Cache-Control из настроек эндпоинта.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Header
+from starlette.responses import Response
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str
+    last_modified: int  # Время изменения исходного файла, секунды
+
+    @classmethod
+    def for_file(cls, file_stat: os.stat_result, *params) -> 'Validators':
+        """
+        ETag слабый: копия с теми же параметрами из того же файла совпадает по содержанию,
+        но не обязательно побайтно (например, получена из копии большего размера)
+        """
+        etag_base = '-'.join(
+            str(part) for part in (file_stat.st_mtime_ns, file_stat.st_size, *params)
+        )
+        digest = hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()
+        return cls(etag=f'W/"{digest}"', last_modified=int(file_stat.st_mtime))
+
+    def headers(self, cache_control: str) -> dict[str, str]:
+        return {
+            'ETag': self.etag,
+            'Last-Modified': formatdate(self.last_modified, usegmt=True),
+            'Cache-Control': cache_control,
+        }
+
+
+def _opaque_tag(etag: str) -> str:
+    # Слабое сравнение: W/"x" и "x" совпадают
+    etag = etag.strip()
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class ConditionalRequest:
+    """Заголовки условного запроса (зависимость FastAPI)"""
+
+    def __init__(
+        self, if_none_match: str | None = Header(None), if_modified_since: str | None = Header(None)
+    ):
+        self.if_none_match = if_none_match
+        self.if_modified_since = if_modified_since
+
+    def not_modified(self, validators: Validators) -> bool:
+        # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+        if self.if_none_match is not None:
+            tags = {_opaque_tag(tag) for tag in self.if_none_match.split(',')}
+            return '*' in tags or _opaque_tag(validators.etag) in tags
+        if self.if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(self.if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return validators.last_modified <= since.timestamp()
+        return False
+
+
+def not_modified_response(headers: dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
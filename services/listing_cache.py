@@ -0,0 +1,104 @@
+"""
+Кэш содержимого папок в памяти процесса.
+
+Запись хранит отсортированный список содержимого папки для одного порядка сортировки,
+поэтому листание страниц не требует повторного обхода и сортировки папки.
+Запись действительна, пока совпадают mtime и inode папки, поколение папки в индексе
+дерева наблюдателя (меняется при изменениях в любом месте поддерева) и не истёк TTL.
+Объём кэша ограничен суммарным количеством элементов, вытесняются давно не использованные записи.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from common.settings import settings
+from services.async_io import run_fs
+from services.watcher import FolderTreeIndex, tree_index
+
+
+@dataclass(slots=True)
+class ListingCacheEntry:
+    token: tuple
+    created: float
+    items: int
+    value: Any
+
+
+class ListingCache:
+    def __init__(
+        self,
+        max_items: int | None = None,
+        ttl: float | None = None,
+        folder_tree: FolderTreeIndex = tree_index,
+    ):
+        self.max_items = settings.LISTING_CACHE_MAX_ITEMS if max_items is None else max_items
+        self.ttl = settings.LISTING_CACHE_TTL if ttl is None else ttl
+        self.tree_index = folder_tree
+        self._entries: OrderedDict[Hashable, ListingCacheEntry] = OrderedDict()
+        self._items = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _token(self, path: str) -> tuple:
+        folder_stat = os.stat(path)
+        return folder_stat.st_mtime_ns, folder_stat.st_ino, self.tree_index.generation(path)
+
+    def get(self, key: Hashable, token: tuple) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None or entry.token != token or time.monotonic() - entry.created > self.ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: Hashable, token: tuple, value: Any, items: int) -> None:
+        self.discard(key)
+        if items > self.max_items or self.ttl <= 0:
+            return
+        self._entries[key] = ListingCacheEntry(token, time.monotonic(), items, value)
+        self._items += items
+        while self._items > self.max_items:
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._items -= entry.items
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._items = 0
+
+    async def get_or_create(
+        self,
+        path: str,
+        variant: Hashable,
+        create: Callable[[], Awaitable[tuple[Any, int]]],
+    ) -> Any:
+        """
+        Возвращает содержимое папки path в варианте variant (порядок сортировки и т.п.) из кэша
+        или вычисляет его через create(), которая возвращает (значение, количество элементов)
+        """
+        path = os.path.normpath(path)
+        key = (path, variant)
+        token = await run_fs(self._token, path)
+        value = self.get(key, token)
+        if value is None:
+            value, items = await create()
+            self.put(key, token, value, items)
+        return value
+
+    def info(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'items': self._items,
+            'max_items': self.max_items,
+        }
+
+
+listing_cache = ListingCache()
@@ -0,0 +1,113 @@
+"""
+Заглушки изображений для листингов: размеры (после поворота по EXIF) и микрокопия
+не больше PLACEHOLDER_SIZE пикселей по большей стороне (data URI), чтобы интерфейс мог
+разметить и закрасить сетку до загрузки превью.
+
+Заглушка создаётся при рендеринге копии из оригинала и при предварительной генерации
+и хранится в кэше рядом с копиями вместе с mtime и размером оригинала: при изменении
+оригинала она не отдаётся. В листинги попадают только уже созданные заглушки.
+"""
+import base64
+import json
+import os
+from dataclasses import asdict, dataclass
+from io import BytesIO
+
+from PIL import ExifTags, Image, ImageOps
+
+from common.settings import settings
+from schemas.storage import FileGroup
+from services.async_io import run_fs
+from services.CacheManager import CacheManager
+
+# Поворот по тегу EXIF Orientation, меняющий местами ширину и высоту
+EXIF_SWAP_SIZE = {5, 6, 7, 8}
+
+
+@dataclass(frozen=True)
+class ImagePlaceholder:
+    width: int
+    height: int
+    placeholder: str  # data URI микрокопии
+
+
+def encode_placeholder(img: Image.Image) -> str:
+    """Микрокопия изображения (уже повернутого по EXIF) в data URI"""
+    img = img.convert('RGB')
+    img.thumbnail((settings.PLACEHOLDER_SIZE, settings.PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    Image.init()
+    image_format = 'WEBP' if 'WEBP' in Image.SAVE else 'JPEG'
+    byte_io = BytesIO()
+    img.save(byte_io, format=image_format, quality=settings.PLACEHOLDER_QUALITY)
+    data = base64.b64encode(byte_io.getvalue()).decode()
+    return f'data:image/{image_format.lower()};base64,{data}'
+
+
+def save_placeholder(
+    path: str, file_stat: os.stat_result, size: tuple[int, int], img: Image.Image
+) -> ImagePlaceholder:
+    """Сохраняет заглушку оригинала path с размерами size; img - любая его уменьшенная копия"""
+    placeholder = ImagePlaceholder(
+        width=size[0], height=size[1], placeholder=encode_placeholder(img)
+    )
+    data = {'mtime_ns': file_stat.st_mtime_ns, 'size': file_stat.st_size, **asdict(placeholder)}
+    CacheManager(path).save_placeholder(json.dumps(data).encode())
+    return placeholder
+
+
+def create_placeholder(path: str) -> ImagePlaceholder:
+    """Заглушка по оригиналу (JPEG декодируется сразу в уменьшенном размере)"""
+    file_stat = os.stat(path)
+    with Image.open(path) as img:
+        size = img.size
+        if img.getexif().get(ExifTags.Base.Orientation) in EXIF_SWAP_SIZE:
+            size = size[::-1]
+        img.draft('RGB', (settings.PLACEHOLDER_SIZE * 4, settings.PLACEHOLDER_SIZE * 4))
+        return save_placeholder(path, file_stat, size, ImageOps.exif_transpose(img))
+
+
+def read_placeholder(path: str) -> ImagePlaceholder | None:
+    """Заглушка из кэша; None - её нет или оригинал с тех пор изменился"""
+    cache_manager = CacheManager(path, create_dir=False)
+    try:
+        file_stat = os.stat(path)
+        with open(cache_manager.get_placeholder_file(), 'rb') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get('mtime_ns') != file_stat.st_mtime_ns or data.get('size') != file_stat.st_size:
+        return None
+    return ImagePlaceholder(
+        width=data['width'], height=data['height'], placeholder=data['placeholder']
+    )
+
+
+def read_placeholders(paths: list[str]) -> dict[str, ImagePlaceholder]:
+    result = {}
+    for path in paths:
+        placeholder = read_placeholder(path)
+        if placeholder is not None:
+            result[path] = placeholder
+    return result
+
+
+async def add_placeholders(files: list, paths: list[str] | None = None) -> list:
+    """
+    Дополняет файлы листинга (StorageFile, CatalogFileResponseResult) размерами и
+    заглушками из кэша. paths - полные пути файлов (по умолчанию - file.full_path)
+    """
+    if paths is None:
+        paths = [file.full_path for file in files]
+    images = [
+        (file, path)
+        for file, path in zip(files, paths)
+        if FileGroup.get_group(os.path.splitext(path)[1][1:]) == FileGroup.IMAGE
+    ]
+    placeholders = await run_fs(read_placeholders, [path for _, path in images])
+    for file, path in images:
+        placeholder = placeholders.get(path)
+        if placeholder is not None:
+            file.width = placeholder.width
+            file.height = placeholder.height
+            file.placeholder = placeholder.placeholder
+    return files
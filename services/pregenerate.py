@@ -0,0 +1,253 @@
+"""
+Предварительная генерация уменьшенных копий (THUMBNAIL_WIDTH и PREVIEW_WIDTH) в
+предпочтительном формате из RENDITION_FORMATS, заглушек изображений для листингов,
+превью видео и коллажей папок для всего хранилища или его папки.
+
+Задание выполняется в фоне и пропускает то, что уже есть в кэше, поэтому повторный запуск
+(например, после перезапуска сервиса) продолжает работу с места остановки.
+Одновременно выполняется не больше PREGENERATE_CONCURRENCY рендерингов, а при заполненном
+пуле рендеринга задание ждёт RENDER_RETRY_AFTER секунд, уступая запросы пользователей.
+
+Запуск из командной строки:
+    python -m services.pregenerate <storage_id> [--folder <папка>]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from enum import Enum
+from itertools import islice
+from typing import Iterator
+
+from common.exceptions import NotFound, ServiceUnavailable
+from common.settings import settings
+from db.models import Storage
+from schemas.storage import FileGroup, PregenerateStatus
+from services.async_io import run_fs, run_render, shutdown_executors
+from services.CacheManager import CacheManager
+from services.placeholders import create_placeholder, read_placeholder
+from services.storage_content import (
+    COLLAGE_IMAGE_EXTENSIONS,
+    COLLAGE_WIDTH,
+    get_collage_cache_manager,
+    get_folder_collage,
+)
+from services.storage_file import ImagePreset, ResponseFile, supported_image_formats
+from services.storages import get_storage_by_id_service
+
+logger = logging.getLogger(__name__)
+
+WALK_BATCH_SIZE = 100
+
+
+class ItemKind(Enum):
+    THUMBNAIL = 'thumbnail'  # /storage/preview: изображения и превью видео
+    PREVIEW = 'preview'  # /storage/file: изображения
+    COLLAGE = 'collage'
+    PLACEHOLDER = 'placeholder'  # Заглушка изображения для листингов
+
+
+def _walk_items(root: str) -> Iterator[tuple[ItemKind, str]]:
+    """Что нужно сгенерировать в поддереве root: (вид, путь файла или папки)"""
+    for dir_path, _, file_names in os.walk(root):
+        has_images = False
+        for name in sorted(file_names):
+            group = FileGroup.get_group(os.path.splitext(name)[1][1:])
+            path = os.path.join(dir_path, name)
+            if group == FileGroup.IMAGE:
+                yield ItemKind.THUMBNAIL, path
+                yield ItemKind.PREVIEW, path
+                # Обычно уже создана при рендеринге копий
+                yield ItemKind.PLACEHOLDER, path
+            elif group == FileGroup.VIDEO:
+                yield ItemKind.THUMBNAIL, path
+            has_images = has_images or name.lower().endswith(COLLAGE_IMAGE_EXTENSIONS)
+        if has_images:
+            yield ItemKind.COLLAGE, dir_path
+
+
+def _count_items(root: str) -> int:
+    return sum(1 for _ in _walk_items(root))
+
+
+@dataclass
+class PregenerateJob:
+    storage_id: uuid.UUID
+    folder: str  # Папка внутри хранилища
+    root: str  # Полный путь папки
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    status: PregenerateStatus = PregenerateStatus.RUNNING
+    total: int | None = None  # None - ещё считается
+    processed: int = 0
+    rendered: int = 0
+    skipped: int = 0  # Уже были в кэше
+    failed: int = 0
+    started_at: datetime = field(default_factory=datetime.now)
+    finished_at: datetime | None = None
+    error: str | None = None
+
+    async def run(self) -> None:
+        try:
+            self.total = await run_fs(_count_items, self.root)
+            queue = asyncio.Queue(maxsize=settings.PREGENERATE_CONCURRENCY * 2)
+            workers = [
+                asyncio.create_task(self._worker(queue))
+                for _ in range(settings.PREGENERATE_CONCURRENCY)
+            ]
+            try:
+                items = _walk_items(self.root)
+                while batch := await run_fs(lambda: list(islice(items, WALK_BATCH_SIZE))):
+                    for item in batch:
+                        await queue.put(item)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+            self.status = PregenerateStatus.DONE
+        except asyncio.CancelledError:
+            self.status = PregenerateStatus.CANCELLED
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f'Pregenerate job {self.id} error: {e}')
+            self.status = PregenerateStatus.FAILED
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.now()
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while (item := await queue.get()) is not None:
+            kind, path = item
+            while True:
+                try:
+                    rendered = await render_item(kind, path)
+                    break
+                except ServiceUnavailable:
+                    # Пул рендеринга занят запросами пользователей - ждём
+                    await asyncio.sleep(settings.RENDER_RETRY_AFTER)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logger.warning(f'Pregenerate {kind.value} {path} error: {e}')
+                    rendered = None
+                    break
+            if rendered is None:
+                self.failed += 1
+            elif rendered:
+                self.rendered += 1
+            else:
+                self.skipped += 1
+            self.processed += 1
+
+
+async def render_item(kind: ItemKind, path: str) -> bool:
+    """Генерирует копию или коллаж, если их нет в кэше. False - уже были в кэше"""
+    if kind == ItemKind.COLLAGE:
+        cache_manager = await run_fs(get_collage_cache_manager, path)
+        if await run_fs(cache_manager.is_file_cached, width=COLLAGE_WIDTH):
+            return False
+        await get_folder_collage(path)
+        return True
+    if kind == ItemKind.PLACEHOLDER:
+        if await run_fs(read_placeholder, path) is not None:
+            return False
+        await run_render(create_placeholder, path)
+        return True
+    if kind == ItemKind.THUMBNAIL:
+        width, preset = settings.THUMBNAIL_WIDTH, ImagePreset.thumbnail()
+    else:
+        width, preset = settings.PREVIEW_WIDTH, ImagePreset.preview()
+    # Копии в формате, который получат современные браузеры (см. RENDITION_FORMATS)
+    image_format = next(iter(supported_image_formats()), 'jpeg')
+    cache_manager = await run_fs(CacheManager, path)
+    response_file = ResponseFile(
+        path, cache_manager=cache_manager, width=width, preset=preset, image_format=image_format
+    )
+    return await response_file.render_to_cache()
+
+
+# Задания по id (завершённые - не дольше PREGENERATE_JOB_TTL); выполняющиеся - также
+# по (id хранилища, папка)
+_jobs: dict[uuid.UUID, PregenerateJob] = {}
+_running: dict[tuple[uuid.UUID, str], tuple[PregenerateJob, asyncio.Task]] = {}
+
+
+def _forget_running(key: tuple[uuid.UUID, str], task: asyncio.Task) -> None:
+    if key in _running and _running[key][1] is task:
+        del _running[key]
+
+
+def _expire_jobs() -> None:
+    """Забывает задания, завершившиеся раньше, чем PREGENERATE_JOB_TTL секунд назад"""
+    expired = datetime.now() - timedelta(seconds=settings.PREGENERATE_JOB_TTL)
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at is not None and job.finished_at < expired:
+            del _jobs[job_id]
+
+
+def _create_job(storage: Storage, folder: str) -> PregenerateJob:
+    folder = folder.strip('/')
+    root = os.path.join(storage.path, folder)
+    if not os.path.isdir(root):
+        raise NotFound(error_code='not_found', error_message=f'Folder {folder} not found')
+    return PregenerateJob(storage_id=storage.id, folder=folder, root=root)
+
+
+async def start_pregenerate_service(storage_id: uuid.UUID, folder: str = '') -> PregenerateJob:
+    """Запускает задание в фоне; если для этой папки оно уже идёт - возвращает его"""
+    storage = await get_storage_by_id_service(storage_id)
+    if storage is None:
+        raise NotFound(error_code='not_found', error_message=f'Storage {storage_id} not found')
+    job = await run_fs(_create_job, storage, folder)
+    key = (storage.id, job.folder)
+    if key in _running:
+        return _running[key][0]
+    task = asyncio.create_task(job.run())
+    _expire_jobs()
+    _jobs[job.id] = job
+    _running[key] = job, task
+    task.add_done_callback(lambda done: _forget_running(key, done))
+    return job
+
+
+def get_pregenerate_job_service(job_id: uuid.UUID) -> PregenerateJob:
+    _expire_jobs()
+    job = _jobs.get(job_id)
+    if job is None:
+        raise NotFound(error_code='not_found', error_message=f'Job {job_id} not found')
+    return job
+
+
+def cancel_pregenerate_job_service(job_id: uuid.UUID) -> PregenerateJob:
+    job = get_pregenerate_job_service(job_id)
+    running = _running.get((job.storage_id, job.folder))
+    if running is not None and running[0] is job:
+        running[1].cancel()
+    return job
+
+
+async def _main(storage_id: uuid.UUID, folder: str) -> None:
+    storage = await get_storage_by_id_service(storage_id)
+    if storage is None:
+        raise SystemExit(f'Storage {storage_id} not found')
+    job = await run_fs(_create_job, storage, folder)
+    task = asyncio.create_task(job.run())
+    while not task.done():
+        await asyncio.wait([task], timeout=5)
+        logger.info(
+            f'{job.processed}/{job.total if job.total is not None else "?"}: '
+            f'{job.rendered} rendered, {job.skipped} cached, {job.failed} failed'
+        )
+    logger.info(f'Job {job.status.value}' + (f': {job.error}' if job.error else ''))
+    shutdown_executors()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-generate thumbnails, previews and collages')
+    parser.add_argument('storage_id', type=uuid.UUID)
+    parser.add_argument('--folder', default='', help='Папка внутри хранилища')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.storage_id, args.folder))
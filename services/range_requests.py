@@ -4,6 +4,8 @@ from typing import BinaryIO
 from fastapi import HTTPException, status
 from fastapi.responses import StreamingResponse
 
+from services.async_io import run_fs
+
 
 def send_bytes_range_requests(file_obj: BinaryIO, start: int, end: int, chunk_size: int = 10_000):
     """Send a file in chunks using Range Requests specification RFC7233
@@ -36,10 +38,10 @@ def _get_range_header(range_header: str, file_size: int) -> tuple[int, int]:
     return start, end
 
 
-def range_requests_response(file_path: str, content_type: str):
+async def range_requests_response(file_path: str, content_type: str):
     """Returns StreamingResponse using Range Requests of a given file"""
 
-    file_size = os.stat(file_path).st_size
+    file_size = (await run_fs(os.stat, file_path)).st_size
     range_header = None  # request.headers.get("range")
 
     headers = {
@@ -62,8 +64,9 @@ def range_requests_response(file_path: str, content_type: str):
         headers['content-range'] = f"bytes {start}-{end}/{file_size}"
         status_code = status.HTTP_206_PARTIAL_CONTENT
 
+    file_obj = await run_fs(open, file_path, mode='rb')
     return StreamingResponse(
-        send_bytes_range_requests(open(file_path, mode='rb'), start, end),
+        send_bytes_range_requests(file_obj, start, end),
         headers=headers,
         status_code=status_code,
     )
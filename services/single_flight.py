@@ -0,0 +1,46 @@
+"""
+Объединение одновременных одинаковых вычислений (single flight).
+
+Пока вычисление по ключу (например, уменьшенная копия файла определённой ширины) выполняется,
+повторные запросы с тем же ключом не запускают его заново, а ждут уже идущее.
+Вычисление выполняется в отдельной задаче: отмена одного из ожидающих запросов
+не прерывает его для остальных.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.executed = 0  # Сколько вычислений запущено
+        self.coalesced = 0  # Сколько запросов дождались чужого вычисления
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Ошибку получат ожидающие; здесь - чтобы не было предупреждения без ожидающих
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def info(self) -> dict:
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+        }
+
+
+# Уменьшенные копии, превью видео и коллажи; ключ - путь файла в кэше
+render_flight = SingleFlight()
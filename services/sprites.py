@@ -0,0 +1,165 @@
+"""
+Спрайт уменьшенных копий изображений страницы листинга: одно изображение и карта
+положений копий на нём вместо отдельного запроса /storage/preview на каждый файл.
+
+Имя спрайта - хэш путей, mtime и размеров файлов страницы и параметров спрайта, поэтому
+спрайт и карта кэшируются по состоянию папки: при изменении файлов страницы получается
+новое имя, а старый спрайт не отдаётся.
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+
+from PIL import Image, ImageOps
+
+from common.exceptions import NotFound
+from common.settings import settings
+from schemas.storage import FileGroup, SpriteItem, SpriteSheetResponse
+from services.async_io import run_fs, run_render
+from services.CacheManager import CacheManager
+from services.single_flight import render_flight
+from services.storage_file import IMAGE_FORMAT_EXTENSIONS, negotiate_image_format, snap_width
+from services.storage_manager import StorageManager
+from services.storages import get_storage_by_id_service
+
+# Спрайты хранятся в кэше в отдельной папке, не связанной с путями хранилищ
+SPRITES_CACHE_PATH = '/.sprites'
+IMAGE_FORMATS_BY_EXTENSION = {
+    extension: image_format for image_format, extension in IMAGE_FORMAT_EXTENSIONS.items()
+}
+SPRITE_NAME_RE = re.compile(rf'[0-9a-f]{{32}}\.({"|".join(IMAGE_FORMATS_BY_EXTENSION)})')
+
+
+def get_sprite_cache_manager(key: str, extension: str, create_dir: bool = True) -> CacheManager:
+    """Кэш спрайта: изображение - в формате extension, карта - в json"""
+    return CacheManager(
+        os.path.join(SPRITES_CACHE_PATH, key), create_dir=create_dir, extension=extension
+    )
+
+
+def _source_file(path: str, extension: str) -> str:
+    """Уменьшенная копия из кэша (формата спрайта или jpg), если есть, иначе оригинал"""
+    width = snap_width(settings.SPRITE_TILE_SIZE)
+    if width is not None:
+        cache_manager = CacheManager(path, create_dir=False)
+        for variant in (cache_manager.variant(extension), cache_manager):
+            if variant.is_file_cached(width):
+                return variant.get_cached_file(width)
+    return path
+
+
+def _sprite_key(files: list[tuple[str, str]], image_format: str) -> str:
+    """Хэш файлов страницы (имя, путь) с их mtime и размером и параметров спрайта"""
+    parts = [
+        settings.SPRITE_TILE_SIZE,
+        settings.SPRITE_COLUMNS,
+        settings.THUMBNAIL_QUALITY,
+        image_format,
+    ]
+    for name, path in files:
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            continue
+        parts.append((name, path, file_stat.st_mtime_ns, file_stat.st_size))
+    return hashlib.md5(json.dumps(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def render_sprite(files: list[tuple[str, str]], cache_manager: CacheManager, quality: int) -> dict:
+    """
+    Блокирующая часть: уменьшенные копии (имя, путь источника) в клетках SPRITE_TILE_SIZE
+    по SPRITE_COLUMNS в ряд. Спрайт и карта сохраняются в кэш (cache_manager), карта
+    возвращается. Файлы, которые не удалось прочитать, пропускаются
+    """
+    tile = settings.SPRITE_TILE_SIZE
+    tiles = []
+    for name, path in files:
+        try:
+            with Image.open(path) as img:
+                img.draft('RGB', (tile * 2, tile * 2))
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((tile, tile), Image.Resampling.HAMMING)
+                tiles.append((name, img.convert('RGB')))
+        except Exception:  # pylint: disable=broad-exception-caught
+            continue
+
+    columns = max(1, min(settings.SPRITE_COLUMNS, len(tiles)))
+    rows = (len(tiles) + columns - 1) // columns
+    sheet = {'width': columns * tile if tiles else 0, 'height': rows * tile, 'items': []}
+    if tiles:
+        sprite = Image.new('RGB', (sheet['width'], sheet['height']), 'white')
+        for index, (name, img) in enumerate(tiles):
+            x, y = index % columns * tile, index // columns * tile
+            sprite.paste(img, (x, y))
+            item = {'name': name, 'x': x, 'y': y, 'width': img.width, 'height': img.height}
+            sheet['items'].append(item)
+        cache_manager.save_to_cache(sprite, tile, quality=quality)
+    # Карта записывается последней: по ней определяется, что спрайт уже в кэше
+    cache_manager.variant('json').save_bytes_to_cache(json.dumps(sheet).encode(), tile)
+    return sheet
+
+
+def _read_sheet(cache_manager: CacheManager) -> dict | None:
+    try:
+        with open(cache_manager.get_cached_file(settings.SPRITE_TILE_SIZE), 'rb') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+async def get_storage_sprite_service(
+    storage_id: uuid.UUID,
+    folder: str,
+    accept: str | None = None,
+    **listing_kwargs,
+) -> tuple[str | None, SpriteSheetResponse]:
+    """
+    Спрайт страницы листинга (параметры listing_kwargs - как у /storage/{storage_id}):
+    (имя изображения спрайта для get_sprite_file_service, карта положений копий)
+    """
+    storage = await get_storage_by_id_service(storage_id)
+    if storage is None:
+        raise NotFound(error_code='not_found', error_message=f'Storage {storage_id} not found')
+    content = await StorageManager(
+        storage=storage, storage_path=folder, **listing_kwargs
+    ).get_storage_folder_content()
+    files = [
+        (file.name, os.path.join(storage.path, file.full_path))
+        for file in content.files
+        if file.group == FileGroup.IMAGE
+    ]
+    image_format = negotiate_image_format(accept)
+    extension = IMAGE_FORMAT_EXTENSIONS[image_format]
+    key = await run_fs(_sprite_key, files, image_format)
+    cache_manager = await run_fs(get_sprite_cache_manager, key, extension)
+    sheet = await run_fs(_read_sheet, cache_manager.variant('json'))
+    if sheet is None:
+        sources = await run_fs(
+            lambda: [(name, _source_file(path, extension)) for name, path in files]
+        )
+        # Одновременные запросы одной страницы ждут одного рендеринга
+        sheet = await render_flight.do(
+            cache_manager.get_cached_file(settings.SPRITE_TILE_SIZE),
+            lambda: run_render(render_sprite, sources, cache_manager, settings.THUMBNAIL_QUALITY),
+        )
+    name = f'{key}.{extension}' if sheet['items'] else None
+    return name, SpriteSheetResponse(
+        width=sheet['width'],
+        height=sheet['height'],
+        items=[SpriteItem(**item) for item in sheet['items']],
+        url=None,
+    )
+
+
+def get_sprite_file_service(name: str) -> str:
+    """Путь изображения спрайта в кэше по имени из get_storage_sprite_service"""
+    if not SPRITE_NAME_RE.fullmatch(name):
+        raise NotFound(error_code='not_found', error_message='Sprite not found')
+    key, extension = os.path.splitext(name)
+    cache_manager = get_sprite_cache_manager(key, extension[1:], create_dir=False)
+    path = cache_manager.get_cached_file(settings.SPRITE_TILE_SIZE)
+    if not os.path.isfile(path):
+        raise NotFound(error_code='not_found', error_message='Sprite not found')
+    return path
@@ -1,35 +1,102 @@
+import asyncio
+import logging
 import os
 import random
 import uuid
+from typing import AsyncIterator
 
 from PIL import Image
 
-from common.settings import CACHE_COLLAGE_FILE
+from common.exceptions import NotFound
+from common.settings import CACHE_COLLAGE_FILE, settings
 from db.connector import AsyncSession
+from db.models import Storage
 from repositories.storages import get_list_storages
 from schemas.storage import StorageFolder
+from services.async_io import read_bytes, run_fs, run_render
 from services.CacheManager import CacheManager
 from services.collage_maker import CollageMaker
-from services.storage_manager import StorageManager
+from services.http_cache import Validators
+from services.single_flight import render_flight
+from services.storage_manager import StatsMode, StorageManager
 from services.storages import get_storage_by_id_service
 
 COLLAGE_HEIGHT = 400
 COLLAGE_WIDTH = 300
+COLLAGE_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
 
+logger = logging.getLogger(__name__)
 
-async def get_storages_summary_service(user_id: uuid.UUID) -> list[StorageFolder]:
+# Незавершённые подсчёты сводки по хранилищам ((id хранилища, режим статистики) -> задача).
+# Подсчёт, не уложившийся в SUMMARY_TIMEOUT, продолжается в фоне и сохраняет статистику,
+# а повторный запрос ждёт уже идущий подсчёт, а не начинает новый.
+_summary_tasks: dict[tuple[uuid.UUID, StatsMode], asyncio.Task] = {}
+
+
+def _forget_summary_task(key: tuple[uuid.UUID, StatsMode], task: asyncio.Task) -> None:
+    _summary_tasks.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f'Storage {key[0]} summary error: {task.exception()}')
+
+
+async def _get_storage_summary(
+    storage: Storage, semaphore: asyncio.Semaphore, stats: StatsMode
+) -> StorageFolder:
+    async with semaphore:
+        return await StorageManager(storage, stats=stats).get_storage_summary()
+
+
+async def get_storage_summary_with_deadline(
+    storage: Storage, semaphore: asyncio.Semaphore, stats: StatsMode = StatsMode.CACHED
+) -> StorageFolder:
+    key = (storage.id, stats)
+    task = _summary_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(_get_storage_summary(storage, semaphore, stats))
+        _summary_tasks[key] = task
+        task.add_done_callback(lambda done: _forget_summary_task(key, done))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=settings.SUMMARY_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f'Storage {storage.id} summary timeout, returning saved statistic')
+        return await StorageManager(storage).get_stale_storage_summary()
+
+
+async def get_storages_summary_service(
+    user_id: uuid.UUID, stats: StatsMode = StatsMode.CACHED
+) -> list[StorageFolder]:
     async with AsyncSession() as session:
         storages = await get_list_storages(session=session, user_id=user_id)
-    results = []
-    for storage in storages:
-        storage_manager = StorageManager(storage)
-        results.append(await storage_manager.get_storage_summary())
-    return results
+    semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+    return list(
+        await asyncio.gather(
+            *[get_storage_summary_with_deadline(storage, semaphore, stats) for storage in storages]
+        )
+    )
+
+
+async def get_storage_content_stream_service(
+    storage_id: uuid.UUID,
+    folder: str,
+    stats: StatsMode = StatsMode.CACHED,
+    catalog: bool = False,
+    placeholders: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Потоковое содержимое папки (NDJSON). Папка проверяется до начала выдачи,
+    чтобы ошибка вернулась обычным ответом, а не оборванным потоком.
+    """
+    storage = await get_storage_by_id_service(storage_id)
+    if storage is None:
+        raise NotFound(error_code='not_found', error_message=f'Storage {storage_id} not found')
+    storage_manager = StorageManager(storage, storage_path=folder, stats=stats)
+    if not await run_fs(os.path.isdir, storage_manager.folder.path):
+        raise NotFound(error_code='not_found', error_message=f'Folder {folder} not found')
+    return storage_manager.stream_storage_folder_content(catalog, placeholders)
 
 
 def get_random_image_files_from_folder(folder, count) -> list:
-    extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp')
-    files = [file for file in os.listdir(folder) if file.lower().endswith(extensions)]
+    files = [file for file in os.listdir(folder) if file.lower().endswith(COLLAGE_IMAGE_EXTENSIONS)]
     if len(files) > count:
         return random.sample(files, count)
     return files
@@ -45,14 +112,40 @@ async def get_storage_collage_service(
     if storage is None:
         raise ValueError(f'Storage does not exist: {storage_id}')
     full_path_folder = os.path.join(storage.path, folder)
-    if not os.path.exists(full_path_folder):
+    if not await run_fs(os.path.exists, full_path_folder):
         return CollageMaker.generate_image_with_text('Wrong folder')
+    return await get_folder_collage(full_path_folder, force=force)
+
+
+async def get_storage_collage_validators_service(
+    storage_id: uuid.UUID, folder: str
+) -> Validators | None:
+    """Валидаторы коллажа из кэша (по stat файла в кэше), None - коллажа в кэше нет"""
+    storage = await get_storage_by_id_service(storage_id=storage_id)
+    if storage is None:
+        return None
+    full_path_folder = os.path.join(storage.path, folder.lstrip('/'))
+    cache_manager = get_collage_cache_manager(full_path_folder, create_dir=False)
+    try:
+        file_stat = await run_fs(os.stat, cache_manager.get_cached_file(width=COLLAGE_WIDTH))
+    except FileNotFoundError:
+        return None
+    return Validators.for_file(file_stat)
+
+
+def get_collage_cache_manager(full_path_folder: str, create_dir: bool = True) -> CacheManager:
+    return CacheManager(os.path.join(full_path_folder, CACHE_COLLAGE_FILE), create_dir=create_dir)
+
+
+async def get_folder_collage(full_path_folder: str, force: bool = False) -> bytes:
+    """Коллаж папки из кэша или новый (сохраняется в кэш)"""
     # Проверка есть ли картинка в кэше
-    cache_manager = CacheManager(os.path.join(full_path_folder, CACHE_COLLAGE_FILE))
-    if cache_manager.is_file_cached(width=COLLAGE_WIDTH) and not force:
-        with open(cache_manager.get_cached_file(width=COLLAGE_WIDTH), 'rb') as img:
-            return img.read()
-    image_files = get_random_image_files_from_folder(folder=full_path_folder, count=10)
+    cache_manager = await run_fs(get_collage_cache_manager, full_path_folder)
+    if not force and await run_fs(cache_manager.is_file_cached, width=COLLAGE_WIDTH):
+        return await read_bytes(cache_manager.get_cached_file(width=COLLAGE_WIDTH))
+    image_files = await run_fs(
+        get_random_image_files_from_folder, folder=full_path_folder, count=10
+    )
     full_path_image_files = [os.path.join(full_path_folder, filename) for filename in image_files]
     collage_maker = CollageMaker(
         height=COLLAGE_HEIGHT, width=COLLAGE_WIDTH, image_files=full_path_image_files
@@ -61,7 +154,14 @@ async def get_storage_collage_service(
         return CollageMaker.generate_image_with_text(
             'No files', width=COLLAGE_WIDTH, height=COLLAGE_HEIGHT
         )
-    generated_collage_image = collage_maker.generate_image()
-    cache_manager.save_bytes_to_cache(generated_collage_image, COLLAGE_WIDTH)
-    return generated_collage_image
+
+    async def render_collage() -> bytes:
+        image = await run_render(collage_maker.generate_image)
+        await run_fs(cache_manager.save_bytes_to_cache, image, COLLAGE_WIDTH)
+        return image
+
+    # Одновременные запросы коллажа одной папки ждут одного рендеринга
+    return await render_flight.do(
+        cache_manager.get_cached_file(width=COLLAGE_WIDTH), render_collage
+    )
 
@@ -1,24 +1,120 @@
 import os
 import uuid
-from io import BytesIO
+from dataclasses import dataclass
 from os.path import splitext
 
 import cv2
 from PIL import Image, ExifTags
-from starlette.responses import FileResponse, StreamingResponse
+from starlette.responses import FileResponse, Response, StreamingResponse
 
+from common.exceptions import NotFound
+from common.settings import settings
 from schemas.storage import FileGroup
+from services.async_io import run_fs, run_render
 from services.CacheManager import CacheManager
+from services.http_cache import ConditionalRequest, Validators, not_modified_response
+from services.placeholders import EXIF_SWAP_SIZE, save_placeholder
 from services.range_requests import range_requests_response
+from services.single_flight import render_flight
 from services.storages import get_storage_by_id_service
 
 
+# Поворот по тегу EXIF Orientation
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+@dataclass(frozen=True)
+class ImagePreset:
+    """Параметры уменьшения изображения для эндпоинта (см. settings)"""
+
+    resample: Image.Resampling
+    quality: int
+    reducing_gap: float | None
+
+    @classmethod
+    def thumbnail(cls) -> 'ImagePreset':
+        return cls(
+            resample=Image.Resampling[settings.THUMBNAIL_RESAMPLE.upper()],
+            quality=settings.THUMBNAIL_QUALITY,
+            reducing_gap=settings.THUMBNAIL_REDUCING_GAP or None,
+        )
+
+    @classmethod
+    def preview(cls) -> 'ImagePreset':
+        return cls(
+            resample=Image.Resampling[settings.PREVIEW_RESAMPLE.upper()],
+            quality=settings.PREVIEW_QUALITY,
+            reducing_gap=settings.PREVIEW_REDUCING_GAP or None,
+        )
+
+
+# Форматы копий изображений: расширение файла в кэше
+IMAGE_FORMAT_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+VARY_ACCEPT = {'Vary': 'Accept'}
+
+
+def supported_image_formats() -> list[str]:
+    """Форматы из RENDITION_FORMATS, которые умеет сохранять Pillow, в порядке предпочтения"""
+    Image.init()
+    return [
+        image_format
+        for image_format in settings.RENDITION_FORMATS
+        if image_format.upper() in Image.SAVE
+    ]
+
+
+def negotiate_image_format(accept: str | None) -> str:
+    """Формат копии по заголовку Accept; image/* и */* не учитываются - только явные типы"""
+    accepted = set()
+    for item in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.lower())
+    for image_format in supported_image_formats():
+        if f'image/{image_format}' in accepted:
+            return image_format
+    return 'jpeg'
+
+
+def rendition_widths() -> list[int]:
+    return sorted(set(settings.RENDITION_WIDTHS))
+
+
+def snap_width(width: int) -> int | None:
+    """Ступень лестницы копий для запрошенной ширины, None - отдаётся оригинал"""
+    widths = rendition_widths()
+    if not widths:
+        return width
+    for rendition_width in widths:
+        if rendition_width >= width:
+            return rendition_width
+    return None
+
+
 class ResponseFile:
     def __init__(
         self,
         filename: str,
         cache_manager: CacheManager | None = None,
         width: int | None = None,
+        preset: ImagePreset | None = None,
+        image_format: str = 'jpeg',
     ):
         if not width:
             raise ValueError("Width must be defined")
@@ -27,71 +123,179 @@ class ResponseFile:
             self.cache_manager = CacheManager(self.filename)
         self.extension = splitext(filename)[1].lstrip('.')
         self.group = FileGroup.get_group(self.extension)
-        self.width = width
+        # Копии изображений - только ступеней лестницы (None - оригинал)
+        self.width = snap_width(width) if self.group == FileGroup.IMAGE else width
         self.cache_manager = cache_manager
+        self.preset = preset or ImagePreset.preview()
+        self.image_format = image_format
+        if self.group == FileGroup.IMAGE and cache_manager is not None:
+            # У каждого формата копий свой кэш
+            self.cache_manager = cache_manager.variant(IMAGE_FORMAT_EXTENSIONS[image_format])
 
-    async def get_preview(self) -> FileResponse | StreamingResponse:
+    async def get_preview(self) -> FileResponse | Response:
         if self.group == FileGroup.IMAGE:
             return await self.get_resized_image()
         if self.group == FileGroup.VIDEO:
             return await self.generate_video_preview()
         return FileResponse(self.filename, media_type=f"{str(self.group)}/{self.get_media_type()}")
 
-    async def get_file(self) -> FileResponse | StreamingResponse:
+    async def get_file(self) -> FileResponse | Response:
         if self.group == FileGroup.IMAGE:
             return await self.get_resized_image()
         if self.group == FileGroup.VIDEO:
             return await self.get_video_file()
         return FileResponse(self.filename, media_type=f"{str(self.group)}/{self.get_media_type()}")
 
+    async def get_response(
+        self,
+        preview: bool,
+        cache_control: str,
+        conditional: ConditionalRequest | None = None,
+    ) -> FileResponse | Response:
+        """
+        get_preview / get_file с заголовками кэширования. Валидаторы считаются по stat
+        исходного файла, поэтому на повторный запрос ответ 304 отдаётся без рендеринга
+        """
+        try:
+            file_stat = await run_fs(os.stat, self.filename)
+        except FileNotFoundError as e:
+            raise NotFound(error_code='not_found', error_message='File not found') from e
+        validators = Validators.for_file(file_stat, self.width, self.image_format, self.preset)
+        headers = validators.headers(cache_control)
+        if self.group == FileGroup.IMAGE:
+            headers |= VARY_ACCEPT
+        if conditional is not None and conditional.not_modified(validators):
+            return not_modified_response(headers)
+        response = await (self.get_preview() if preview else self.get_file())
+        response.headers.update(headers)
+        return response
+
     def get_media_type(self) -> str:
         if self.extension == 'jpg':
             return 'jpeg'
         return self.extension.lower()
 
-    async def get_resized_image(self) -> FileResponse | StreamingResponse:
-        if self.width and self.cache_manager.is_file_cached(width=self.width):
+    async def get_resized_image(self) -> FileResponse | Response:
+        if self.width is None:
+            return FileResponse(self.filename, media_type=f'image/{self.get_media_type()}')
+        media_type = f'image/{self.image_format}'
+        if await run_fs(self.cache_manager.is_file_cached, width=self.width):
             cached_file = self.cache_manager.get_cached_file(width=self.width)
-            return FileResponse(cached_file, media_type=f'image/{self.get_media_type()}')
+            return FileResponse(cached_file, media_type=media_type, headers=VARY_ACCEPT)
 
+        # Одновременные запросы одной и той же копии ждут одного рендеринга
+        image = await render_flight.do(
+            self.cache_manager.get_cached_file(width=self.width),
+            lambda: run_render(self._render_resized_image),
+        )
+        return Response(image, media_type=media_type, headers=VARY_ACCEPT)
+
+    def _render_resized_image(self) -> bytes:
+        """
+        Блокирующая часть get_resized_image: декодирование, уменьшение, поворот, кэш.
+        Копия кодируется один раз в формате image_format: эти байты и в кэше, и в ответе.
+        Если в кэше есть копия большей ступени, уменьшается ближайшая из них, а не оригинал.
+        Иначе оригинал декодируется один раз и из него последовательно получаются все
+        недостающие ступени не шире изображения (каждая следующая - из предыдущей)
+        и заглушка для листингов (services/placeholders.py).
+        JPEG декодируется сразу в уменьшенном размере (draft - масштабирование DCT),
+        остальные форматы уменьшаются в целое число раз (reduce) перед фильтром.
+        Поворот по EXIF делается уже после уменьшения.
+        """
+        source = self._nearest_cached_rendition()
+        if source is not None:
+            # Копии в кэше уже повернуты и без EXIF
+            with Image.open(source) as img:
+                return self._save_rendition(self._resize(img, self.width, draft=True))
+
+        file_stat = os.stat(self.filename)
         with Image.open(self.filename) as img:
-            # Попытка получить тег ориентации и применять его
-            try:
-                for orientation in ExifTags.TAGS.keys():
-                    if ExifTags.TAGS[orientation] == 'Orientation':
-                        break
-
-                exif = img._getexif()
-                if exif is not None:
-                    orientation = exif.get(orientation)
-
-                if orientation == 3:
-                    img = img.rotate(180, expand=True)
-                elif orientation == 6:
-                    img = img.rotate(270, expand=True)
-                elif orientation == 8:
-                    img = img.rotate(90, expand=True)
-            except Exception as e:
-                # Можем логировать или обрабатывать ошибку иначе, если нужно
-                print(f"Error processing EXIF orientation: {e}")
-
-            # Определение, нужно ли изменять размер изображения
-            if self.width and img.width > self.width:
-                ratio = self.width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((self.width, new_height), Image.HAMMING)
-
-            self.cache_manager.save_to_cache(img, self.width)
-
-            byte_io = BytesIO()
-            img.save(byte_io, format=self.get_media_type())
-            byte_io.seek(0)  # перемещаем курсор в начало файла перед чтением
-
-        return StreamingResponse(byte_io, media_type=f"image/{self.get_media_type()}")
-    async def generate_video_preview(self) -> FileResponse | StreamingResponse:
-        if self.width and self.cache_manager.is_file_cached(width = self.width):
+            orientation = img.getexif().get(ExifTags.Base.Orientation)
+            swap_size = orientation in EXIF_SWAP_SIZE
+            # Размеры после поворота
+            width, height = (img.height, img.width) if swap_size else img.size
+            widths = self._missing_widths(width)
+            img = self._resize(img, widths[0], swap_size=swap_size, draft=True)
+            if orientation in EXIF_TRANSPOSE:
+                img = img.transpose(EXIF_TRANSPOSE[orientation])
+
+            result = b''
+            for rendition_width in widths:
+                img = self._resize(img, rendition_width)
+                if rendition_width == self.width:
+                    result = self._save_rendition(img)
+                else:
+                    self.cache_manager.save_to_cache(
+                        img, rendition_width, quality=self.preset.quality
+                    )
+            # Заглушка для листингов - из самой маленькой копии
+            save_placeholder(self.filename, file_stat, (width, height), img)
+        return result
+
+    def _nearest_cached_rendition(self) -> str | None:
+        for rendition_width in rendition_widths():
+            if rendition_width > self.width and self.cache_manager.is_file_cached(rendition_width):
+                return self.cache_manager.get_cached_file(rendition_width)
+        return None
+
+    def _missing_widths(self, image_width: int) -> list[int]:
+        """Ступени для рендеринга из оригинала шириной image_width, от большей к меньшей"""
+        widths = {
+            rendition_width
+            for rendition_width in rendition_widths()
+            if rendition_width < image_width
+            and not self.cache_manager.is_file_cached(rendition_width)
+        }
+        widths.add(self.width)
+        return sorted(widths, reverse=True)
+
+    def _resize(
+        self, img: Image.Image, width: int, swap_size: bool = False, draft: bool = False
+    ) -> Image.Image:
+        """Уменьшение до ширины width (после поворота, если swap_size); не шире - без изменений"""
+        img_width, img_height = (img.height, img.width) if swap_size else img.size
+        if img_width <= width:
+            return img
+        size = (width, max(1, int(img_height * width / img_width)))
+        if swap_size:
+            size = size[::-1]
+        reducing_gap = self.preset.reducing_gap
+        if draft and reducing_gap:
+            img.draft(None, (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+        return img.resize(size, self.preset.resample, reducing_gap=reducing_gap)
+
+    def _save_rendition(self, img: Image.Image) -> bytes:
+        # Копия кодируется один раз: те же байты записываются в кэш и отдаются в ответе
+        return self.cache_manager.save_to_cache(img, self.width, quality=self.preset.quality)
+
+    async def render_to_cache(self) -> bool:
+        """
+        Создаёт копию (превью видео) в кэше, не формируя ответ - для предварительной генерации.
+        False - копия уже была в кэше
+        """
+        if self.width is None or await run_fs(self.cache_manager.is_file_cached, width=self.width):
+            return False
+        if self.group == FileGroup.VIDEO:
+            render = self._render_video_preview
+        else:
+            render = self._render_resized_image
+        await render_flight.do(
+            self.cache_manager.get_cached_file(width=self.width), lambda: run_render(render)
+        )
+        return True
+
+    async def generate_video_preview(self) -> FileResponse | Response:
+        if self.width and await run_fs(self.cache_manager.is_file_cached, width=self.width):
             cached_file = self.cache_manager.get_cached_file(width = self.width)
             return FileResponse(cached_file, media_type='image/jpeg')
+        image = await render_flight.do(
+            self.cache_manager.get_cached_file(width=self.width),
+            lambda: run_render(self._render_video_preview),
+        )
+        return Response(image, media_type='image/jpeg')
+
+    def _render_video_preview(self) -> bytes:
+        """Блокирующая часть generate_video_preview: первый кадр видео в jpeg, кэш"""
         video_file = cv2.VideoCapture(self.filename)
         if not video_file.isOpened():
             raise ValueError(f"Could not open video file {self.filename}")
@@ -103,16 +307,16 @@ class ResponseFile:
         if not is_success:
             raise ValueError(f"Could not encode frame to .jpg from video file {self.filename}")
 
-        self.cache_manager.save_to_cache(Image.fromarray(frame), self.width)
-
-        byte_io = BytesIO(buffer.tobytes())  # возвращаем "курсор" в начало файла
         video_file.release()
         cv2.destroyAllWindows()
 
-        return StreamingResponse(byte_io, media_type='image/jpeg')
+        # В кэш - тот же jpeg, что и в ответ
+        image = buffer.tobytes()
+        self.cache_manager.save_bytes_to_cache(image, self.width)
+        return image
 
     async def get_video_file(self) -> StreamingResponse:
-        return range_requests_response(self.filename, content_type='video/mp4')
+        return await range_requests_response(self.filename, content_type='video/mp4')
 
 
 async def get_storage_file_service(
@@ -121,12 +325,19 @@ async def get_storage_file_service(
     filename: str,
     width: int | None = None,
     preview: bool = True,
-) -> StreamingResponse:
+    accept: str | None = None,
+    conditional: ConditionalRequest | None = None,
+) -> FileResponse | Response:
     storage = await get_storage_by_id_service(storage_id=storage_id)
     folder = folder.lstrip('/')
     full_path = os.path.join(storage.path, folder, filename)
-    cache_manager = CacheManager(full_path)
-    result = ResponseFile(filename=full_path, cache_manager=cache_manager, width=width)
-    if preview:
-        return await result.get_preview()
-    return await result.get_file()
+    cache_manager = await run_fs(CacheManager, full_path)
+    result = ResponseFile(
+        filename=full_path,
+        cache_manager=cache_manager,
+        width=width,
+        preset=ImagePreset.thumbnail() if preview else ImagePreset.preview(),
+        image_format=negotiate_image_format(accept),
+    )
+    cache_control = settings.PREVIEW_CACHE_CONTROL if preview else settings.FILE_CACHE_CONTROL
+    return await result.get_response(preview, cache_control, conditional)
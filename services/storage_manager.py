@@ -1,15 +1,88 @@
+import base64
+import binascii
+import json
 import os
+from bisect import bisect_right
 from datetime import datetime
 from enum import Enum
-from typing import List, Tuple
+from typing import Any, AsyncIterator, Callable, Iterator, List, Tuple
 
-from db.models import Storage
+from sqlalchemy import and_, func
+
+from common.exceptions import BadRequest
+from common.settings import settings
+from db.connector import AsyncSession
+from db.models import Storage, StorageEntry, StorageStatistic
+from repositories.storage_entry import count_folder_entries, get_folder_entries, get_storage_entry
+from repositories.storage_statistic import get_storage_statistic_by_path
 from schemas.storage import Count, FileGroup, Folder, StorageFile, StorageFolder
+from services.async_io import run_fs
 from services.catalog import get_files_data_from_catalog_by_names_list
+from services.folder_listing import NO_TIME, FileEntries, FolderEntries, entries_from_scan
+from services.folder_stats import (
+    FolderStats,
+    FolderStatsEstimator,
+    FolderStatsIndex,
+    FolderStatsScanner,
+    ShallowFolderStats,
+    stats_from_row,
+)
+from services.listing_cache import ListingCache, listing_cache
+from services.placeholders import add_placeholders
 
 PAGE_SIZE = 20
 
 
+def _list_entries(path: str) -> Tuple[List[str], List[str]]:
+    """
+    Имена вложенных папок и файлов. Тип берётся из DirEntry (d_type) без stat,
+    stat нужен только для symlink.
+    """
+    folders, files = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    folders.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+            except OSError:
+                continue
+    return folders, files
+
+
+def _scan_batches(path: str, batch_size: int) -> Iterator[List[Tuple[str, os.stat_result | None]]]:
+    """
+    Содержимое папки пачками по batch_size в порядке scandir: (имя, stat файла или None у папки)
+    """
+    batch = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    batch.append((entry.name, None))
+                elif entry.is_file():
+                    batch.append((entry.name, entry.stat()))
+            except OSError:
+                continue
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _stat_files(path: str, names: List[str]) -> dict[str, os.stat_result]:
+    """stat файлов папки path; исчезнувшие файлы пропускаются"""
+    result = {}
+    for name in names:
+        try:
+            result[name] = os.stat(os.path.join(path, name))
+        except OSError:
+            continue
+    return result
+
+
 class OrderFolder(Enum):
     NAME = 'name'
     TIME = 'time'
@@ -18,6 +91,47 @@ class OrderFolder(Enum):
     FOLDERS_COUNT = 'folders_count'
 
 
+class StatsMode(Enum):
+    EXACT = 'exact'  # Полный обход поддеревьев
+    CACHED = 'cached'  # Сохранённая статистика, пересчёт только изменившихся папок
+    ESTIMATE = 'estimate'  # Оценка по выборке с ограниченной глубиной
+    NONE = 'none'  # Без обхода поддеревьев, только непосредственное содержимое
+
+
+class EntryKind(Enum):
+    FOLDER = 'folder'
+    FILE = 'file'
+
+
+def encode_cursor(order_by: OrderFolder, kind: EntryKind, key: tuple) -> str:
+    """Непрозрачный курсор: порядок сортировки, вид и ключ сортировки последнего элемента"""
+    data = json.dumps([order_by.value, kind.value, list(key)], ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def _valid_key(order_by: OrderFolder, key: list) -> bool:
+    """Ключ (имя,) при сортировке по имени, иначе (значение, имя) - у папок и файлов одинаково"""
+    if order_by == OrderFolder.NAME:
+        return len(key) == 1 and isinstance(key[0], str)
+    return (
+        len(key) == 2
+        and isinstance(key[0], (int, float))
+        and not isinstance(key[0], bool)
+        and isinstance(key[1], str)
+    )
+
+
+def decode_cursor(cursor: str, order_by: OrderFolder) -> Tuple[EntryKind, tuple]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        order, kind, key = json.loads(data)
+        if order != order_by.value or not isinstance(key, list) or not _valid_key(order_by, key):
+            raise ValueError(order)
+        return EntryKind(kind), tuple(key)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise BadRequest(error_code='invalid_cursor', error_message='Некорректный курсор') from e
+
+
 class FolderManager:
     max_files = 100
     max_folders = 100
@@ -28,122 +142,201 @@ class FolderManager:
         order_by: OrderFolder = OrderFolder.NAME,
         page_number: int = 1,
         page_size: int = PAGE_SIZE,
+        stats_index: FolderStatsScanner | None = None,
+        cache: ListingCache = listing_cache,
+        cursor: str | None = None,
     ):
         self.path = storage_path
         self.order_by = order_by
         self.page_number = page_number
         self.page_size = page_size
-
-    @staticmethod
-    def _get_size(path) -> int:
-        total = 0
-        for dir_path, _, filenames in os.walk(path):
-            for f in filenames:
-                fp = os.path.join(dir_path, f)
-                total += os.path.getsize(fp) if os.path.isfile(fp) else 0
-        return total
-
-    @staticmethod
-    def _get_counts(path) -> ((int, int), (int, int)):
-        folder_count = file_count = 0
-        direct_folder_count = direct_file_count = -1  # Случай, когда основная директория считается
-
-        for _, dir_names, file_names in os.walk(path):
-            folder_count += len(dir_names)
-            file_count += len(file_names)
-
-            if direct_folder_count == -1:  # Если это первая итерация цикла
-                direct_folder_count += len(dir_names) + 1  # то считаем количество папок и файлов
-                direct_file_count += len(file_names) + 1  # внутри текущей папки
-
-        # return (direct_folder_count, folder_count), (direct_file_count, file_count)
-        return {'direct': direct_folder_count, 'total': folder_count}, {
-            'direct': direct_file_count,
-            'total': file_count,
-        }
+        # Источник статистики папок: файловая система или сохранённый индекс
+        self.stats = stats_index or FolderStatsScanner()
+        self.listing_cache = cache
+        # Курсор продолжения листинга вместо page_number и курсор следующей страницы
+        self.cursor = cursor
+        self.next_cursor: str | None = None
 
     async def get_folder_summary(self, trim_start_name: str = '') -> Folder:
-        folders_count, files_count, size = await self._count_elements_and_size(self.path)
         try:
-            time_last_modified = os.path.getmtime(self.path)
-        except Exception:  # pylint: disable=broad-exception-caught
-            time_last_modified = None
+            stats = await self.stats.get_folder_stats(self.path)
+        except OSError:
+            stats = FolderStats()
         if self.path.startswith(trim_start_name):
             trimmed_path = self.path[len(trim_start_name) :]
         else:
             trimmed_path = self.path
-        time_last_modified = (
-            None if time_last_modified is None else datetime.fromtimestamp(time_last_modified)
-        )
-        return Folder(
-            name=trimmed_path,
-            time=time_last_modified,
-            size=size,
-            folders_count=Count(**folders_count),
-            files_count=Count(**files_count),
-        )
+        return self._create_folder(trimmed_path, stats)
+
+    async def get_saved_folder_summary(self, trim_start_name: str = '') -> Folder:
+        """Сводка по последней сохранённой статистике (пустая, если её нет)"""
+        stats = await self.stats.get_saved_stats(self.path) or FolderStats()
+        if self.path.startswith(trim_start_name):
+            trimmed_path = self.path[len(trim_start_name) :]
+        else:
+            trimmed_path = self.path
+        return self._create_folder(trimmed_path, stats)
 
     async def get_folder_content(self, order_by: OrderFolder = OrderFolder.NAME) -> Folder:
         # start_index = (self.page_number - 1) * self.page_size
         # end_index = start_index + self.page_size
 
-        nested_folders, nested_files = await self._fetch_separated_folder_and_files()
-        # Здесь имеем отдельно несортированные папки и файлы.
-
-        # Сортируем:
         if order_by:
             self.order_by = order_by
-        nested_folders = sorted(nested_folders, key=lambda x: getattr(x, self.order_by.value))
-        nested_files = sorted(nested_files, key=lambda x: getattr(x, self.order_by.value))
+        if self.order_by == OrderFolder.NAME:
+            return await self._get_folder_content_page()
 
-        # Получаем срез пагинации
-        pagination = self._paginate(len(nested_folders), len(nested_files))
-        nested_folders = nested_folders[pagination[0] : pagination[1]]
-        nested_files = nested_files[pagination[2] : pagination[3]]
+        stats, folder_entries, file_entries = await self.listing_cache.get_or_create(
+            self.path, (self.order_by.value, self.stats.mode), self._list_sorted
+        )
+
+        # Получаем срез пагинации. Модели создаются только для элементов страницы
+        pagination = self._page_bounds(
+            folder_entries.sort_keys(self.order_by.value),
+            file_entries.sort_keys(self.order_by.value),
+            lambda key: key,
+        )
+        nested_folders = [
+            self._create_folder(folder_entries.names[i], folder_entries.stats(i))
+            for i in range(pagination[0], pagination[1])
+        ]
+        # Конец страницы файлов в _paginate не ограничен их количеством
+        file_end = min(pagination[3], len(file_entries))
+        nested_files = [
+            file_entries.storage_file(i, self.path) for i in range(pagination[2], file_end)
+        ]
 
         # Дополняем nested_files данными из БД:
         nested_files = await get_files_data_from_catalog_by_names_list(nested_files)
 
-        time_last_modified = os.path.getmtime(self.path)
-        folders_count, files_count, size = await self._count_elements_and_size(self.path)
+        folder = self._create_folder(self.path, stats)
+        folder.folders = nested_folders
+        folder.files = nested_files
+        return folder
 
-        return Folder(
-            name=self.path,
-            time=datetime.fromtimestamp(time_last_modified),
-            size=size,
-            folders_count=Count(**folders_count),
-            files_count=Count(**files_count),
-            folders=nested_folders,
-            files=nested_files,
+    async def _list_sorted(self) -> Tuple[Tuple[FolderStats, FolderEntries, FileEntries], int]:
+        """
+        Полный обход папки и сортировка всего содержимого (для кэша содержимого папок).
+        Содержимое хранится компактно (services/folder_listing.py)
+        """
+        scan = await self.stats.scan_folder(self.path)
+        folder_entries, file_entries = entries_from_scan(scan)
+        # Сортируем (имя - для однозначного порядка при равных значениях):
+        folder_entries = folder_entries.sorted(self.order_by.value)
+        file_entries = file_entries.sorted(self.order_by.value)
+        return (scan.stats, folder_entries, file_entries), len(folder_entries) + len(file_entries)
+
+    async def _list_names(self) -> Tuple[tuple, int]:
+        """Статистика папки и отсортированные имена её содержимого (для кэша содержимого папок)"""
+        stats = await self.stats.get_folder_stats(self.path)
+        folder_names, file_names = await run_fs(_list_entries, self.path)
+        folder_names.sort()
+        file_names.sort()
+        return (stats, folder_names, file_names), len(folder_names) + len(file_names)
+
+    async def _get_folder_content_page(self) -> Folder:
+        """
+        Содержимое папки при сортировке по имени: сначала по одному scandir выбирается
+        страница, и только для попавших в неё папок и файлов считается статистика и делается stat.
+        """
+        stats, folder_names, file_names = await self.listing_cache.get_or_create(
+            self.path, (OrderFolder.NAME.value, self.stats.mode), self._list_names
         )
+        pagination = self._page_bounds(folder_names, file_names, lambda name: (name,))
+        folder_names = folder_names[pagination[0] : pagination[1]]
+        file_names = file_names[pagination[2] : pagination[3]]
 
-    async def _fetch_separated_folder_and_files(self) -> Tuple[List[Folder], List[StorageFile]]:
-        nested_folders = []
-        nested_files = []
+        folders_stats = await self.stats.get_folders_stats(
+            [os.path.join(self.path, name) for name in folder_names]
+        )
+        files_stats = await run_fs(_stat_files, self.path, file_names)
+        nested_folders = [
+            self._create_folder(name, folders_stats[os.path.join(self.path, name)])
+            for name in folder_names
+            if os.path.join(self.path, name) in folders_stats
+        ]
+        nested_files = [
+            StorageFile(**await self.get_file_info(os.path.join(self.path, name), file_stat))
+            for name, file_stat in files_stats.items()
+        ]
+        nested_files = await get_files_data_from_catalog_by_names_list(nested_files)
 
-        for name in os.listdir(self.path):
-            nested_full_path = os.path.join(self.path, name)
-            time_last_modified = os.path.getmtime(nested_full_path)
-            nested_folders_count, nested_files_count, size = await self._count_elements_and_size(
-                nested_full_path
-            )
+        folder = self._create_folder(self.path, stats)
+        folder.folders = nested_folders
+        folder.files = nested_files
+        return folder
 
-            if os.path.isdir(nested_full_path):
-                obj = Folder(
-                    name=name,
-                    time=datetime.fromtimestamp(time_last_modified),
-                    size=size,
-                    folders_count=Count(**nested_folders_count),
-                    files_count=Count(**nested_files_count),
-                )
-                nested_folders.append(obj)
+    async def iter_folder_content(
+        self, batch_size: int, catalog: bool = False
+    ) -> AsyncIterator[Tuple[List[Folder], List[StorageFile]]]:
+        """
+        Содержимое папки пачками по мере чтения папки, без сортировки и без хранения
+        всего содержимого. catalog - дополнять файлы данными из БД.
+        """
+        batches = _scan_batches(self.path, batch_size)
+        try:
+            while batch := await run_fs(next, batches, None):
+                folder_paths = [
+                    os.path.join(self.path, name) for name, stat in batch if stat is None
+                ]
+                folders_stats = await self.stats.get_folders_stats(folder_paths)
+                nested_folders = [
+                    self._create_folder(os.path.basename(path), folders_stats[path])
+                    for path in folder_paths
+                    if path in folders_stats
+                ]
+                nested_files = [
+                    StorageFile(**await self.get_file_info(os.path.join(self.path, name), stat))
+                    for name, stat in batch
+                    if stat is not None
+                ]
+                if catalog:
+                    nested_files = await get_files_data_from_catalog_by_names_list(nested_files)
+                yield nested_folders, nested_files
+        finally:
+            await run_fs(batches.close)
 
-            elif os.path.isfile(nested_full_path):
-                file_info = await self.get_file_info(nested_full_path)
-                # catalog_info = await get_file_data_from_catalog_by_fullname(nested_full_path)
-                # Инфу из БД сюда не ставим, т.к. она нужно ТОЛЬКО на срез пагинации.
-                nested_files.append(StorageFile(**file_info))
-        return nested_folders, nested_files
+    @staticmethod
+    def _create_folder(name: str, stats: FolderStats) -> Folder:
+        return Folder(
+            name=name,
+            time=None if stats.mtime is None else datetime.fromtimestamp(stats.mtime),
+            size=stats.size,
+            folders_count=Count(**stats.folders_count()),
+            files_count=Count(**stats.files_count()),
+        )
+
+    def _page_bounds(
+        self, folders: list, files: list, sort_key: Callable[[Any], tuple]
+    ) -> Tuple[int, int, int, int]:
+        """
+        Границы страницы в отсортированных списках папок и файлов: по номеру страницы
+        или, если передан курсор, сразу после элемента курсора (поиск делением пополам).
+        Заполняет next_cursor, если после страницы есть ещё элементы.
+        """
+        if self.cursor is None:
+            bounds = self._paginate(len(folders), len(files))
+        else:
+            kind, key = decode_cursor(self.cursor, self.order_by)
+            if kind == EntryKind.FOLDER:
+                folder_start = bisect_right(folders, key, key=sort_key)
+                folder_end = min(folder_start + self.page_size, len(folders))
+                bounds = folder_start, folder_end, 0, self.page_size - (folder_end - folder_start)
+            else:
+                file_start = bisect_right(files, key, key=sort_key)
+                bounds = len(folders), len(folders), file_start, file_start + self.page_size
+            bounds = bounds[:3] + (min(bounds[3], len(files)),)
+
+        folder_start, folder_end, file_start, file_end = bounds
+        self.next_cursor = None
+        if file_end > file_start:
+            if file_end < len(files):
+                last = sort_key(files[file_end - 1])
+                self.next_cursor = encode_cursor(self.order_by, EntryKind.FILE, last)
+        elif folder_end > folder_start and (folder_end < len(folders) or files):
+            last = sort_key(folders[folder_end - 1])
+            self.next_cursor = encode_cursor(self.order_by, EntryKind.FOLDER, last)
+        return bounds
 
     def _paginate(self, folders_count, files_count):
         start_index = (self.page_number - 1) * self.page_size
@@ -162,20 +355,14 @@ class FolderManager:
 
         return folder_start, folder_end, file_start, file_end
 
-    async def _count_elements_and_size(self, full_path) -> tuple:
-        """
-        Вызывает методы подсчёта папок, файлов и размера папки
-        """
-        folders_count, files_count = self._get_counts(full_path)
-        size = self._get_size(full_path)
-        return folders_count, files_count, size
-
-    async def get_file_info(self, full_path: str) -> dict:
+    async def get_file_info(self, full_path: str, file_stat: os.stat_result | None = None) -> dict:
         # try:
+        if file_stat is None:
+            file_stat = await run_fs(os.stat, full_path)
         type_ = os.path.splitext(full_path)[1][1:]  # get file extension
-        created = datetime.fromtimestamp(os.path.getctime(full_path))
-        updated = datetime.fromtimestamp(os.path.getmtime(full_path))
-        size = os.path.getsize(full_path)
+        created = datetime.fromtimestamp(file_stat.st_ctime)
+        updated = datetime.fromtimestamp(file_stat.st_mtime)
+        size = file_stat.st_size
         group = FileGroup.get_group(type_)
 
         return {
@@ -196,6 +383,162 @@ class FolderManager:
         pass
 
 
+def storage_file_from_entry(storage: Storage, entry: StorageEntry) -> StorageFile:
+    """Файл из индекса storage_entries (full_path - полный путь, как в FolderManager)"""
+    type_ = os.path.splitext(entry.name)[1][1:]
+    return StorageFile(
+        name=entry.name,
+        type=type_,
+        full_path=os.path.join(storage.path, entry.path),
+        size=entry.size,
+        created=datetime.fromtimestamp(entry.ctime),
+        updated=datetime.fromtimestamp(entry.mtime),
+        group=FileGroup.get_group(type_),
+    )
+
+
+class IndexedFolderManager(FolderManager):
+    """
+    Содержимое папки из индекса storage_entries (см. services/crawler.py):
+    сортировка, подсчёт и пагинация выполняются запросами к БД, без обращения к диску.
+    Если папки ещё нет в индексе или её mtime изменился после обхода - содержимое
+    читается с диска, как в FolderManager.
+    """
+
+    def __init__(self, storage: Storage, storage_path: str, **kwargs):
+        super().__init__(storage_path=storage_path, **kwargs)
+        self.storage = storage
+        key = os.path.relpath(os.path.normpath(storage_path), os.path.normpath(storage.path))
+        self.key = '' if key == '.' else key
+
+    async def get_folder_content(self, order_by: OrderFolder = OrderFolder.NAME) -> Folder:
+        if order_by:
+            self.order_by = order_by
+        async with AsyncSession() as session:
+            folder = await self._get_indexed_folder_content(session)
+        if folder is None:
+            return await super().get_folder_content(order_by)
+        return folder
+
+    def _index_sort(self, is_dir: bool) -> Tuple[list, Callable[[Any], tuple]]:
+        """Колонки сортировки и функция ключа сортировки строки (для курсора)"""
+        if self.order_by == OrderFolder.NAME:
+            return [StorageEntry.name], lambda row: (row[0].name,)
+        if self.order_by == OrderFolder.TIME:
+            column, value = StorageEntry.mtime, lambda row: row[0].mtime
+        elif not is_dir and self.order_by == OrderFolder.SIZE:
+            column, value = StorageEntry.size, lambda row: row[0].size
+        elif is_dir:
+            # Размер и количество файлов и папок поддерева - из статистики папок
+            attribute = self.order_by.value
+            column = func.coalesce(getattr(StorageStatistic, attribute), -1)
+
+            def value(row) -> int:
+                return -1 if row[1] is None else getattr(row[1], attribute)
+
+        else:
+            # Как SortKeys у файлов без колонки порядка: значение NO_TIME, порядок только по имени
+            return [StorageEntry.name], lambda row: (NO_TIME, row[0].name)
+        return [column, StorageEntry.name], lambda row: (value(row), row[0].name)
+
+    async def _get_entries(
+        self, session: AsyncSession, is_dir: bool, offset: int, limit: int, after: tuple | None
+    ) -> Tuple[list, Callable[[Any], tuple]]:
+        """Строки страницы (limit + 1, чтобы знать, есть ли следующие)"""
+        columns, sort_key = self._index_sort(is_dir)
+        if limit <= 0:
+            return [], sort_key
+        join = None
+        if is_dir:
+            join = StorageStatistic, and_(
+                StorageStatistic.storage_id == StorageEntry.storage_id,
+                StorageStatistic.path == StorageEntry.path,
+            )
+        rows = await get_folder_entries(
+            session,
+            self.storage.id,
+            self.key,
+            is_dir,
+            columns,
+            offset=offset,
+            limit=limit + 1,
+            # Постоянное NO_TIME в начале ключа файлов в запросе не участвует
+            after=None if after is None else after[-len(columns) :],
+            join=join,
+        )
+        return rows, sort_key
+
+    @staticmethod
+    def _entry_stats(entry: StorageEntry, statistic: StorageStatistic | None) -> FolderStats:
+        stats = FolderStats() if statistic is None else stats_from_row(statistic)
+        stats.mtime = entry.mtime
+        return stats
+
+    async def _get_indexed_folder_content(self, session: AsyncSession) -> Folder | None:
+        entry = await get_storage_entry(session, self.storage.id, self.key)
+        if entry is None or not entry.is_dir:
+            return None
+        # Папка изменилась после обхода - индекс устарел, содержимое читается с диска
+        try:
+            if (await run_fs(os.stat, self.path)).st_mtime != entry.mtime:
+                return None
+        except OSError:
+            return None
+        statistic = await get_storage_statistic_by_path(session, self.storage.id, self.key)
+        folders_count, files_count = await count_folder_entries(session, self.storage.id, self.key)
+
+        if self.cursor is None:
+            bounds = self._paginate(folders_count, files_count)
+            folder_limit, file_limit = bounds[1] - bounds[0], bounds[3] - bounds[2]
+            folder_offset, file_offset = bounds[0], bounds[2]
+            folder_after = file_after = None
+        else:
+            kind, key = decode_cursor(self.cursor, self.order_by)
+            folder_offset = file_offset = 0
+            folder_after = key if kind == EntryKind.FOLDER else None
+            file_after = key if kind == EntryKind.FILE else None
+            folder_limit = self.page_size if kind == EntryKind.FOLDER else 0
+            file_limit = self.page_size
+
+        folder_rows, folder_key = await self._get_entries(
+            session, True, folder_offset, folder_limit, folder_after
+        )
+        more_folders = len(folder_rows) > folder_limit
+        folder_rows = folder_rows[:folder_limit]
+        if self.cursor is not None:
+            file_limit -= len(folder_rows)
+        file_rows, file_key = await self._get_entries(
+            session, False, file_offset, file_limit, file_after
+        )
+        more_files = len(file_rows) > file_limit
+        file_rows = file_rows[: max(file_limit, 0)]
+
+        self.next_cursor = None
+        if file_rows:
+            if more_files:
+                self.next_cursor = encode_cursor(
+                    self.order_by, EntryKind.FILE, file_key(file_rows[-1])
+                )
+        elif folder_rows and (more_folders or files_count):
+            self.next_cursor = encode_cursor(
+                self.order_by, EntryKind.FOLDER, folder_key(folder_rows[-1])
+            )
+
+        nested_folders = [
+            self._create_folder(row.name, self._entry_stats(row, statistic))
+            for row, statistic in folder_rows
+        ]
+        nested_files = [storage_file_from_entry(self.storage, row) for (row,) in file_rows]
+        nested_files = await get_files_data_from_catalog_by_names_list(nested_files)
+
+        stats = self._entry_stats(entry, statistic)
+        stats.direct_folders, stats.direct_files = folders_count, files_count
+        folder = self._create_folder(self.path, stats)
+        folder.folders = nested_folders
+        folder.files = nested_files
+        return folder
+
+
 class StorageManager:
     def __init__(
         self,
@@ -204,6 +547,8 @@ class StorageManager:
         order_by: OrderFolder = OrderFolder.NAME,
         page_number: int = 1,
         page_size: int = PAGE_SIZE,
+        cursor: str | None = None,
+        stats: StatsMode = StatsMode.CACHED,
     ):
         self.storage = storage
         self.page_number = page_number
@@ -211,17 +556,36 @@ class StorageManager:
         self.page_size = page_size
         self.storage_path = storage_path.lstrip('/')  # Путь внутри хранилища, без / в начале
 
-        self.folder = FolderManager(
-            storage_path=os.path.join(storage.path, self.storage_path),
-            order_by=self.order_by,
-            page_number=page_number,
-            page_size=page_size,
-        )
+        folder_manager_kwargs = {
+            'storage_path': os.path.join(storage.path, self.storage_path),
+            'order_by': self.order_by,
+            'page_number': page_number,
+            'page_size': page_size,
+            'stats_index': self._get_stats_source(stats),
+            'cursor': cursor,
+        }
+        if settings.CRAWLER_ENABLED and stats == StatsMode.CACHED:
+            # Содержимое папки из индекса фонового обхода
+            self.folder = IndexedFolderManager(storage=storage, **folder_manager_kwargs)
+        else:
+            self.folder = FolderManager(**folder_manager_kwargs)
+
+    def _get_stats_source(self, stats: StatsMode) -> FolderStatsScanner:
+        if stats == StatsMode.CACHED:
+            return FolderStatsIndex(storage_id=self.storage.id, root=self.storage.path)
+        if stats == StatsMode.ESTIMATE:
+            return FolderStatsEstimator()
+        if stats == StatsMode.NONE:
+            return ShallowFolderStats()
+        return FolderStatsScanner()
 
     async def get_storage_folder_content(
         self,
+        placeholders: bool = False,
     ) -> StorageFolder:
-        folder = await self.folder.get_folder_content()
+        folder = await self.folder.get_folder_content(order_by=self.order_by)
+        if placeholders:
+            await add_placeholders(folder.files)
         # Убираем путь хранилища из folder.name
         folder.name = self.storage_path
         # Убираем путь хранилища из файлов (folder.files)
@@ -229,10 +593,38 @@ class StorageManager:
             file.full_path = file.full_path.replace(self.storage.path + '/', '', 1)
         return await self.create_storage_folder_object(folder)
 
+    async def stream_storage_folder_content(
+        self, catalog: bool = False, placeholders: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Содержимое папки в формате NDJSON: по строке на каждую вложенную папку и файл
+        (поле kind - folder или file), отдаётся пачками по STREAM_BATCH_SIZE
+        """
+        async for nested_folders, nested_files in self.folder.iter_folder_content(
+            settings.STREAM_BATCH_SIZE, catalog
+        ):
+            if placeholders:
+                await add_placeholders(nested_files)
+            lines = []
+            for folder in nested_folders:
+                data = folder.model_dump(mode='json', exclude={'folders', 'files'})
+                lines.append(json.dumps({'kind': 'folder', **data}, ensure_ascii=False))
+            for file in nested_files:
+                file.full_path = file.full_path.replace(self.storage.path + '/', '', 1)
+                data = file.model_dump(mode='json')
+                lines.append(json.dumps({'kind': 'file', **data}, ensure_ascii=False))
+            yield ''.join(f'{line}\n' for line in lines)
+
     async def get_storage_summary(self) -> StorageFolder:
         folder = await self.folder.get_folder_summary(trim_start_name=self.storage.path)
         return await self.create_storage_folder_object(folder)
 
+    async def get_stale_storage_summary(self) -> StorageFolder:
+        folder = await self.folder.get_saved_folder_summary(trim_start_name=self.storage.path)
+        storage_folder = await self.create_storage_folder_object(folder)
+        storage_folder.stale = True
+        return storage_folder
+
     async def create_storage_folder_object(self, folder: Folder) -> StorageFolder:
         return StorageFolder(
             storage_id=self.storage.id,
@@ -0,0 +1,46 @@
+"""
+Поиск файлов хранилища по имени в индексе storage_entries (см. services/crawler.py).
+Подстрока и префикс ищутся по GIN индексу pg_trgm. Индекс поддерживают в актуальном
+состоянии фоновый обход и наблюдатель; при поиске диск не читается, кроме первого
+обращения к ещё не проиндексированному хранилищу.
+"""
+import uuid
+
+from common.exceptions import NotFound
+from db.connector import AsyncSession
+from repositories.storage_entry import count_storage_files, search_storage_files
+from schemas.storage import StorageFile
+from services.catalog import get_files_data_from_catalog_by_names_list
+from services.crawler import storage_crawler
+from services.storage_manager import PAGE_SIZE, storage_file_from_entry
+from services.storages import get_storage_by_id_service
+
+
+async def search_storage_files_service(
+    storage_id: uuid.UUID,
+    query: str,
+    prefix: bool = False,
+    page: int = 1,
+    page_size: int = PAGE_SIZE,
+) -> tuple[list[StorageFile], int]:
+    """Возвращает страницу найденных файлов (full_path - путь внутри хранилища) и их количество"""
+    storage = await get_storage_by_id_service(storage_id)
+    if storage is None:
+        raise NotFound(error_code='not_found', error_message=f'Storage {storage_id} not found')
+    await storage_crawler.ensure_indexed(storage)
+
+    async with AsyncSession() as session:
+        total = await count_storage_files(session, storage.id, query, prefix)
+        entries = await search_storage_files(
+            session,
+            storage.id,
+            query,
+            prefix,
+            offset=(page - 1) * page_size,
+            limit=page_size,
+        )
+    files = [storage_file_from_entry(storage, entry) for entry in entries]
+    files = await get_files_data_from_catalog_by_names_list(files)
+    for file in files:
+        file.full_path = file.full_path.replace(storage.path + '/', '', 1)
+    return files, total
@@ -0,0 +1,324 @@
+"""
+Наблюдение за файловой системой хранилищ.
+
+На Linux используется inotify, иначе (или если исчерпан лимит наблюдений inotify) -
+периодический опрос mtime папок. Изменения собираются в пакеты и передаются подписчикам:
+индексу дерева папок, статистике папок, кэшу коллажей и кэшу уменьшенных копий.
+"""
+import asyncio
+import errno
+import logging
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from common.settings import CACHE_COLLAGE_FILE, settings
+from db.models import Storage
+from services import inotify
+from services.async_io import run_fs
+from services.CacheManager import CacheManager
+from services.folder_stats import FolderStatsIndex
+from services.storages import get_list_storages_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileSystemChanges:
+    folders: set[str] = field(default_factory=set)  # Папки, содержимое которых изменилось
+    files: set[str] = field(default_factory=set)  # Изменённые, созданные или удалённые файлы
+
+    def __bool__(self) -> bool:
+        return bool(self.folders or self.files)
+
+
+ChangesHandler = Callable[[FileSystemChanges], Awaitable[None]]
+
+
+class FolderTreeIndex:
+    """
+    Дерево папок наблюдаемых хранилищ в памяти.
+    Каждое изменение папки увеличивает поколение (generation) её и всех её родителей,
+    поэтому кэш, запомнивший поколение, проверяется без обращения к файловой системе.
+    """
+
+    def __init__(self):
+        self._roots: set[str] = set()
+        self._generations: dict[str, int] = defaultdict(int)
+
+    def add_root(self, root: str) -> None:
+        self._roots.add(os.path.normpath(root))
+
+    def remove_root(self, root: str) -> None:
+        self._roots.discard(os.path.normpath(root))
+
+    def root_of(self, path: str) -> str | None:
+        path = os.path.normpath(path)
+        roots = [root for root in self._roots if path == root or path.startswith(root + os.sep)]
+        return max(roots, key=len, default=None)
+
+    def is_watched(self, path: str) -> bool:
+        return self.root_of(path) is not None
+
+    def generation(self, path: str) -> int:
+        return self._generations.get(os.path.normpath(path), 0)
+
+    def touch(self, path: str) -> None:
+        path = os.path.normpath(path)
+        root = self.root_of(path)
+        while True:
+            self._generations[path] += 1
+            parent = os.path.dirname(path)
+            if root is None or path == root or parent == path:
+                break
+            path = parent
+
+    async def apply(self, changes: FileSystemChanges) -> None:
+        for folder in changes.folders:
+            self.touch(folder)
+        for file in changes.files:
+            self.touch(os.path.dirname(file))
+
+
+tree_index = FolderTreeIndex()
+
+
+def _snapshot(root: str) -> dict[str, float]:
+    """mtime всех папок поддерева root (для опроса без inotify)"""
+    result = {}
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            result[path] = os.stat(path).st_mtime
+            with os.scandir(path) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return result
+
+
+def _folders_to_watch(root: str) -> list[str]:
+    return [dir_path for dir_path, _, _ in os.walk(root)]
+
+
+def _remove_cached(paths: list[str]) -> None:
+    for path in paths:
+        CacheManager(path, create_dir=False).remove_cached_files()
+
+
+def _remove_cached_folders(folders: list[str]) -> None:
+    """Удаляет весь кэш удалённых (перемещённых) папок"""
+    for folder in folders:
+        if os.path.exists(folder):
+            continue
+        shutil.rmtree(os.path.join(settings.CACHE_DIR, folder.lstrip(os.sep)), ignore_errors=True)
+
+
+async def invalidate_collage_cache(changes: FileSystemChanges) -> None:
+    collages = [os.path.join(folder, CACHE_COLLAGE_FILE) for folder in changes.folders]
+    await run_fs(_remove_cached, collages)
+
+
+async def invalidate_rendition_cache(changes: FileSystemChanges) -> None:
+    await run_fs(_remove_cached, list(changes.files))
+    await run_fs(_remove_cached_folders, list(changes.folders))
+
+
+class StorageWatcher:
+    """
+    Следит за папками всех зарегистрированных хранилищ.
+    start() / stop() вызываются из lifespan приложения.
+    """
+
+    def __init__(self, folder_tree: FolderTreeIndex = tree_index):
+        self.tree_index = folder_tree
+        self._handlers: list[ChangesHandler] = [
+            folder_tree.apply,
+            self.invalidate_statistic,
+            invalidate_collage_cache,
+            invalidate_rendition_cache,
+        ]
+        self._storages: dict[str, set[uuid.UUID]] = {}  # Корень хранилища -> id хранилищ
+        self._pending = FileSystemChanges()
+        self._inotify: inotify.Inotify | None = None
+        self._watches: dict[int, str] = {}
+        self._polled: dict[str, dict[str, float]] = {}
+        self._refresh_storages = True
+        self._tasks: list[asyncio.Task] = []
+
+    def subscribe(self, handler: ChangesHandler) -> None:
+        self._handlers.append(handler)
+
+    @property
+    def roots(self) -> set[str]:
+        return set(self._storages)
+
+    def is_polling(self, root: str) -> bool:
+        return os.path.normpath(root) in self._polled
+
+    async def start(self, storages: list[Storage] | None = None) -> None:
+        """storages - список хранилищ; по умолчанию все хранилища из БД"""
+        if inotify.is_available() and not settings.WATCHER_FORCE_POLLING:
+            try:
+                self._inotify = inotify.Inotify()
+                asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._read_inotify)
+            except OSError as e:
+                logger.warning(f'Watcher: inotify is not available ({e}), polling instead')
+                self._inotify = None
+        self._refresh_storages = storages is None
+        try:
+            await self.sync_storages(storages)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f'Watcher: can not load storages: {e}')
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._poll_loop()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+        self._polled.clear()
+        for root in self._storages:
+            self.tree_index.remove_root(root)
+        self._storages = {}
+
+    async def sync_storages(self, storages: list[Storage] | None = None) -> None:
+        """Начинает наблюдение за новыми хранилищами и прекращает - за удалёнными"""
+        if storages is None:
+            storages = await get_list_storages_service()
+        roots = defaultdict(set)
+        for storage in storages:
+            root = os.path.normpath(storage.path)
+            if os.path.isdir(root):
+                roots[root].add(storage.id)
+        for root in set(self._storages) - set(roots):
+            self._unwatch_root(root)
+        for root in set(roots) - set(self._storages):
+            await self._watch_root(root)
+        self._storages = dict(roots)
+
+    async def _watch_root(self, root: str) -> None:
+        self.tree_index.add_root(root)
+        if self._inotify is not None:
+            try:
+                await self._add_watches(root)
+                return
+            except OSError as e:
+                logger.warning(f'Watcher: inotify for {root} failed ({e}), polling instead')
+                self._remove_watches(root)
+        self._polled[root] = await run_fs(_snapshot, root)
+
+    def _unwatch_root(self, root: str) -> None:
+        self._remove_watches(root)
+        self._polled.pop(root, None)
+        self.tree_index.remove_root(root)
+
+    async def _add_watches(self, folder: str) -> None:
+        for path in await run_fs(_folders_to_watch, folder):
+            self._watches[self._inotify.add_watch(path)] = path
+
+    def _remove_watches(self, root: str) -> None:
+        for wd, path in list(self._watches.items()):
+            if path == root or path.startswith(root + os.sep):
+                self._inotify.rm_watch(wd)
+                del self._watches[wd]
+
+    async def _watch_new_folder(self, folder: str) -> None:
+        try:
+            await self._add_watches(folder)
+        except OSError as e:
+            root = self.tree_index.root_of(folder)
+            if e.errno != errno.ENOSPC or root not in self._storages:
+                logger.warning(f'Watcher: can not watch {folder}: {e}')
+                return
+            # Исчерпан лимит наблюдений - как и для корня, переходим на опрос всего хранилища
+            logger.warning(f'Watcher: inotify for {folder} failed ({e}), polling {root} instead')
+            self._remove_watches(root)
+            snapshot = await run_fs(_snapshot, root)
+            self._polled[root] = snapshot
+            # Изменения в новой папке до первого снимка уже не будут замечены опросом
+            self._pending.folders.update(
+                path for path in snapshot if path == folder or path.startswith(folder + os.sep)
+            )
+
+    def _read_inotify(self) -> None:
+        for event in self._inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                # События потеряны - считаем изменёнными хранилища целиком
+                self._pending.folders.update(self._storages)
+                continue
+            folder = self._watches.get(event.wd)
+            if folder is None:
+                continue
+            if event.mask & inotify.IN_IGNORED:
+                self._watches.pop(event.wd, None)
+                continue
+            self._pending.folders.add(folder)
+            if not event.name:
+                continue
+            path = os.path.join(folder, event.name)
+            if not event.mask & inotify.IN_ISDIR:
+                self._pending.files.add(path)
+                continue
+            self._pending.folders.add(path)
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                asyncio.get_running_loop().create_task(self._watch_new_folder(path))
+
+    async def poll(self, root: str) -> None:
+        """Сравнивает mtime папок с предыдущим опросом"""
+        snapshot = await run_fs(_snapshot, root)
+        previous = self._polled.get(root, {})
+        for path, mtime in snapshot.items():
+            if previous.get(path) != mtime:
+                self._pending.folders.add(path)
+        self._pending.folders.update(previous.keys() - snapshot.keys())
+        self._polled[root] = snapshot
+
+    async def flush(self) -> None:
+        """Передаёт накопленные изменения подписчикам"""
+        if not self._pending:
+            return
+        changes, self._pending = self._pending, FileSystemChanges()
+        for handler in self._handlers:
+            try:
+                await handler(changes)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error(f'Watcher: change handler {handler} failed: {e}')
+
+    async def invalidate_statistic(self, changes: FileSystemChanges) -> None:
+        folders_by_root = defaultdict(set)
+        for folder in changes.folders:
+            root = self.tree_index.root_of(folder)
+            if root is not None:
+                folders_by_root[root].add(folder)
+        for root, folders in folders_by_root.items():
+            for storage_id in self._storages.get(root, ()):
+                await FolderStatsIndex(storage_id=storage_id, root=root).invalidate(folders)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.WATCHER_DEBOUNCE)
+            await self.flush()
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.WATCHER_POLL_INTERVAL)
+            if self._refresh_storages:
+                try:
+                    await self.sync_storages()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logger.error(f'Watcher: can not refresh storages: {e}')
+            for root in list(self._polled):
+                await self.poll(root)
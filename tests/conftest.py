@@ -69,6 +69,20 @@ def created_temp_storage_folder():
         temp_folder.destroy()
 
 
+@pytest.fixture
+async def temp_storage(created_temp_storage_folder, faker):  # pylint: disable=redefined-outer-name
+    storage = Storage(
+        user_id=uuid.uuid4(),
+        name=faker.word(),
+        path=created_temp_storage_folder.root_dir,
+        created_by=uuid.uuid4(),
+    )
+    async with AsyncSession() as session:
+        await create_storage(session=session, new_storage=storage)
+        await session.commit()
+    return storage
+
+
 @pytest.fixture
 def created_temp_file():
     with tempfile.NamedTemporaryFile(suffix='.jpg') as temp_file:
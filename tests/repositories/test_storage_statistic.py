@@ -0,0 +1,53 @@
+import pytest
+
+from db.connector import AsyncSession
+from repositories.storage_statistic import (
+    get_storage_statistic,
+    get_storage_statistic_by_paths,
+    get_storage_statistic_mtimes,
+    invalidate_storage_statistic,
+    save_storage_statistic,
+)
+
+
+def _row(size: int, mtime: float | None = 1.0) -> dict:
+    return {
+        'size': size,
+        'folders_count': 1,
+        'files_count': 2,
+        'direct_folders_count': 1,
+        'direct_files_count': 1,
+        'mtime': mtime,
+    }
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_save_and_get_storage_statistic(created_storage):
+    async with AsyncSession() as session:
+        await save_storage_statistic(
+            session, created_storage.id, {'': _row(10), 'a': _row(5), 'a/b': _row(1), 'ab': _row(2)}
+        )
+        await session.commit()
+    async with AsyncSession() as session:
+        await save_storage_statistic(session, created_storage.id, {'a': _row(7)})
+        await session.commit()
+    async with AsyncSession() as session:
+        rows = await get_storage_statistic(session, created_storage.id, 'a')
+    assert {row.path: row.size for row in rows} == {'a': 7, 'a/b': 1}
+
+    async with AsyncSession() as session:
+        mtimes = await get_storage_statistic_mtimes(session, created_storage.id, 'a')
+        rows = await get_storage_statistic_by_paths(session, created_storage.id, ['', 'a/b'])
+    assert mtimes == {'a': 1.0, 'a/b': 1.0}
+    assert {row.path: row.size for row in rows} == {'': 10, 'a/b': 1}
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_invalidate_storage_statistic(created_storage):
+    async with AsyncSession() as session:
+        await save_storage_statistic(session, created_storage.id, {'': _row(10), 'a': _row(5)})
+        await invalidate_storage_statistic(session, created_storage.id, [''])
+        await session.commit()
+    async with AsyncSession() as session:
+        rows = await get_storage_statistic(session, created_storage.id)
+    assert {row.path: row.mtime for row in rows} == {'': None, 'a': 1.0}
@@ -0,0 +1,78 @@
+"""
+Замер скорости подсчёта статистики папки в зависимости от количества процессов (потоков)
+пула обхода поддеревьев (SCAN_WORKERS, SCAN_EXECUTOR).
+
+Дерево создаётся tests/random_temp_folder.py с фиксированной шириной и глубиной:
+    python -m tests.services.bench_folder_stats --folders 8 --depth 4 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+from unittest import mock
+
+from common.settings import settings
+from services.async_io import shutdown_executors
+from services.folder_stats import FolderStatsScanner, get_folder_stats
+from tests import random_temp_folder
+from tests.random_temp_folder import RandomTempFolder
+
+
+def build_tree(folders: int, depth: int) -> RandomTempFolder:
+    with mock.patch.multiple(
+        random_temp_folder,
+        MIN_FOLDERS=folders,
+        MAX_FOLDERS=folders,
+        MIN_DEPTH=depth,
+        MAX_DEPTH=depth,
+    ):
+        return RandomTempFolder()
+
+
+async def _parallel_stats(path: str, repeat: int) -> float:
+    scanner = FolderStatsScanner()
+    await scanner.get_folder_stats(path)  # Запуск процессов пула не входит в замер
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await scanner.get_folder_stats(path)
+    return (time.perf_counter() - started) / repeat
+
+
+def measure(path: str, executor: str, workers: int, repeat: int) -> float:
+    with mock.patch.object(settings, 'SCAN_WORKERS', workers), mock.patch.object(
+        settings, 'SCAN_EXECUTOR', executor
+    ):
+        try:
+            return asyncio.run(_parallel_stats(path, repeat))
+        finally:
+            shutdown_executors()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--folders', type=int, default=8, help='Вложенных папок в каждой папке')
+    parser.add_argument('--depth', type=int, default=4, help='Глубина дерева')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tree = build_tree(args.folders, args.depth)
+    try:
+        sys.stdout.write(f'Tree: {tree.folders_count} folders, {tree.files_count} files\n')
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            get_folder_stats(tree.root_dir)
+        serial = (time.perf_counter() - started) / args.repeat
+        sys.stdout.write(f'{"serial":>8} {"":>8} {serial:8.3f}s\n')
+        for executor in ('process', 'thread'):
+            for workers in args.workers:
+                elapsed = measure(tree.root_dir, executor, workers, args.repeat)
+                sys.stdout.write(
+                    f'{executor:>8} {workers:>8} {elapsed:8.3f}s  x{serial / elapsed:.2f}\n'
+                )
+    finally:
+        tree.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Замер времени и пикового потребления памяти (RSS) при уменьшении большой фотографии:
+прежний путь (полное декодирование, поворот, затем уменьшение) против
+ResponseFile._render_resized_image (draft / reduce, поворот после уменьшения).
+Каждый вариант выполняется в отдельном процессе, чтобы пик RSS не зависел от предыдущего.
+Для лестницы копий (RENDITION_WIDTHS) замеряются первый запрос (одно декодирование оригинала
+на все ступени) и последующие запросы других ступеней (из ближайшей копии в кэше).
+    python -m tests.services.bench_image_resize --size 6000 4000 --width 200 400
+Под pytest стенд проверяется на малом снимке без замеров.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+from PIL import ExifTags, Image
+
+from common.settings import settings
+from services.CacheManager import CacheManager
+from services.storage_file import ImagePreset, ResponseFile
+
+
+def legacy_render(path: str, width: int) -> bytes:
+    """Прежняя реализация _render_resized_image (без записи в кэш)"""
+    with Image.open(path) as img:
+        orientation = img.getexif().get(ExifTags.Base.Orientation)
+        if orientation == 3:
+            img = img.rotate(180, expand=True)
+        elif orientation == 6:
+            img = img.rotate(270, expand=True)
+        elif orientation == 8:
+            img = img.rotate(90, expand=True)
+        if img.width > width:
+            img = img.resize((width, int(img.height * width / img.width)), Image.HAMMING)
+        byte_io = BytesIO()
+        img.save(byte_io, format='jpeg')
+    return byte_io.getvalue()
+
+
+def fast_render(path: str, width: int, preset: ImagePreset) -> bytes:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with mock.patch.multiple(settings, CACHE_DIR=cache_dir, RENDITION_WIDTHS=[]):
+            response_file = ResponseFile(
+                path, cache_manager=CacheManager(path), width=width, preset=preset
+            )
+            return response_file._render_resized_image()
+
+
+def ladder_render(path: str, cache_dir: str, width: int, drop_cached: bool = False) -> bytes:
+    """drop_cached - ступень удаляется из кэша и получается из ближайшей большей копии"""
+    with mock.patch.object(settings, 'CACHE_DIR', cache_dir):
+        response_file = ResponseFile(path, cache_manager=CacheManager(path), width=width)
+        if drop_cached:
+            os.remove(response_file.cache_manager.get_cached_file(response_file.width))
+        return response_file._render_resized_image()
+
+
+def _run(func, *args) -> tuple[float, float]:
+    """(секунды, прирост пикового RSS в МиБ) в дочернем процессе"""
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (peak_rss - start_rss) / 1024
+
+
+def measure(func, *args) -> tuple[float, float]:
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_run, func, *args).result()
+
+
+def create_photo(path: str, size: tuple[int, int]) -> None:
+    img = Image.effect_noise(size, 64).convert('RGB')
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6
+    img.save(path, quality=90, exif=exif)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, nargs=2, default=[6000, 4000])
+    parser.add_argument('--width', type=int, nargs='+', default=[200, 400])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'photo.jpg')
+        create_photo(path, tuple(args.size))
+        sys.stdout.write(
+            f'{args.size[0]}x{args.size[1]} JPEG, {os.path.getsize(path) / 2**20:.1f} MiB\n'
+        )
+        for width in args.width:
+            variants = [
+                ('legacy', legacy_render, path, width),
+                ('thumbnail', fast_render, path, width, ImagePreset.thumbnail()),
+                ('preview', fast_render, path, width, ImagePreset.preview()),
+            ]
+            for title, func, *func_args in variants:
+                elapsed, rss = measure(func, *func_args)
+                sys.stdout.write(
+                    f'width {width:>5} {title:>10}: {elapsed * 1000:8.1f} ms, +{rss:7.1f} MiB RSS\n'
+                )
+
+        sys.stdout.write(f'Rendition ladder {settings.RENDITION_WIDTHS}\n')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            variants = [('cold', args.width[0], False)] + [
+                ('derived', width, True) for width in settings.RENDITION_WIDTHS[:-1]
+            ]
+            for title, width, drop_cached in variants:
+                elapsed, rss = measure(ladder_render, path, cache_dir, width, drop_cached)
+                sys.stdout.write(
+                    f'width {width:>5} {title:>10}: {elapsed * 1000:8.1f} ms, +{rss:7.1f} MiB RSS\n'
+                )
+
+
+def test_bench_variants_render_same_size(tmp_path):
+    """Проверка стенда под pytest: все варианты дают копию одного размера (на малом снимке)"""
+    path = str(tmp_path / 'photo.jpg')
+    create_photo(path, (600, 400))
+    renders = [
+        legacy_render(path, 200),
+        fast_render(path, 200, ImagePreset.thumbnail()),
+        fast_render(path, 200, ImagePreset.preview()),
+        ladder_render(path, str(tmp_path), 200),
+    ]
+    sizes = set()
+    for data in renders:
+        with Image.open(BytesIO(data)) as img:
+            sizes.add(img.size)
+    assert sizes == {(200, 300)}
+
+
+if __name__ == '__main__':
+    main()
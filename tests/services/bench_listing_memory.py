@@ -0,0 +1,88 @@
+"""
+Замер памяти на один элемент содержимого папки в кэше:
+списки pydantic моделей (Folder, StorageFile) против компактных массивов services/folder_listing.py
+    python -m tests.services.bench_listing_memory --files 100000 --folders 10000
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+from schemas.storage import Count, FileGroup, Folder, StorageFile
+from services.folder_listing import FileEntries, FolderEntries
+from services.folder_stats import FolderStats
+
+
+def _stat(i: int) -> os.stat_result:
+    # mode, ino, dev, nlink, uid, gid, size, atime, mtime, ctime
+    return os.stat_result((0o100644, i, 0, 1, 0, 0, i * 1024, 1.7e9 + i, 1.7e9 + i, 1.7e9 + i))
+
+
+def _file_name(i: int) -> str:
+    return f'IMG_{i:08d}.{("jpg", "png", "mp4", "txt")[i % 4]}'
+
+
+def pydantic_listing(folders: int, files: int) -> tuple[list, list]:
+    nested_folders = [
+        Folder(
+            name=f'folder_{i:08d}',
+            time=datetime.fromtimestamp(1.7e9 + i),
+            size=i,
+            folders_count=Count(direct=i, total=i),
+            files_count=Count(direct=i, total=i),
+        )
+        for i in range(folders)
+    ]
+    nested_files = []
+    for i in range(files):
+        name, file_stat = _file_name(i), _stat(i)
+        type_ = os.path.splitext(name)[1][1:]
+        nested_files.append(
+            StorageFile(
+                name=name,
+                type=type_,
+                full_path=os.path.join('/storage/folder', name),
+                size=file_stat.st_size,
+                created=datetime.fromtimestamp(file_stat.st_ctime),
+                updated=datetime.fromtimestamp(file_stat.st_mtime),
+                group=FileGroup.get_group(type_),
+            )
+        )
+    return nested_folders, nested_files
+
+
+def compact_listing(folders: int, files: int) -> tuple[FolderEntries, FileEntries]:
+    folder_entries, file_entries = FolderEntries(), FileEntries()
+    for i in range(folders):
+        stats = FolderStats(i, i, i, i, i, 1.7e9 + i)
+        folder_entries.append(f'folder_{i:08d}', stats)
+    for i in range(files):
+        file_entries.append(_file_name(i), _stat(i))
+    return folder_entries, file_entries
+
+
+def measure(build, folders: int, files: int) -> int:
+    tracemalloc.start()
+    listing = build(folders, files)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del listing
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--folders', type=int, default=10_000)
+    parser.add_argument('--files', type=int, default=100_000)
+    args = parser.parse_args()
+    entries = args.folders + args.files
+    for title, build in (('pydantic', pydantic_listing), ('compact', compact_listing)):
+        size = measure(build, args.folders, args.files)
+        sys.stdout.write(
+            f'{title:>8}: {size / 2**20:8.1f} MiB, {size / entries:6.0f} bytes per entry\n'
+        )
+
+
+if __name__ == '__main__':
+    main()
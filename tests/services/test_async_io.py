@@ -0,0 +1,50 @@
+import asyncio
+import os
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from common.exceptions import ServiceUnavailable
+from common.settings import settings
+from services.async_io import read_bytes, run_fs, run_render, shutdown_executors
+
+
+async def test_run_fs_uses_filesystem_pool():
+    name = await run_fs(lambda: threading.current_thread().name)
+    assert name.startswith('s_media_filesystem')
+
+
+async def test_read_bytes(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(b'content')
+    assert await read_bytes(str(path)) == b'content'
+
+
+@pytest.fixture
+def render_pool():
+    with mock.patch.object(settings, 'RENDER_PROCESSES', 1), mock.patch.object(
+        settings, 'RENDER_QUEUE_SIZE', 1
+    ):
+        yield
+    shutdown_executors()
+
+
+@pytest.mark.usefixtures('render_pool')
+async def test_run_render_uses_process_pool():
+    assert await run_render(os.getpid) != os.getpid()
+
+
+@pytest.mark.usefixtures('render_pool')
+async def test_run_render_queue_full():
+    running = asyncio.ensure_future(run_render(time.sleep, 0.5))
+    await asyncio.sleep(0)
+    with pytest.raises(ServiceUnavailable) as error:
+        await run_render(os.getpid)
+    response = await error.value.get_response_data()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(settings.RENDER_RETRY_AFTER)
+    await running
+    # Задача завершена - место в очереди освободилось
+    assert await run_render(os.getpid) != os.getpid()
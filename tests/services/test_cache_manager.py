@@ -41,4 +41,15 @@ def test_save_to_cache(temp_cache_dir):
 
     # Проверяем, что кэшированный файл действительно является изображением
     with Image.open(cached_file_path) as cached_img:
-        assert cached_img.size == (width, width)
\ No newline at end of file
+        assert cached_img.size == (width, width)
+
+
+def test_save_bytes_to_cache_replaces_file(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    cache_manager = CacheManager(FILE_PATH)
+    cache_manager.save_bytes_to_cache(b'old', WIDTH)
+    cache_manager.save_bytes_to_cache(b'new', WIDTH)
+    with open(cache_manager.get_cached_file(width=WIDTH), 'rb') as f:
+        assert f.read() == b'new'
+    cached_name = os.path.basename(cache_manager.get_cached_file(width=WIDTH))
+    assert os.listdir(cache_manager.cache_dir) == [cached_name]
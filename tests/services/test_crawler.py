@@ -0,0 +1,132 @@
+import os
+import shutil
+from unittest import mock
+
+import pytest
+
+from db.connector import AsyncSession
+from db.models import Storage
+from repositories.storage_entry import get_storage_entries_state
+from services.crawler import StorageCrawler
+from services.folder_stats import FolderStatsIndex, get_folder_stats
+from services.storage_manager import FolderManager, IndexedFolderManager, OrderFolder
+
+
+async def _index_paths(storage: Storage) -> set[str]:
+    async with AsyncSession() as session:
+        return {row.path for row in await get_storage_entries_state(session, storage.id)}
+
+
+def _disk_paths(root_dir: str) -> set[str]:
+    paths = {''}
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        relative = os.path.relpath(dir_path, root_dir)
+        for name in dir_names + file_names:
+            paths.add(os.path.normpath(os.path.join(relative, name)))
+    return paths
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_crawler_builds_index(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    crawler = StorageCrawler()
+    result = await crawler.crawl(temp_storage)
+    assert result.scanned == created_temp_storage_folder.folders_count + 1
+    assert await _index_paths(temp_storage) == _disk_paths(root_dir)
+
+    # Статистика папок сохранена обходом
+    expected = get_folder_stats(root_dir)
+    index = FolderStatsIndex(temp_storage.id, root_dir)
+    with mock.patch('services.folder_stats.os.scandir', side_effect=AssertionError):
+        assert await index.get_folder_stats(root_dir) == expected
+
+    # Ничего не менялось - папки с диска не читаются
+    with mock.patch('services.crawler.os.scandir', side_effect=AssertionError):
+        result = await crawler.crawl(temp_storage)
+    assert (result.scanned, result.entries, result.deleted) == (0, {}, [])
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_crawler_incremental(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    crawler = StorageCrawler()
+    await crawler.crawl(temp_storage)
+
+    deepest = max((path for path, _, _ in os.walk(root_dir)), key=lambda path: path.count('/'))
+    with open(os.path.join(deepest, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+    removed = os.path.join(root_dir, next(os.walk(root_dir))[1][0])
+    shutil.rmtree(removed)
+
+    result = await crawler.crawl(temp_storage)
+    # С диска читаются только корень (удалена папка) и папка с новым файлом
+    assert result.scanned <= 2
+    assert await _index_paths(temp_storage) == _disk_paths(root_dir)
+
+
+@pytest.mark.usefixtures('apply_migrations')
+@pytest.mark.parametrize('order_by', [OrderFolder.NAME, OrderFolder.TIME, OrderFolder.SIZE])
+async def test_indexed_folder_content(temp_storage, created_temp_storage_folder, order_by):
+    root_dir = created_temp_storage_folder.root_dir
+    await StorageCrawler().crawl(temp_storage)
+
+    expected = await FolderManager(root_dir, page_size=1000).get_folder_content(order_by)
+    names, cursor = [], None
+    while True:
+        folder = IndexedFolderManager(temp_storage, root_dir, page_size=3, cursor=cursor)
+        with mock.patch('services.storage_manager.os.scandir', side_effect=AssertionError):
+            content = await folder.get_folder_content(order_by)
+        names += [nested.name for nested in content.folders] + [f.name for f in content.files]
+        cursor = folder.next_cursor
+        if cursor is None:
+            break
+    assert names == [nested.name for nested in expected.folders + expected.files]
+    assert (content.size, content.files_count, content.folders_count) == (
+        expected.size,
+        expected.files_count,
+        expected.folders_count,
+    )
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_indexed_folder_content_changed_folder(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    await StorageCrawler().crawl(temp_storage)
+    with open(os.path.join(root_dir, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+
+    # mtime папки изменился после обхода - содержимое читается с диска
+    content = await IndexedFolderManager(
+        temp_storage, root_dir, page_size=1000
+    ).get_folder_content()
+    assert 'new_file.bin' in [file.name for file in content.files]
+
+
+@pytest.mark.usefixtures('apply_migrations')
+@pytest.mark.parametrize('order_by', list(OrderFolder))
+async def test_indexed_folder_content_cursor_fallback(
+    temp_storage, created_temp_storage_folder, order_by
+):
+    root_dir = created_temp_storage_folder.root_dir
+    crawler = StorageCrawler()
+    await crawler.crawl(temp_storage)
+
+    expected = await FolderManager(root_dir, page_size=1000).get_folder_content(order_by)
+    names, cursor, page = [], None, 0
+    while True:
+        folder = IndexedFolderManager(temp_storage, root_dir, page_size=2, cursor=cursor)
+        content = await folder.get_folder_content(order_by)
+        names += [nested.name for nested in content.folders] + [f.name for f in content.files]
+        cursor = folder.next_cursor
+        if cursor is None:
+            break
+        page += 1
+        if page == 1:
+            # Папка изменилась - следующая страница читается с диска по курсору из индекса
+            temp_file = os.path.join(root_dir, 'temp_file.bin')
+            open(temp_file, 'wb').close()  # pylint: disable=consider-using-with
+            os.remove(temp_file)
+        elif page == 2:
+            # После обхода - снова из индекса по курсору, полученному с диска
+            await crawler.crawl(temp_storage)
+    assert names == [nested.name for nested in expected.folders + expected.files]
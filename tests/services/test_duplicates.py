@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from services.duplicates import HEAD_TAIL_SIZE, get_duplicates_service, scan_duplicates
+
+
+def _write(root_dir: str, path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(os.path.join(root_dir, path)), exist_ok=True)
+    with open(os.path.join(root_dir, path), 'wb') as file_out:
+        file_out.write(content)
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_duplicates(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    large = os.urandom(HEAD_TAIL_SIZE * 3)
+    # Отличается только серединой - отсеивается только хэшем всего файла
+    large_other = large[:HEAD_TAIL_SIZE] + os.urandom(HEAD_TAIL_SIZE) + large[-HEAD_TAIL_SIZE:]
+    small = os.urandom(100)
+    _write(root_dir, 'import_1/large.jpg', large)
+    _write(root_dir, 'import_2/large_copy.jpg', large)
+    _write(root_dir, 'import_2/deep/large_copy.jpg', large)
+    _write(root_dir, 'import_3/large_other.jpg', large_other)
+    _write(root_dir, 'import_1/small.txt', small)
+    _write(root_dir, 'import_3/small.txt', small)
+
+    await scan_duplicates([temp_storage])
+    groups = {group.size: group for group in await get_duplicates_service(temp_storage.id)}
+
+    assert sorted(file.path for file in groups[len(large)].files) == [
+        'import_1/large.jpg',
+        'import_2/deep/large_copy.jpg',
+        'import_2/large_copy.jpg',
+    ]
+    assert groups[len(large)].wasted == len(large) * 2
+    assert sorted(file.path for file in groups[len(small)].files) == [
+        'import_1/small.txt',
+        'import_3/small.txt',
+    ]
+
+    # Изменения после предыдущего поиска учитываются без фонового обхода
+    os.remove(os.path.join(root_dir, 'import_3/small.txt'))
+    _write(root_dir, 'import_4/large_copy.jpg', large)
+    await scan_duplicates([temp_storage])
+    groups = {group.size: group for group in await get_duplicates_service(temp_storage.id)}
+    assert len(groups[len(large)].files) == 4
+    assert len(small) not in groups
@@ -0,0 +1,51 @@
+import os
+
+from services.folder_listing import FileEntries, FolderEntries, entries_from_scan
+from services.folder_stats import FolderStats, scan_folder
+
+
+def test_entries_from_scan(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    scan = scan_folder(root_dir)
+    folders, files = entries_from_scan(scan)
+    assert sorted(folders.names) == sorted(scan.folders)
+    for i, name in enumerate(folders.names):
+        assert folders.stats(i) == scan.folders[name]
+    for i, name in enumerate(files.names):
+        storage_file = files.storage_file(i, root_dir)
+        assert storage_file.full_path == os.path.join(root_dir, name)
+        assert storage_file.size == scan.files[name].st_size
+        assert storage_file.type == os.path.splitext(name)[1][1:]
+
+
+def test_sorted_entries():
+    folders = FolderEntries()
+    folders.append('b', FolderStats(size=1, total_files=5))
+    folders.append('a', FolderStats(size=3, total_files=5, mtime=10.0))
+    folders.append('c', FolderStats(size=2, total_files=1))
+
+    by_size = folders.sorted('size')
+    assert by_size.names == ['b', 'c', 'a']
+    assert list(by_size.sizes) == [1, 2, 3]
+    assert by_size.stats(2) == folders.stats(1)
+    assert folders.sorted('files_count').names == ['c', 'a', 'b']
+    # Папки без mtime - в начале, как None в ключе сортировки
+    assert folders.sorted('time').names == ['b', 'c', 'a']
+    assert by_size.stats(0).mtime is None
+
+    keys = by_size.sort_keys('size')
+    assert len(keys) == 3
+    assert keys[1] == (2, 'c')
+
+
+def test_file_entries_intern_extensions():
+    files = FileEntries()
+    file_stat = os.stat(__file__)
+    for name in ['b.jpg', 'a.jpg', 'c.mp4', 'd']:
+        files.append(name, file_stat)
+    assert files.extensions == ['jpg', 'mp4', '']
+    by_name = files.sorted('name')
+    assert by_name.names == ['a.jpg', 'b.jpg', 'c.mp4', 'd']
+    assert by_name.extensions is files.extensions
+    assert by_name.storage_file(2, '/tmp').group.value == 'video'
+    assert by_name.storage_file(3, '/tmp').group is None
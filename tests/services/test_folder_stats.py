@@ -0,0 +1,153 @@
+import os
+from unittest import mock
+
+import pytest
+
+from common.settings import settings
+from db.connector import AsyncSession
+from repositories.storage_statistic import get_storage_statistic
+from services import async_io
+from services.folder_stats import (
+    FolderStatsIndex,
+    FolderStatsScanner,
+    _estimate,
+    _shallow,
+    get_folder_stats,
+    scan_folder,
+)
+
+
+def test_get_folder_stats(created_temp_storage_folder):
+    stats = get_folder_stats(created_temp_storage_folder.root_dir)
+    assert stats.total_folders == created_temp_storage_folder.folders_count
+    assert stats.total_files == created_temp_storage_folder.files_count
+    assert stats.size == created_temp_storage_folder.size
+
+
+def test_scan_folder_children(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    scan = scan_folder(root_dir)
+    _, dir_names, file_names = next(os.walk(root_dir))
+    assert set(scan.folders) == set(dir_names)
+    assert set(scan.files) == set(file_names)
+    assert scan.stats.direct_folders == len(dir_names)
+    assert scan.stats.direct_files == len(file_names)
+    for name, child in scan.folders.items():
+        assert child == get_folder_stats(os.path.join(root_dir, name))
+    assert scan.stats.size == sum(child.size for child in scan.folders.values()) + sum(
+        file_stat.st_size for file_stat in scan.files.values()
+    )
+
+
+@pytest.fixture(params=['thread', 'process'])
+def scan_workers(request):
+    with mock.patch.object(settings, 'SCAN_WORKERS', 2), mock.patch.object(
+        settings, 'SCAN_EXECUTOR', request.param
+    ):
+        yield
+    async_io.shutdown_executors()
+
+
+@pytest.mark.usefixtures('scan_workers')
+async def test_parallel_scan_matches_serial(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    scanner = FolderStatsScanner()
+    assert await scanner.get_folder_stats(root_dir) == get_folder_stats(root_dir)
+    scan = await scanner.scan_folder(root_dir)
+    serial = scan_folder(root_dir)
+    assert scan.stats == serial.stats
+    assert scan.folders == serial.folders
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_folder_stats_index_saves_and_reuses(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    stats = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert stats.total_files == created_temp_storage_folder.files_count
+
+    async with AsyncSession() as session:
+        rows = await get_storage_statistic(session, temp_storage.id)
+    assert len(rows) == sum(1 for _ in os.walk(root_dir))
+
+    # Ничего не менялось - повторного обхода нет
+    with mock.patch('services.folder_stats.os.scandir', side_effect=AssertionError):
+        cached = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert cached == stats
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_folder_stats_index_invalidates_parents(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    deepest = max((path for path, _, _ in os.walk(root_dir)), key=lambda path: path.count('/'))
+    with open(os.path.join(deepest, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+
+    await FolderStatsIndex(temp_storage.id, root_dir).scan_folder(deepest)
+    stats = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert stats.total_files == created_temp_storage_folder.files_count + 1
+    assert stats.size == created_temp_storage_folder.size + 5
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_folder_stats_index_sees_deep_changes(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+
+    # Без изменений загружается только запись самой папки
+    index = FolderStatsIndex(temp_storage.id, root_dir)
+    await index.get_folder_stats(root_dir)
+    assert list(index._entries) == ['']  # pylint: disable=protected-access
+
+    # Изменение глубоко в поддереве видно в итогах корня без обращения к изменившейся папке
+    deepest = max((path for path, _, _ in os.walk(root_dir)), key=lambda path: path.count('/'))
+    with open(os.path.join(deepest, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+    stats = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert stats.total_files == created_temp_storage_folder.files_count + 1
+    assert stats.size == created_temp_storage_folder.size + 5
+    saved = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(deepest)
+    assert saved == get_folder_stats(deepest)
+
+
+def test_estimate_and_shallow_stats(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    exact = get_folder_stats(root_dir)
+    _, dir_names, file_names = next(os.walk(root_dir))
+
+    shallow = _shallow(root_dir)
+    assert (shallow.direct_folders, shallow.direct_files) == (len(dir_names), len(file_names))
+    assert (shallow.total_folders, shallow.total_files, shallow.size) == (
+        len(dir_names),
+        len(file_names),
+        0,
+    )
+
+    # Выборка покрывает всё дерево - оценка совпадает с точной статистикой
+    with mock.patch.object(settings, 'STATS_ESTIMATE_SAMPLE', 10_000):
+        estimate = _estimate(root_dir, depth=100)
+    assert (estimate.size, estimate.total_folders, estimate.total_files) == (
+        exact.size,
+        exact.total_folders,
+        exact.total_files,
+    )
+    # Без обхода вложенных папок оценка не больше точной
+    assert _estimate(root_dir, depth=0).total_files <= exact.total_files
+
+
+@pytest.mark.usefixtures('apply_migrations', 'scan_workers')
+async def test_folder_stats_index_parallel(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    stats = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert stats == get_folder_stats(root_dir)
+    async with AsyncSession() as session:
+        rows = await get_storage_statistic(session, temp_storage.id)
+    assert len(rows) == sum(1 for _ in os.walk(root_dir))
+
+    deepest = max((path for path, _, _ in os.walk(root_dir)), key=lambda path: path.count('/'))
+    with open(os.path.join(deepest, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+    await FolderStatsIndex(temp_storage.id, root_dir).scan_folder(deepest)
+    stats = await FolderStatsIndex(temp_storage.id, root_dir).get_folder_stats(root_dir)
+    assert stats.total_files == created_temp_storage_folder.files_count + 1
+    assert stats.size == created_temp_storage_folder.size + 5
@@ -0,0 +1,47 @@
+import os
+from email.utils import formatdate
+
+import pytest
+
+from services.http_cache import ConditionalRequest, Validators
+
+
+@pytest.fixture
+def validators(tmp_path):
+    path = tmp_path / 'image.jpg'
+    path.write_bytes(b'image')
+    return Validators.for_file(os.stat(path), 200, 'webp')
+
+
+def test_validators_depend_on_rendition_params(tmp_path, validators):
+    file_stat = os.stat(tmp_path / 'image.jpg')
+    assert Validators.for_file(file_stat, 200, 'webp') == validators
+    assert Validators.for_file(file_stat, 400, 'webp').etag != validators.etag
+    assert Validators.for_file(file_stat, 200, 'jpeg').etag != validators.etag
+    assert validators.etag.startswith('W/"')
+
+
+@pytest.mark.parametrize('strong', [True, False])
+def test_if_none_match(validators, strong):
+    etag = validators.etag[2:] if strong else validators.etag
+    assert ConditionalRequest(if_none_match=f'"other", {etag}').not_modified(validators)
+    assert ConditionalRequest(if_none_match='*').not_modified(validators)
+    assert not ConditionalRequest(if_none_match='"other"').not_modified(validators)
+
+
+def test_if_none_match_takes_precedence(validators):
+    since = formatdate(validators.last_modified + 60, usegmt=True)
+    conditional = ConditionalRequest(if_none_match='"other"', if_modified_since=since)
+    assert not conditional.not_modified(validators)
+
+
+@pytest.mark.parametrize('delta, not_modified', [(0, True), (60, True), (-60, False)])
+def test_if_modified_since(validators, delta, not_modified):
+    since = formatdate(validators.last_modified + delta, usegmt=True)
+    conditional = ConditionalRequest(if_none_match=None, if_modified_since=since)
+    assert conditional.not_modified(validators) == not_modified
+
+
+def test_invalid_if_modified_since(validators):
+    conditional = ConditionalRequest(if_none_match=None, if_modified_since='yesterday')
+    assert not conditional.not_modified(validators)
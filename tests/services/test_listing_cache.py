@@ -0,0 +1,22 @@
+from services.listing_cache import ListingCache
+
+
+def test_listing_cache_lru_eviction():
+    cache = ListingCache(max_items=10, ttl=60)
+    cache.put('a', (1,), 'a', items=4)
+    cache.put('b', (1,), 'b', items=4)
+    assert cache.get('a', (1,)) == 'a'
+    cache.put('c', (1,), 'c', items=4)  # Вытесняется давно не использованная запись b
+    assert cache.get('b', (1,)) is None
+    assert cache.get('a', (1,)) == 'a'
+    assert cache.get('c', (1,)) == 'c'
+    assert cache.info()['items'] == 8
+
+
+def test_listing_cache_token_and_ttl():
+    cache = ListingCache(max_items=10, ttl=60)
+    cache.put('a', (1,), 'a', items=1)
+    assert cache.get('a', (2,)) is None
+    cache.ttl = 0
+    assert cache.get('a', (1,)) is None
+    assert (cache.hits, cache.misses) == (0, 2)
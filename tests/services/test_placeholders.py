@@ -0,0 +1,76 @@
+import base64
+import os
+from datetime import datetime
+
+from PIL import ExifTags, Image
+
+from common.settings import settings
+from schemas.storage import FileGroup, StorageFile
+from services.CacheManager import CacheManager
+from services.placeholders import add_placeholders, create_placeholder, read_placeholder
+from services.storage_file import ResponseFile
+
+
+def _save_image(path: str, size: tuple[int, int], orientation: int | None = None) -> None:
+    img = Image.effect_noise(size, 64).convert('RGB')
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[ExifTags.Base.Orientation] = orientation
+    img.save(path, exif=exif)
+
+
+def _storage_file(path: str) -> StorageFile:
+    return StorageFile(
+        name=os.path.basename(path),
+        type=os.path.splitext(path)[1][1:],
+        full_path=path,
+        size=0,
+        created=datetime.now(),
+        updated=datetime.now(),
+        group=FileGroup.get_group(os.path.splitext(path)[1][1:]),
+    )
+
+
+def test_create_placeholder(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    path = os.path.join(temp_cache_dir, 'photo.jpg')
+    _save_image(path, (1200, 800), orientation=6)
+
+    placeholder = create_placeholder(path)
+    # Размеры после поворота по EXIF
+    assert (placeholder.width, placeholder.height) == (800, 1200)
+    header, data = placeholder.placeholder.split(',', 1)
+    assert header == 'data:image/webp;base64'
+    assert len(placeholder.placeholder) < 400
+    assert read_placeholder(path) == placeholder
+    assert base64.b64decode(data)
+
+    # Оригинал изменился - заглушка устарела
+    _save_image(path, (600, 400))
+    assert read_placeholder(path) is None
+
+
+def test_placeholder_created_on_render(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    path = os.path.join(temp_cache_dir, 'photo.png')
+    _save_image(path, (1000, 500))
+    ResponseFile(path, cache_manager=CacheManager(path), width=200)._render_resized_image()
+    placeholder = read_placeholder(path)
+    assert (placeholder.width, placeholder.height) == (1000, 500)
+
+
+async def test_add_placeholders(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    paths = [os.path.join(temp_cache_dir, name) for name in ('a.jpg', 'b.jpg', 'notes.txt')]
+    for path in paths[:2]:
+        _save_image(path, (300, 200))
+    with open(paths[2], 'w') as file:
+        file.write('text')
+    create_placeholder(paths[0])
+
+    files = await add_placeholders([_storage_file(path) for path in paths])
+    assert (files[0].width, files[0].height) == (300, 200)
+    assert files[0].placeholder.startswith('data:image/')
+    # Заглушки ещё нет / не изображение
+    assert files[1].placeholder is None and files[1].width is None
+    assert files[2].placeholder is None
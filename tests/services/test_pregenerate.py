@@ -0,0 +1,67 @@
+import os
+import uuid
+
+import pytest
+from PIL import Image
+
+from common.exceptions import NotFound
+from common.settings import settings
+from schemas.storage import PregenerateStatus
+from services import pregenerate
+from services.pregenerate import get_pregenerate_job_service, start_pregenerate_service
+
+
+@pytest.fixture
+def inline_render(temp_cache_dir, monkeypatch):
+    """Рендеринг в том же процессе, кэш - во временной папке"""
+
+    async def run_render(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr('services.storage_file.run_render', run_render)
+    monkeypatch.setattr('services.storage_content.run_render', run_render)
+    monkeypatch.setattr('services.pregenerate.run_render', run_render)
+
+
+async def _wait(job_id: uuid.UUID):
+    for job, task in list(pregenerate._running.values()):
+        if job.id == job_id:
+            await task
+    return get_pregenerate_job_service(job_id)
+
+
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+async def test_pregenerate_storage(temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    _, dir_names, _ = next(os.walk(root_dir))
+    folder = os.path.join(root_dir, dir_names[0])
+    for name in ('a.jpg', 'b.png'):
+        Image.new('RGB', (800, 600), 'red').save(os.path.join(folder, name))
+
+    job = await start_pregenerate_service(temp_storage.id, folder=dir_names[0])
+    job = await _wait(job.id)
+    assert job.status == PregenerateStatus.DONE
+    # Две копии и заглушка каждого изображения и коллаж папки; копию PREVIEW_WIDTH
+    # и заглушку может заранее создать рендеринг лестницы копий для THUMBNAIL_WIDTH
+    assert (job.total, job.rendered + job.skipped, job.failed) == (7, 7, 0)
+
+    # Повторный запуск продолжает с места остановки - всё уже в кэше
+    job = await _wait((await start_pregenerate_service(temp_storage.id, dir_names[0])).id)
+    assert (job.processed, job.rendered, job.skipped) == (7, 0, 7)
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_pregenerate_missing_folder(temp_storage):
+    with pytest.raises(NotFound):
+        await start_pregenerate_service(temp_storage.id, folder='missing')
+
+
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+async def test_pregenerate_finished_jobs_expire(temp_storage, monkeypatch):
+    job = await _wait((await start_pregenerate_service(temp_storage.id)).id)
+    assert job.status == PregenerateStatus.DONE
+    monkeypatch.setattr(settings, 'PREGENERATE_JOB_TTL', 0)
+    with pytest.raises(NotFound):
+        get_pregenerate_job_service(job.id)
+    assert job.id not in pregenerate._jobs
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    async def render(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 2
+
+    results = await asyncio.gather(
+        *[flight.do(key, lambda key=key: render(key)) for key in (1, 1, 1, 2)]
+    )
+    assert results == [2, 2, 2, 4]
+    assert sorted(calls) == [1, 2]
+    assert flight.info() == {'executed': 2, 'coalesced': 2, 'in_flight': 0}
+
+    # Завершённое вычисление не запоминается
+    assert await flight.do(1, lambda: render(1)) == 2
+    assert flight.executed == 3
+
+
+async def test_error_is_shared():
+    flight = SingleFlight()
+
+    async def render():
+        await asyncio.sleep(0.01)
+        raise ValueError('broken')
+
+    results = await asyncio.gather(
+        flight.do('key', render), flight.do('key', render), return_exceptions=True
+    )
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert flight.info()['in_flight'] == 0
+
+
+async def test_cancelled_waiter_does_not_cancel_render():
+    flight = SingleFlight()
+    done = asyncio.Event()
+
+    async def render():
+        await done.wait()
+        return 'image'
+
+    first = asyncio.ensure_future(flight.do('key', render))
+    second = asyncio.ensure_future(flight.do('key', render))
+    await asyncio.sleep(0)
+    first.cancel()
+    done.set()
+    assert await second == 'image'
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,151 @@
+import asyncio
+import os
+from io import BytesIO
+
+import pytest
+from PIL import ExifTags, Image
+
+from common.settings import settings
+from services.CacheManager import CacheManager
+from services.storage_file import ImagePreset, ResponseFile, snap_width
+
+
+def _save_image(path: str, size: tuple[int, int], orientation: int | None = None) -> None:
+    # Левая половина красная, правая - синяя: по ней проверяется поворот
+    img = Image.new('RGB', size, (0, 0, 255))
+    img.paste((255, 0, 0), (0, 0, size[0] // 2, size[1]))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[ExifTags.Base.Orientation] = orientation
+    img.save(path, exif=exif)
+
+
+@pytest.mark.parametrize('reducing_gap', [None, 2.0])
+@pytest.mark.parametrize('extension', ['jpg', 'png'])
+def test_render_resized_image(temp_cache_dir, monkeypatch, extension, reducing_gap):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [])
+    path = os.path.join(temp_cache_dir, f'image.{extension}')
+    _save_image(path, (1600, 800), orientation=6)
+    preset = ImagePreset(Image.Resampling.HAMMING, quality=90, reducing_gap=reducing_gap)
+    response_file = ResponseFile(path, cache_manager=CacheManager(path), width=100, preset=preset)
+
+    with Image.open(BytesIO(response_file._render_resized_image())) as img:
+        # Поворот на 90 градусов по часовой стрелке: ширина - бывшая высота
+        assert img.size == (100, 200)
+        red, _, blue = img.convert('RGB').getpixel((50, 20))
+        assert red > 200 and blue < 50
+    assert response_file.cache_manager.is_file_cached(width=100)
+
+
+def test_render_small_image_is_not_resized(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [])
+    path = os.path.join(temp_cache_dir, 'image.jpg')
+    _save_image(path, (80, 40))
+    response_file = ResponseFile(path, cache_manager=CacheManager(path), width=100)
+    with Image.open(BytesIO(response_file._render_resized_image())) as img:
+        assert img.size == (80, 40)
+
+
+async def test_concurrent_resized_image_rendered_once(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    path = os.path.join(temp_cache_dir, 'image.jpg')
+    _save_image(path, (800, 400))
+    renders = []
+
+    async def run_render(func):
+        renders.append(func)
+        await asyncio.sleep(0.01)
+        return func()
+
+    monkeypatch.setattr('services.storage_file.run_render', run_render)
+    responses = await asyncio.gather(
+        *[ResponseFile(path, CacheManager(path), width=100).get_resized_image() for _ in range(3)]
+    )
+    assert len(renders) == 1
+    assert all(response.status_code == 200 for response in responses)
+
+
+@pytest.mark.parametrize(
+    'width, expected', [(1, 100), (100, 100), (150, 200), (400, 400), (401, None)]
+)
+def test_snap_width(monkeypatch, width, expected):
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [400, 100, 200])
+    assert snap_width(width) == expected
+
+
+def test_render_rendition_ladder_from_single_decode(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [100, 200, 400, 800, 1600])
+    path = os.path.join(temp_cache_dir, 'image.jpg')
+    _save_image(path, (1000, 500))
+    response_file = ResponseFile(path, cache_manager=CacheManager(path), width=150)
+    assert response_file.width == 200
+
+    with Image.open(BytesIO(response_file._render_resized_image())) as img:
+        assert img.size == (200, 100)
+    cache_manager = response_file.cache_manager
+    for width in (100, 200, 400, 800):
+        with Image.open(cache_manager.get_cached_file(width)) as img:
+            assert img.size == (width, width // 2)
+    # Шире изображения - только запрошенная ступень
+    assert not cache_manager.is_file_cached(1600)
+
+
+def test_render_rendition_from_nearest_cached(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [100, 200, 400, 800])
+    path = os.path.join(temp_cache_dir, 'image.jpg')
+    _save_image(path, (1000, 500))
+    cache_manager = CacheManager(path)
+    # Копии в кэше отличаются от оригинала цветом: по нему видно, из чего получен результат
+    cache_manager.save_to_cache(Image.new('RGB', (400, 200), (0, 255, 0)), 400)
+    cache_manager.save_to_cache(Image.new('RGB', (800, 400), (255, 255, 255)), 800)
+
+    response_file = ResponseFile(path, cache_manager=cache_manager, width=200)
+    with Image.open(BytesIO(response_file._render_resized_image())) as img:
+        assert img.size == (200, 100)
+        red, green, blue = img.convert('RGB').getpixel((100, 50))
+        assert green > 200 and red < 50 and blue < 50
+    assert not cache_manager.is_file_cached(100)
+
+
+async def test_resized_image_above_ladder_is_original(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'RENDITION_WIDTHS', [100, 200])
+    path = os.path.join(temp_cache_dir, 'image.jpg')
+    _save_image(path, (1000, 500))
+    response = await ResponseFile(path, CacheManager(path), width=500).get_resized_image()
+    assert response.path == path
+
+
+async def test_resized_image_response_is_cached_bytes(temp_cache_dir, monkeypatch):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    path = os.path.join(temp_cache_dir, 'image.png')
+    _save_image(path, (800, 400))
+
+    async def run_render(func):
+        return func()
+
+    monkeypatch.setattr('services.storage_file.run_render', run_render)
+    response_file = ResponseFile(path, CacheManager(path), width=200, image_format='webp')
+    response = await response_file.get_resized_image()
+    cached_file = response_file.cache_manager.get_cached_file(200)
+    with open(cached_file, 'rb') as file:
+        assert response.body == file.read()
+    with Image.open(cached_file) as img:
+        assert img.format == 'WEBP'
+    # Временные файлы атомарной записи не остаются
+    assert not [name for name in os.listdir(temp_cache_dir) if name.endswith('.tmp')]
+
+
+async def test_video_file_response_streams_file(temp_cache_dir):
+    path = os.path.join(temp_cache_dir, 'video.mp4')
+    with open(path, 'wb') as file_out:
+        file_out.write(os.urandom(25_000))
+    response = await ResponseFile(path, width=100).get_video_file()
+    assert response.headers['content-length'] == '25000'
+    body = b''.join([chunk async for chunk in response.body_iterator])
+    with open(path, 'rb') as file:
+        assert body == file.read()
@@ -1,11 +1,24 @@
+import asyncio
 import os
 import uuid
 from unittest import mock
 
 import pytest
 
-from services.storage_content import get_storages_summary_service
-from services.storage_manager import FolderManager, OrderFolder
+from common.exceptions import BadRequest
+from common.settings import settings
+from db.models import Storage
+from services.folder_stats import FolderStats, FolderStatsIndex, get_folder_stats
+from services.listing_cache import ListingCache
+from services.storage_content import _summary_tasks, get_storages_summary_service
+from services.storage_manager import (
+    EntryKind,
+    FolderManager,
+    OrderFolder,
+    StatsMode,
+    StorageManager,
+    encode_cursor,
+)
 
 
 @pytest.mark.usefixtures('apply_migrations')
@@ -30,3 +43,112 @@ async def test_get_storages_summary(storage):
         assert result[0].files_count.total >= 0
         assert isinstance(result[0].folders, list)
         assert isinstance(result[0].files, list)
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_folder_content_page_by_name(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    _, dir_names, file_names = next(os.walk(root_dir))
+    page_size = len(dir_names) + 1
+    folder = FolderManager(root_dir, page_size=page_size)
+    content = await folder.get_folder_content()
+    assert [nested.name for nested in content.folders] == sorted(dir_names)
+    assert [file.name for file in content.files] == sorted(file_names)[:1]
+    assert content.files_count.total == created_temp_storage_folder.files_count
+    for nested in content.folders:
+        stats = get_folder_stats(os.path.join(root_dir, nested.name))
+        assert nested.size == stats.size
+        assert nested.files_count.total == stats.total_files
+
+
+@pytest.mark.usefixtures('apply_migrations')
+async def test_folder_content_listing_cache(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    cache = ListingCache(max_items=100_000, ttl=60)
+    await FolderManager(root_dir, page_size=1, cache=cache).get_folder_content()
+    with mock.patch('services.storage_manager._list_entries', side_effect=AssertionError):
+        await FolderManager(root_dir, page_number=2, page_size=1, cache=cache).get_folder_content()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Новый файл меняет mtime папки - кэш не используется
+    with open(os.path.join(root_dir, 'new_file.bin'), 'wb') as file_out:
+        file_out.write(b'12345')
+    content = await FolderManager(root_dir, cache=cache).get_folder_content()
+    assert content.files_count.total == created_temp_storage_folder.files_count + 1
+    assert cache.misses == 2
+
+
+async def _list_with_cursor(root_dir: str, order_by: OrderFolder, added_file: str | None = None):
+    names, cursor = [], None
+    while True:
+        folder = FolderManager(root_dir, order_by=order_by, page_size=3, cursor=cursor)
+        content = await folder.get_folder_content(order_by=order_by)
+        names += [nested.name for nested in content.folders] + [f.name for f in content.files]
+        if added_file and len(names) == 3:
+            # Файл, добавленный между запросами, не сдвигает следующие страницы
+            with open(os.path.join(root_dir, added_file), 'wb') as file_out:
+                file_out.write(b'1')
+        cursor = folder.next_cursor
+        if cursor is None:
+            return names
+
+
+@pytest.mark.usefixtures('apply_migrations')
+@pytest.mark.parametrize('order_by', [OrderFolder.NAME, OrderFolder.SIZE])
+async def test_folder_content_cursor(created_temp_storage_folder, order_by):
+    root_dir = created_temp_storage_folder.root_dir
+    _, dir_names, file_names = next(os.walk(root_dir))
+    names = await _list_with_cursor(root_dir, order_by, added_file='~added.bin')
+    assert set(dir_names + file_names) <= set(names)
+    assert len(names) == len(set(names))
+
+
+def test_invalid_cursor():
+    with pytest.raises(BadRequest):
+        FolderManager('/', cursor='not a cursor')._page_bounds([], [], lambda name: (name,))
+
+    # Курсор декодируется, но ключ не соответствует порядку сортировки
+    for order_by, key in (
+        (OrderFolder.TIME, ('a', 'b')),
+        (OrderFolder.NAME, (1,)),
+        (OrderFolder.SIZE, (1,)),
+        (OrderFolder.SIZE, (True, 'a')),
+    ):
+        cursor = encode_cursor(order_by, EntryKind.FILE, key)
+        folder = FolderManager('/', order_by=order_by, cursor=cursor)
+        with pytest.raises(BadRequest):
+            folder._page_bounds([], [], lambda name: (name,))
+
+
+async def test_get_storages_summary_deadline(storage):
+    slow = storage
+    fast = Storage(
+        id=uuid.uuid4(),
+        user_id=storage.user_id,
+        name=storage.name,
+        path=storage.path,
+        created_at=storage.created_at,
+        created_by=storage.created_by,
+    )
+    slow_summary_started = asyncio.Event()
+
+    async def get_storage_summary(manager):
+        if manager.storage is slow:
+            slow_summary_started.set()
+            await asyncio.sleep(10)
+        return await manager.create_storage_folder_object(
+            FolderManager._create_folder('', FolderStats(size=1))
+        )
+
+    with (
+        mock.patch('services.storage_content.get_list_storages', return_value=[slow, fast]),
+        mock.patch.object(StorageManager, 'get_storage_summary', get_storage_summary),
+        mock.patch.object(FolderStatsIndex, 'get_saved_stats', return_value=FolderStats(size=5)),
+        mock.patch.object(settings, 'SUMMARY_TIMEOUT', 0.1),
+    ):
+        result = await get_storages_summary_service(user_id=uuid.uuid4())
+    assert slow_summary_started.is_set()
+    assert [(item.size, item.stale) for item in result] == [(5, True), (1, False)]
+    # Подсчёт медленного хранилища продолжается в фоне
+    assert (slow.id, StatsMode.CACHED) in _summary_tasks
+    _summary_tasks[(slow.id, StatsMode.CACHED)].cancel()
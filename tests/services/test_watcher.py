@@ -0,0 +1,103 @@
+import asyncio
+import errno
+import os
+import uuid
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from common.settings import settings
+from db.models import Storage
+from services import inotify
+from services.CacheManager import CacheManager
+from services.watcher import FolderTreeIndex, StorageWatcher
+
+
+def test_folder_tree_index_generation():
+    folder_tree = FolderTreeIndex()
+    folder_tree.add_root('/storage')
+    folder_tree.touch('/storage/a/b')
+    assert folder_tree.generation('/storage/a/b') == 1
+    assert folder_tree.generation('/storage/a') == 1
+    assert folder_tree.generation('/storage') == 1
+    assert folder_tree.generation('/') == 0
+    assert folder_tree.root_of('/storage/a') == '/storage'
+    assert not folder_tree.is_watched('/storage2')
+
+
+@pytest.mark.skipif(not inotify.is_available(), reason='inotify is not available')
+async def test_watcher_inotify_invalidates_cache(
+    created_temp_storage_folder, temp_cache_dir, monkeypatch
+):
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    root_dir = created_temp_storage_folder.root_dir
+    folder_tree = FolderTreeIndex()
+    folder_watcher = StorageWatcher(folder_tree=folder_tree)
+    await folder_watcher.start(storages=[Storage(id=uuid.uuid4(), path=root_dir)])
+    try:
+        assert not folder_watcher.is_polling(root_dir)
+        image_path = os.path.join(root_dir, 'image.jpg')
+        Image.new('RGB', (10, 10)).save(image_path)
+        cache_manager = CacheManager(image_path)
+        cache_manager.save_to_cache(Image.new('RGB', (10, 10)), settings.THUMBNAIL_WIDTH)
+        await asyncio.sleep(0.1)
+        with mock.patch('services.watcher.FolderStatsIndex.invalidate') as invalidate:
+            await folder_watcher.flush()
+        invalidate.assert_called_once()
+        assert folder_tree.generation(root_dir) > 0
+        assert not cache_manager.is_file_cached(settings.THUMBNAIL_WIDTH)
+    finally:
+        await folder_watcher.stop()
+
+
+@pytest.mark.skipif(not inotify.is_available(), reason='inotify is not available')
+async def test_watcher_new_folder_falls_back_to_polling(created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    folder_tree = FolderTreeIndex()
+    folder_watcher = StorageWatcher(folder_tree=folder_tree)
+    await folder_watcher.start(storages=[Storage(id=uuid.uuid4(), path=root_dir)])
+    try:
+        assert not folder_watcher.is_polling(root_dir)
+        # Лимит наблюдений исчерпан - новая папка не может получить наблюдение
+        limit = OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+        watcher_inotify = folder_watcher._inotify  # pylint: disable=protected-access
+        with mock.patch.object(watcher_inotify, 'add_watch', side_effect=limit):
+            new_folder = os.path.join(root_dir, 'new_folder')
+            os.makedirs(os.path.join(new_folder, 'nested'))
+            for _ in range(50):
+                await asyncio.sleep(0.02)
+                if folder_watcher.is_polling(root_dir):
+                    break
+        assert folder_watcher.is_polling(root_dir)
+        with mock.patch('services.watcher.FolderStatsIndex.invalidate'):
+            await folder_watcher.flush()
+        assert folder_tree.generation(os.path.join(new_folder, 'nested')) == 1
+
+        os.mkdir(os.path.join(new_folder, 'nested', 'deeper'))
+        await folder_watcher.poll(root_dir)
+        with mock.patch('services.watcher.FolderStatsIndex.invalidate'):
+            await folder_watcher.flush()
+        assert folder_tree.generation(os.path.join(new_folder, 'nested', 'deeper')) == 1
+    finally:
+        await folder_watcher.stop()
+
+
+async def test_watcher_polling(created_temp_storage_folder, monkeypatch):
+    monkeypatch.setattr(settings, 'WATCHER_FORCE_POLLING', True)
+    root_dir = created_temp_storage_folder.root_dir
+    folder_tree = FolderTreeIndex()
+    folder_watcher = StorageWatcher(folder_tree=folder_tree)
+    await folder_watcher.start(storages=[Storage(id=uuid.uuid4(), path=root_dir)])
+    try:
+        assert folder_watcher.is_polling(root_dir)
+        new_folder = os.path.join(root_dir, 'new_folder')
+        os.mkdir(new_folder)
+        await folder_watcher.poll(root_dir)
+        with mock.patch('services.watcher.FolderStatsIndex.invalidate') as invalidate:
+            await folder_watcher.flush()
+        invalidate.assert_called_once()
+        assert folder_tree.generation(new_folder) == 1
+        assert folder_tree.generation(root_dir) > 0
+    finally:
+        await folder_watcher.stop()
@@ -189,3 +189,14 @@ async def test_get_storage_collage_wrong_path(client, storage):
         ).verify()  # Pillow пытается верифицировать изображение
     except (IOError, SyntaxError) as e:
         pytest.fail(f"Invalid PNG image: {e}")
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_get_listing_stats(client, temp_storage):
+    before = client.get('/storage/listing/stats').json()
+    for _ in range(2):
+        assert client.get(f'/storage/{temp_storage.id}').status_code == status.HTTP_200_OK
+    after = client.get('/storage/listing/stats').json()
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 1
+    assert after['max_items'] == settings.LISTING_CACHE_MAX_ITEMS
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from common.settings import settings
+
+
+@pytest.fixture
+def inline_render(temp_cache_dir, monkeypatch):
+    """Рендеринг в том же процессе, кэш - во временной папке"""
+
+    async def run_render(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr('services.storage_file.run_render', run_render)
+
+
+@pytest.mark.parametrize(
+    'accept, image_format',
+    [
+        ('image/avif,image/webp,image/apng,image/*,*/*;q=0.8', 'webp'),
+        ('image/webp;q=0, image/*', 'jpeg'),
+        (None, 'jpeg'),
+    ],
+)
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+def test_preview_format_negotiation(
+    client, monkeypatch, temp_storage, created_temp_storage_folder, accept, image_format
+):
+    # Pillow без поддержки AVIF: из предпочтительных форматов доступен только WebP
+    monkeypatch.setattr(settings, 'RENDITION_FORMATS', ['webp'])
+    Image.new('RGB', (800, 600), 'red').save(
+        os.path.join(created_temp_storage_folder.root_dir, 'photo.png')
+    )
+    headers = {'Accept': accept} if accept else {}
+    params = {'folder': '', 'filename': 'photo.png', 'width': 200}
+    # Первый запрос - рендеринг, второй - копия из кэша
+    for _ in range(2):
+        response = client.get(f'/storage/preview/{temp_storage.id}', params=params, headers=headers)
+        assert response.status_code == 200
+        assert response.headers['content-type'] == f'image/{image_format}'
+        assert response.headers['vary'] == 'Accept'
+        with Image.open(io.BytesIO(response.content)) as img:
+            assert img.format == image_format.upper()
+            assert img.size == (200, 150)
+
+
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+def test_preview_not_modified(client, monkeypatch, temp_storage, created_temp_storage_folder):
+    monkeypatch.setattr(settings, 'PREVIEW_CACHE_CONTROL', 'public, max-age=60, immutable')
+    path = os.path.join(created_temp_storage_folder.root_dir, 'photo.jpg')
+    Image.new('RGB', (800, 600), 'red').save(path)
+    url = f'/storage/preview/{temp_storage.id}'
+    params = {'folder': '', 'filename': 'photo.jpg', 'width': 200}
+    response = client.get(url, params=params)
+    assert response.status_code == 200
+    assert response.headers['cache-control'] == 'public, max-age=60, immutable'
+    etag, last_modified = response.headers['etag'], response.headers['last-modified']
+
+    # Другая ширина - другая копия
+    response = client.get(url, params=params | {'width': 800}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+    def fail_render(*args, **kwargs):
+        raise AssertionError('304 без рендеринга')
+
+    monkeypatch.setattr('services.storage_file.run_render', fail_render)
+    for headers in ({'If-None-Match': etag}, {'If-Modified-Since': last_modified}):
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 304
+        assert response.headers['etag'] == etag
+        assert response.headers['vary'] == 'Accept'
+        assert not response.content
+
+
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+def test_collage_not_modified(client, monkeypatch, temp_storage, created_temp_storage_folder):
+    monkeypatch.setattr('services.storage_content.run_render', lambda func: asyncio.to_thread(func))
+    Image.new('RGB', (800, 600), 'red').save(
+        os.path.join(created_temp_storage_folder.root_dir, 'photo.jpg')
+    )
+    url = f'/storage/collage/{temp_storage.id}'
+    response = client.get(url, params={'folder': ''})
+    assert response.status_code == 200
+    assert response.headers['cache-control'] == settings.COLLAGE_CACHE_CONTROL
+    response = client.get(
+        url, params={'folder': ''}, headers={'If-None-Match': response.headers['etag']}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.usefixtures('apply_migrations', 'inline_render')
+def test_listing_placeholders(client, temp_storage, created_temp_storage_folder):
+    Image.new('RGB', (800, 600), 'red').save(
+        os.path.join(created_temp_storage_folder.root_dir, 'photo.jpg')
+    )
+    url = f'/storage/{temp_storage.id}'
+    params = {'stats': 'none', 'page_size': 1000}
+    # Заглушка появляется после рендеринга превью
+    client.get(
+        f'/storage/preview/{temp_storage.id}', params={'folder': '', 'filename': 'photo.jpg'}
+    )
+    for placeholders in (False, True):
+        response = client.get(url, params=params | {'placeholders': placeholders})
+        assert response.status_code == 200
+        files = {file['name']: file for file in response.json()['results']['files']}
+        photo = files['photo.jpg']
+        if placeholders:
+            assert (photo['width'], photo['height']) == (800, 600)
+            assert photo['placeholder'].startswith('data:image/')
+        else:
+            assert photo['placeholder'] is None
@@ -0,0 +1,47 @@
+import os
+import uuid
+from unittest import mock
+
+import pytest
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_search_storage_files(client, temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    deepest = max((path for path, _, _ in os.walk(root_dir)), key=lambda path: path.count('/'))
+    for name in ('Holiday_100%.JPG', 'holiday_2.jpg', 'my_holiday.jpg'):
+        with open(os.path.join(deepest, name), 'wb') as file_out:
+            file_out.write(b'1')
+
+    response = client.get(f'/storage/{temp_storage.id}/search', params={'q': 'HOLIDAY'})
+    assert response.status_code == 200
+    data = response.json()
+    assert data['pagination']['items'] == 3
+    assert [file['name'] for file in data['results']] == [
+        'Holiday_100%.JPG',
+        'holiday_2.jpg',
+        'my_holiday.jpg',
+    ]
+    assert data['results'][0]['full_path'] == os.path.relpath(
+        os.path.join(deepest, 'Holiday_100%.JPG'), root_dir
+    )
+
+    response = client.get(
+        f'/storage/{temp_storage.id}/search', params={'q': 'holiday_1', 'prefix': True}
+    )
+    assert [file['name'] for file in response.json()['results']] == ['Holiday_100%.JPG']
+    response = client.get(f'/storage/{temp_storage.id}/search', params={'q': '0%.'})
+    assert [file['name'] for file in response.json()['results']] == ['Holiday_100%.JPG']
+
+    # Повторный поиск не обходит диск: изменения попадают в индекс через фоновый обход
+    with open(os.path.join(root_dir, 'holiday_3.jpg'), 'wb') as file_out:
+        file_out.write(b'1')
+    with mock.patch('services.crawler.crawl', side_effect=AssertionError):
+        response = client.get(f'/storage/{temp_storage.id}/search', params={'q': 'holiday'})
+    assert response.json()['pagination']['items'] == 3
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_search_unknown_storage(client):
+    response = client.get(f'/storage/{uuid.uuid4()}/search', params={'q': 'holiday'})
+    assert response.status_code == 404
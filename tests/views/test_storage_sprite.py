@@ -0,0 +1,77 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from common.settings import settings
+
+
+@pytest.fixture
+def renders(temp_cache_dir, monkeypatch):
+    """Рендеринг в том же процессе, кэш - во временной папке; список рендерингов"""
+    calls = []
+
+    async def run_render(func, *args, **kwargs):
+        calls.append(func)
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(settings, 'CACHE_DIR', temp_cache_dir)
+    monkeypatch.setattr(settings, 'SPRITE_TILE_SIZE', 100)
+    monkeypatch.setattr(settings, 'SPRITE_COLUMNS', 2)
+    monkeypatch.setattr('services.sprites.run_render', run_render)
+    return calls
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_storage_sprite(client, renders, temp_storage, created_temp_storage_folder):
+    folder = os.path.join(created_temp_storage_folder.root_dir, 'sprite')
+    os.mkdir(folder)
+    for name, size in (('a.jpg', (400, 300)), ('b.png', (300, 600)), ('c.jpg', (200, 200))):
+        Image.new('RGB', size, 'red').save(os.path.join(folder, name))
+    with open(os.path.join(folder, 'notes.txt'), 'w') as file:
+        file.write('text')
+    url = f'/storage/{temp_storage.id}/sprite'
+    params = {'folder': 'sprite', 'stats': 'none'}
+
+    response = client.get(url, params=params, headers={'Accept': 'image/webp'})
+    assert response.status_code == 200
+    sheet = response.json()
+    assert (sheet['width'], sheet['height']) == (200, 200)
+    items = {item['name']: item for item in sheet['items']}
+    assert items['a.jpg'] == {'name': 'a.jpg', 'x': 0, 'y': 0, 'width': 100, 'height': 75}
+    assert items['b.png'] == {'name': 'b.png', 'x': 100, 'y': 0, 'width': 50, 'height': 100}
+    assert items['c.jpg'] == {'name': 'c.jpg', 'x': 0, 'y': 100, 'width': 100, 'height': 100}
+
+    image = client.get(sheet['url'])
+    assert image.status_code == 200
+    assert image.headers['content-type'] == 'image/webp'
+    assert 'immutable' in image.headers['cache-control']
+    with Image.open(io.BytesIO(image.content)) as img:
+        assert img.size == (200, 200)
+
+    # Повторный запрос - из кэша
+    response = client.get(url, params=params, headers={'Accept': 'image/webp'})
+    assert response.json() == sheet
+    assert len(renders) == 1
+
+    # Изменение файлов страницы - новый спрайт
+    Image.new('RGB', (100, 100), 'blue').save(os.path.join(folder, 'c.jpg'))
+    response = client.get(url, params=params, headers={'Accept': 'image/webp'})
+    assert response.json()['url'] != sheet['url']
+    assert len(renders) == 2
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_storage_sprite_without_images(client, renders, temp_storage, created_temp_storage_folder):
+    os.mkdir(os.path.join(created_temp_storage_folder.root_dir, 'empty'))
+    response = client.get(
+        f'/storage/{temp_storage.id}/sprite', params={'folder': 'empty', 'stats': 'none'}
+    )
+    assert response.status_code == 200
+    assert response.json() == {'url': None, 'width': 0, 'height': 0, 'items': []}
+
+
+@pytest.mark.parametrize('name', ['missing.jpg', '..%2Fsecret.jpg', f'{"0" * 32}.jpg'])
+def test_sprite_image_not_found(client, renders, name):
+    assert client.get(f'/storage/sprite/{name}').status_code == 404
@@ -0,0 +1,35 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from common.settings import settings
+from services.folder_stats import get_folder_stats
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_stream_storage_content(client, temp_storage, created_temp_storage_folder):
+    root_dir = created_temp_storage_folder.root_dir
+    _, dir_names, file_names = next(os.walk(root_dir))
+    with mock.patch.object(settings, 'STREAM_BATCH_SIZE', 2):
+        response = client.get(f'/storage/{temp_storage.id}/stream', params={'catalog': True})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    folders = {line['name']: line for line in lines if line['kind'] == 'folder'}
+    files = {line['name']: line for line in lines if line['kind'] == 'file'}
+    assert set(folders) == set(dir_names)
+    assert set(files) == set(file_names)
+    for name, folder in folders.items():
+        stats = get_folder_stats(os.path.join(root_dir, name))
+        assert folder['size'] == stats.size
+        assert folder['files_count']['total'] == stats.total_files
+        assert 'files' not in folder
+    assert all(file['full_path'] == name for name, file in files.items())
+
+
+@pytest.mark.usefixtures('apply_migrations')
+def test_stream_storage_content_not_found(client, temp_storage):
+    response = client.get(f'/storage/{temp_storage.id}/stream', params={'folder': 'missing'})
+    assert response.status_code == 404